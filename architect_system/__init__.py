@@ -0,0 +1,25 @@
+# architect_system/__init__.py
+"""
+Local reference engine behind the test suites
+"""
+
+from .aggregation import aggregate
+from .autocomplete import autocomplete, autocomplete_index
+from .btree import BPlusTree, bulk_load
+from .columnar import column_scan, scan
+from .doclog import bulk_insert, document_log
+from .docstore import document_collection, get_document, json_index, update
+from .fulltext import fulltext_search, index_documents, search
+from .fuzzy import fuzzy_index, fuzzy_search
+from .graph import LinkGraph, link_graph
+from .joins import hash_join, merge_join, multi_join
+from .kvstore import KVStore, kv_operations
+from .lsm import LSMTree, lsm_store
+from .sortedset import SortedSet
+
+__all__ = ['aggregate', 'autocomplete', 'autocomplete_index', 'BPlusTree', 'bulk_insert',
+           'bulk_load', 'column_scan', 'document_collection', 'document_log',
+           'fulltext_search', 'fuzzy_index', 'fuzzy_search', 'get_document', 'hash_join',
+           'index_documents', 'json_index', 'KVStore', 'kv_operations', 'LinkGraph',
+           'link_graph', 'LSMTree', 'lsm_store', 'merge_join', 'multi_join', 'scan',
+           'search', 'SortedSet', 'update']
@@ -0,0 +1,230 @@
+# architect_system/autocomplete.py
+"""
+Search-as-you-type over titles and terms
+Entries live in one sorted, front-coded array (16 per block, like Lucene's
+terms dictionary). A prefix is a contiguous range found by binary search over
+block heads; prefixes with more than SCAN_LIMIT entries have their top-k
+precomputed, so no keystroke ever ranks more than SCAN_LIMIT weights
+"""
+
+import mmap
+import os
+from collections import Counter
+
+import numpy as np
+
+from .fulltext import index_documents
+from .storage import iter_field, open_index
+
+FRONT_BLOCK = 16
+SCAN_LIMIT = 4096
+TOP_K = 10
+
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _read_varint(buf, pos):
+    value = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _key(display):
+    return display.lower().encode('utf-8')
+
+
+def _common_prefix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _rank_keys(weights, lo, hi):
+    """Higher weight first, then lexicographic order, as one int64 per entry"""
+    return (weights[lo:hi].astype(np.int64) << 32) - np.arange(lo, hi)
+
+
+def _top(weights, lo, hi, k):
+    """Entry ids of the k best entries in [lo, hi)"""
+    ranks = _rank_keys(weights, lo, hi)
+    if hi - lo > k:
+        part = np.argpartition(-ranks, k - 1)[:k]
+    else:
+        part = np.arange(hi - lo)
+    return lo + part[np.argsort(-ranks[part])]
+
+
+def build_autocomplete(data, directory):
+    terms, df = index_documents(data).vocabulary()
+    entries = Counter(title.strip() for title in iter_field(data, 'title') if title and title.strip())
+    # Titles weigh the number of documents carrying them; terms their document frequency
+    for term, weight in zip(terms, df):
+        display = term.decode('utf-8')
+        entries[display] = max(entries[display], int(weight))
+    ordered = sorted(entries.items(), key=lambda item: (_key(item[0]), item[0]))
+    del entries
+    weights = np.fromiter((w for _, w in ordered), dtype=np.uint32, count=len(ordered))
+    keys = [_key(display) for display, _ in ordered]
+
+    block_offsets = []
+    with open(os.path.join(directory, 'entries.bin'), 'wb') as blob:
+        offset = 0
+        previous = b''
+        for i, (display, _) in enumerate(ordered):
+            raw = display.encode('utf-8')
+            if i % FRONT_BLOCK == 0:
+                block_offsets.append(offset)
+                record = _varint(len(raw)) + raw
+            else:
+                shared = _common_prefix(previous, raw)
+                record = _varint(shared) + _varint(len(raw) - shared) + raw[shared:]
+            blob.write(record)
+            offset += len(record)
+            previous = raw
+    del ordered
+
+    # lcp[i]: bytes keys i-1 and i share. A prefix of length d is one run of lcp >= d
+    lcp = np.zeros(len(keys), dtype=np.int32)
+    for i in range(1, len(keys)):
+        lcp[i] = _common_prefix(keys[i - 1], keys[i])
+    heavy_prefixes = []
+    heavy_top = []
+    depth = 1
+    while True:
+        inside = np.concatenate(([False], lcp[1:] >= depth, [False])).astype(np.int8)
+        edges = np.diff(inside)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        big = (ends - starts + 1) > SCAN_LIMIT
+        if not big.any():
+            break
+        for start, end in zip(starts[big], ends[big]):
+            lo, hi = int(start), int(end) + 1
+            heavy_prefixes.append(keys[lo][:depth])
+            top = np.full(TOP_K, -1, dtype=np.int64)
+            best = _top(weights, lo, hi, TOP_K)
+            top[:len(best)] = best
+            heavy_top.append(top)
+        depth += 1
+
+    lengths = np.fromiter(map(len, heavy_prefixes), dtype=np.int64, count=len(heavy_prefixes))
+    prefix_offsets = np.zeros(len(heavy_prefixes) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=prefix_offsets[1:])
+    with open(os.path.join(directory, 'heavy.bin'), 'wb') as f:
+        f.write(b''.join(heavy_prefixes))
+    np.save(os.path.join(directory, 'heavy_offsets.npy'), prefix_offsets)
+    np.save(os.path.join(directory, 'heavy_top.npy'),
+            np.array(heavy_top, dtype=np.int64).reshape(-1, TOP_K))
+    np.save(os.path.join(directory, 'block_offsets.npy'), np.array(block_offsets, dtype=np.int64))
+    np.save(os.path.join(directory, 'weights.npy'), weights)
+
+
+class AutocompleteIndex:
+    """Read side: front-coded entries (mmapped), weights and the heavy-prefix table"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'entries.bin'), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.block_offsets = np.load(os.path.join(directory, 'block_offsets.npy'))
+        self.weights = np.load(os.path.join(directory, 'weights.npy'), mmap_mode='r')
+        offsets = np.load(os.path.join(directory, 'heavy_offsets.npy'))
+        with open(os.path.join(directory, 'heavy.bin'), 'rb') as f:
+            names = f.read()
+        top = np.load(os.path.join(directory, 'heavy_top.npy'))
+        self.heavy = {names[offsets[i]:offsets[i + 1]]: top[i] for i in range(len(top))}
+
+    def __len__(self):
+        return len(self.weights)
+
+    @property
+    def resident_bytes(self):
+        """Memory held outside the mmapped files: block offsets and the heavy-prefix table"""
+        return self.block_offsets.nbytes + sum(len(p) + top.nbytes for p, top in self.heavy.items())
+
+    @property
+    def nbytes(self):
+        """Total index size, mmapped entries and weights included"""
+        return len(self.blob) + self.weights.nbytes + self.resident_bytes
+
+    def block(self, b, count=FRONT_BLOCK):
+        """Display strings of front-coded block b (the first `count` of them)"""
+        pos = int(self.block_offsets[b])
+        count = min(count, len(self) - b * FRONT_BLOCK)
+        out = []
+        previous = b''
+        for i in range(count):
+            if i == 0:
+                length, pos = _read_varint(self.blob, pos)
+                raw = bytes(self.blob[pos:pos + length])
+            else:
+                shared, pos = _read_varint(self.blob, pos)
+                length, pos = _read_varint(self.blob, pos)
+                raw = previous[:shared] + bytes(self.blob[pos:pos + length])
+            pos += length
+            out.append(raw.decode('utf-8'))
+            previous = raw
+        return out
+
+    def entry(self, i):
+        return self.block(i // FRONT_BLOCK)[i % FRONT_BLOCK]
+
+    def _bound(self, key):
+        """Index of the first entry whose key is >= `key`"""
+        lo, hi = 0, len(self.block_offsets)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _key(self.block(mid, 1)[0]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return 0
+        # Block lo-1 starts below `key` and block lo (if any) does not
+        b = lo - 1
+        keys = [_key(display) for display in self.block(b)]
+        return b * FRONT_BLOCK + sum(k < key for k in keys)
+
+    def prefix_range(self, prefix):
+        key = _key(prefix)
+        return self._bound(key), self._bound(key + b'\xff')
+
+    def complete(self, prefix, k=TOP_K):
+        """Top-k completions of `prefix`, heaviest first"""
+        if not len(self) or k <= 0:
+            return []
+        key = _key(prefix)
+        top = self.heavy.get(key) if k <= TOP_K else None
+        if top is not None:
+            ids = top[top >= 0][:k]
+        else:
+            lo, hi = self.prefix_range(prefix)
+            if hi <= lo:
+                return []
+            ids = _top(self.weights, lo, hi, k)
+        return [self.entry(int(i)) for i in ids]
+
+
+def autocomplete_index(data):
+    """Open (building once if needed) the autocomplete index for `data`"""
+    return open_index('autocomplete', data, build_autocomplete,
+                      lambda directory, data: AutocompleteIndex(directory))
+
+
+def autocomplete(data, prefix, k=TOP_K):
+    """Completions (titles and terms) for what has been typed so far"""
+    return autocomplete_index(data).complete(prefix, k)
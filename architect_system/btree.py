@@ -0,0 +1,336 @@
+# architect_system/btree.py
+"""
+Disk B+tree over (int64 key, int64 rowid) pairs in an mmap-able page file
+bulk_load builds one bottom-up: an external sort writes memory-bounded sorted
+runs, a k-way merge streams them back in order, leaves are packed to the fill
+factor as the merge produces them and each internal level is packed from the
+first keys of the level below. BPlusTree.insert is the classic one-pair-at-a-
+time path (descend, shift, split), kept for comparison and for later writes.
+
+Every page is PAGE_WORDS int64 words: kind, count, next leaf, then keys and
+rowids (leaf) or keys and child pages (internal). Page 0 is the header
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+PAGE_WORDS = 512             # 4KB pages
+HEADER_WORDS = 3             # kind, count, next leaf (-1 at the end)
+LEAF_CAPACITY = (PAGE_WORDS - HEADER_WORDS) // 2                 # 254 pairs
+INTERNAL_CAPACITY = (PAGE_WORDS - HEADER_WORDS - 1) // 2         # 254 keys, 255 children
+FILL_FACTOR = 0.9
+MEMORY_BYTES = 64 << 20      # sort runs and merge buffers stay within this
+MAGIC = 0x3145455254425041   # 'APBTREE1'
+LEAF, INTERNAL = 0, 1
+_ROOT, _HEIGHT, _COUNT, _PAGES = 2, 3, 4, 5   # header page words after MAGIC, PAGE_WORDS
+
+
+def _composite_upto(keys, rowids, key, rowid):
+    """How many (keys, rowids) pairs, sorted, are <= (key, rowid)"""
+    lo = np.searchsorted(keys, key, 'left')
+    hi = np.searchsorted(keys, key, 'right')
+    return int(lo + np.searchsorted(rowids[lo:hi], rowid, 'right'))
+
+
+def _sorted_runs(keys, rowids, directory, run_pairs):
+    """Sort the input in runs of run_pairs pairs; each run is one (n, 2) int64 file"""
+    paths = []
+    for lo in range(0, len(keys), run_pairs):
+        k = np.asarray(keys[lo:lo + run_pairs], dtype=np.int64)
+        r = (np.arange(lo, lo + len(k), dtype=np.int64) if rowids is None
+             else np.asarray(rowids[lo:lo + run_pairs], dtype=np.int64))
+        order = np.lexsort((r, k))
+        path = os.path.join(directory, f'run{len(paths):05d}.bin')
+        np.stack((k[order], r[order]), axis=1).tofile(path)
+        paths.append(path)
+    return paths
+
+
+def _merge_runs(paths, buffer_pairs):
+    """K-way merge of sorted run files, yielding (keys, rowids) batches in order
+
+    Each run is read buffer_pairs at a time. Everything up to the smallest
+    last-buffered pair of any run is final, so each round emits that prefix
+    of every buffer at once (one small lexsort) rather than one pair per heap pop.
+    """
+    runs = [np.memmap(path, dtype=np.int64, mode='r').reshape(-1, 2) for path in paths if os.path.getsize(path)]
+    positions = [0] * len(runs)
+    buffers = [run[:buffer_pairs] for run in runs]
+    while runs:
+        fence = min((int(b[-1, 0]), int(b[-1, 1])) for b in buffers)
+        parts = []
+        for i, buffer in enumerate(buffers):
+            take = _composite_upto(buffer[:, 0], buffer[:, 1], *fence)
+            parts.append(buffer[:take])
+            buffers[i] = buffer[take:]
+        batch = np.concatenate(parts)
+        order = np.lexsort((batch[:, 1], batch[:, 0]))
+        yield batch[order, 0], batch[order, 1]
+        for i in reversed(range(len(runs))):
+            if len(buffers[i]):
+                continue
+            positions[i] += buffer_pairs
+            buffers[i] = runs[i][positions[i]:positions[i] + buffer_pairs]
+            if not len(buffers[i]):
+                del runs[i], positions[i], buffers[i]
+
+
+class _PageWriter:
+    """Appends pages to the page file a batch at a time"""
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(np.zeros(PAGE_WORDS, dtype=np.int64).tobytes())    # header, written last
+        self.pages = 1
+
+    def write(self, pages):
+        self.file.write(np.ascontiguousarray(pages, dtype=np.int64).tobytes())
+        first = self.pages
+        self.pages += len(pages)
+        return first
+
+    def patch(self, page, word, value):
+        """Overwrite one word of a page already written"""
+        self.file.seek((page * PAGE_WORDS + word) * 8)
+        self.file.write(np.int64(value).tobytes())
+        self.file.seek(0, os.SEEK_END)
+
+    def close(self, root, height, count):
+        header = np.zeros(PAGE_WORDS, dtype=np.int64)
+        header[:_PAGES + 1] = (MAGIC, PAGE_WORDS, root, height, count, self.pages)
+        self.file.seek(0)
+        self.file.write(header.tobytes())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+def _leaf_pages(keys, rowids, per_leaf, first_page):
+    """Leaf pages for consecutive pairs, next pointers chained from first_page"""
+    n = -(-len(keys) // per_leaf)
+    pages = np.zeros((n, PAGE_WORDS), dtype=np.int64)
+    counts = np.full(n, per_leaf, dtype=np.int64)
+    counts[-1] = len(keys) - per_leaf * (n - 1)
+    pages[:, 0] = LEAF
+    pages[:, 1] = counts
+    pages[:, 2] = np.arange(first_page + 1, first_page + n + 1)
+    padded = np.zeros(n * per_leaf, dtype=np.int64)
+    padded[:len(keys)] = keys
+    pages[:, HEADER_WORDS:HEADER_WORDS + per_leaf] = padded.reshape(n, per_leaf)
+    padded[:len(rowids)] = rowids
+    pages[:, HEADER_WORDS + LEAF_CAPACITY:HEADER_WORDS + LEAF_CAPACITY + per_leaf] = padded.reshape(n, per_leaf)
+    return pages
+
+
+def _internal_pages(first_keys, children, fanout):
+    """One internal level over children (page numbers) whose smallest keys are first_keys"""
+    n = -(-len(children) // fanout)
+    pages = np.zeros((n, PAGE_WORDS), dtype=np.int64)
+    for i in range(n):
+        lo, hi = i * fanout, min((i + 1) * fanout, len(children))
+        pages[i, 0] = INTERNAL
+        pages[i, 1] = hi - lo - 1
+        pages[i, 2] = -1
+        pages[i, HEADER_WORDS:HEADER_WORDS + hi - lo - 1] = first_keys[lo + 1:hi]
+        pages[i, HEADER_WORDS + INTERNAL_CAPACITY:HEADER_WORDS + INTERNAL_CAPACITY + hi - lo] = children[lo:hi]
+    return pages, first_keys[::fanout]
+
+
+def bulk_load(path, keys, rowids=None, fill=FILL_FACTOR, memory_bytes=MEMORY_BYTES, spill_directory=None):
+    """Build a B+tree file at `path` from keys (and rowids, default the key positions)
+
+    Leaves hold fill * LEAF_CAPACITY pairs and internal pages fill *
+    INTERNAL_CAPACITY keys, leaving room for later inserts without splits.
+    """
+    if not 0 < fill <= 1:
+        raise ValueError("fill factor must be in (0, 1]")
+    per_leaf = max(1, int(LEAF_CAPACITY * fill))
+    fanout = max(2, int(INTERNAL_CAPACITY * fill) + 1)
+    run_pairs = max(1, memory_bytes // 32)         # a run plus its sort permutation
+    writer = _PageWriter(path)
+    first_keys = []
+    count = 0
+    carry_keys = carry_rowids = np.empty(0, dtype=np.int64)
+    with tempfile.TemporaryDirectory(prefix='architect_btree_', dir=spill_directory) as directory:
+        paths = _sorted_runs(keys, rowids, directory, run_pairs)
+        buffer_pairs = max(per_leaf, memory_bytes // 16 // (len(paths) + 1))
+        for batch_keys, batch_rowids in _merge_runs(paths, buffer_pairs):
+            batch_keys = np.concatenate((carry_keys, batch_keys))
+            batch_rowids = np.concatenate((carry_rowids, batch_rowids))
+            full = len(batch_keys) // per_leaf * per_leaf
+            if full:
+                writer.write(_leaf_pages(batch_keys[:full], batch_rowids[:full], per_leaf, writer.pages))
+                first_keys.append(batch_keys[:full:per_leaf])
+                count += full
+            carry_keys, carry_rowids = batch_keys[full:], batch_rowids[full:]
+    if len(carry_keys):
+        writer.write(_leaf_pages(carry_keys, carry_rowids, per_leaf, writer.pages))
+        first_keys.append(carry_keys[:1])
+        count += len(carry_keys)
+    if not first_keys:
+        writer.write(np.zeros((1, PAGE_WORDS), dtype=np.int64))
+        first_keys.append(np.zeros(1, dtype=np.int64))
+    level_keys = np.concatenate(first_keys)
+    leaves = len(level_keys)
+    # The last leaf ends the chain
+    writer.patch(leaves, 2, -1)
+    children = np.arange(1, leaves + 1, dtype=np.int64)
+    height = 1
+    while len(children) > 1:
+        pages, level_keys = _internal_pages(level_keys, children, fanout)
+        first = writer.write(pages)
+        children = np.arange(first, first + len(pages), dtype=np.int64)
+        height += 1
+    writer.close(int(children[0]), height, count)
+    return BPlusTree(path)
+
+
+class BPlusTree:
+    """A B+tree page file, mmapped; lookups descend from the root, scans follow leaf links"""
+
+    def __init__(self, path):
+        self.path = path
+        self._map()
+        header = self.pages[0]
+        if header[0] != MAGIC or header[1] != PAGE_WORDS:
+            raise ValueError(f"{path} is not a B+tree page file")
+
+    def _map(self):
+        self.pages = np.memmap(self.path, dtype=np.int64, mode='r+').reshape(-1, PAGE_WORDS)
+
+    @classmethod
+    def create(cls, path):
+        """An empty tree: the header and one empty root leaf"""
+        pages = np.zeros((2, PAGE_WORDS), dtype=np.int64)
+        pages[0, :_PAGES + 1] = (MAGIC, PAGE_WORDS, 1, 1, 0, 2)
+        pages[1, :HEADER_WORDS] = (LEAF, 0, -1)
+        pages.tofile(path)
+        return cls(path)
+
+    @property
+    def root(self):
+        return int(self.pages[0, _ROOT])
+
+    @property
+    def height(self):
+        return int(self.pages[0, _HEIGHT])
+
+    def __len__(self):
+        return int(self.pages[0, _COUNT])
+
+    @property
+    def nbytes(self):
+        return int(self.pages[0, _PAGES]) * PAGE_WORDS * 8
+
+    def _leaf_for(self, key, side='left'):
+        """(leaf page, internal path) for `key`; side='left' finds the leftmost duplicate's leaf"""
+        page = self.root
+        path = []
+        for _ in range(self.height - 1):
+            node = self.pages[page]
+            n = int(node[1])
+            i = int(np.searchsorted(node[HEADER_WORDS:HEADER_WORDS + n], key, side))
+            path.append((page, i))
+            page = int(node[HEADER_WORDS + INTERNAL_CAPACITY + i])
+        return page, path
+
+    def range(self, lo=None, hi=None):
+        """Rowids of the pairs with lo <= key < hi (either bound may be None), in key order"""
+        page, _ = self._leaf_for(np.iinfo(np.int64).min if lo is None else lo)
+        parts = []
+        while page != -1:
+            node = self.pages[page]
+            n = int(node[1])
+            keys = node[HEADER_WORDS:HEADER_WORDS + n]
+            start = 0 if lo is None else int(np.searchsorted(keys, lo, 'left'))
+            end = n if hi is None else int(np.searchsorted(keys, hi, 'left'))
+            parts.append(np.array(node[HEADER_WORDS + LEAF_CAPACITY + start:HEADER_WORDS + LEAF_CAPACITY + end]))
+            if end < n:
+                break
+            page = int(node[2])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def lookup(self, key):
+        """Rowids stored under `key`"""
+        return self.range(key, key + 1)
+
+    def _allocate(self):
+        """A fresh page at the end of the file, growing it by doubling"""
+        used = int(self.pages[0, _PAGES])
+        if used == len(self.pages):
+            self.pages.flush()
+            with open(self.path, 'r+b') as f:
+                f.truncate(2 * used * PAGE_WORDS * 8)
+            self._map()
+        self.pages[0, _PAGES] = used + 1
+        return used
+
+    def insert(self, key, rowid):
+        """Insert one pair: descend, shift it into its leaf, split full pages upward"""
+        page, path = self._leaf_for(key, 'right')
+        node = self.pages[page]
+        n = int(node[1])
+        keys = node[HEADER_WORDS:HEADER_WORDS + LEAF_CAPACITY]
+        rowids = node[HEADER_WORDS + LEAF_CAPACITY:HEADER_WORDS + 2 * LEAF_CAPACITY]
+        i = int(np.searchsorted(keys[:n], key, 'right'))
+        self.pages[0, _COUNT] += 1
+        if n < LEAF_CAPACITY:
+            keys[i + 1:n + 1] = keys[i:n]
+            rowids[i + 1:n + 1] = rowids[i:n]
+            keys[i], rowids[i] = key, rowid
+            node[1] = n + 1
+            return
+        # Full leaf: the upper half moves to a new page linked after it
+        all_keys = np.insert(keys[:n], i, key)
+        all_rowids = np.insert(rowids[:n], i, rowid)
+        half = (n + 1) // 2
+        new = self._allocate()
+        node = self.pages[page]
+        right = self.pages[new]
+        right[:HEADER_WORDS] = (LEAF, n + 1 - half, node[2])
+        right[HEADER_WORDS:HEADER_WORDS + n + 1 - half] = all_keys[half:]
+        right[HEADER_WORDS + LEAF_CAPACITY:HEADER_WORDS + LEAF_CAPACITY + n + 1 - half] = all_rowids[half:]
+        node[HEADER_WORDS:HEADER_WORDS + half] = all_keys[:half]
+        node[HEADER_WORDS + LEAF_CAPACITY:HEADER_WORDS + LEAF_CAPACITY + half] = all_rowids[:half]
+        node[1] = half
+        node[2] = new
+        self._insert_separator(path, int(all_keys[half]), new)
+
+    def _insert_separator(self, path, key, child):
+        """Add (key, child) to the parent at the end of `path`, splitting upward as needed"""
+        while path:
+            page, i = path.pop()
+            node = self.pages[page]
+            n = int(node[1])
+            keys = np.insert(node[HEADER_WORDS:HEADER_WORDS + n], i, key)
+            children = np.insert(node[HEADER_WORDS + INTERNAL_CAPACITY:HEADER_WORDS + INTERNAL_CAPACITY + n + 1],
+                                 i + 1, child)
+            if n < INTERNAL_CAPACITY:
+                node[HEADER_WORDS:HEADER_WORDS + n + 1] = keys
+                node[HEADER_WORDS + INTERNAL_CAPACITY:HEADER_WORDS + INTERNAL_CAPACITY + n + 2] = children
+                node[1] = n + 1
+                return
+            # Full internal page: the middle key moves up, the right half to a new page
+            mid = (n + 1) // 2
+            new = self._allocate()
+            node = self.pages[page]
+            right = self.pages[new]
+            right[:HEADER_WORDS] = (INTERNAL, n - mid, -1)
+            right[HEADER_WORDS:HEADER_WORDS + n - mid] = keys[mid + 1:]
+            right[HEADER_WORDS + INTERNAL_CAPACITY:HEADER_WORDS + INTERNAL_CAPACITY + n - mid + 1] = children[mid + 1:]
+            node[HEADER_WORDS:HEADER_WORDS + mid] = keys[:mid]
+            node[HEADER_WORDS + INTERNAL_CAPACITY:HEADER_WORDS + INTERNAL_CAPACITY + mid + 1] = children[:mid + 1]
+            node[1] = mid
+            key, child = int(keys[mid]), new
+        # The root split: a new root above it
+        root = self._allocate()
+        self.pages[root, :HEADER_WORDS] = (INTERNAL, 1, -1)
+        self.pages[root, HEADER_WORDS] = key
+        self.pages[root, HEADER_WORDS + INTERNAL_CAPACITY:HEADER_WORDS + INTERNAL_CAPACITY + 2] = (self.root, child)
+        self.pages[0, _ROOT] = root
+        self.pages[0, _HEIGHT] += 1
+
+    def flush(self):
+        self.pages.flush()
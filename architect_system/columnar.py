@@ -0,0 +1,262 @@
+# architect_system/columnar.py
+"""
+Columnar scan with predicate pushdown for scan(data, where)
+Fixed-width columns are compared with NumPy a run of blocks at a time;
+dictionary columns are compared once per distinct value and rows are tested
+by code lookup. Per-block min/max zone maps skip blocks that cannot match,
+and large scans are split across a process pool whose workers map the
+column files themselves
+"""
+
+import atexit
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from .storage import open_index
+
+BLOCK_ROWS = 1 << 16
+RUN_BLOCKS = 16              # consecutive candidate blocks evaluated per vectorized pass
+PARALLEL_ROWS = 1 << 22      # scans over fewer candidate rows stay in this process
+_COMPARE = {
+    '$eq': np.equal,
+    '$ne': np.not_equal,
+    '$gt': np.greater,
+    '$gte': np.greater_equal,
+    '$lt': np.less,
+    '$lte': np.less_equal,
+}
+
+
+def _tests(condition):
+    """[(op, operand)] of a literal or {'$op': operand, ...} condition"""
+    if not isinstance(condition, dict):
+        return [('$eq', condition)]
+    for op in condition:
+        if op not in _COMPARE and op not in ('$in', '$nin'):
+            raise ValueError(f"unsupported scan operator: {op}")
+    return list(condition.items())
+
+
+def _evaluate(values, tests):
+    """Boolean mask of the values passing every test"""
+    mask = None
+    for op, operand in tests:
+        if op == '$in':
+            passed = np.isin(values, list(operand))
+        elif op == '$nin':
+            passed = ~np.isin(values, list(operand))
+        else:
+            passed = _COMPARE[op](values, operand)
+        mask = passed if mask is None else np.logical_and(mask, passed, out=mask)
+    return mask
+
+
+def _zone_test(mins, maxs, tests):
+    """Blocks whose [min, max] can hold a passing value"""
+    may = np.ones(len(mins), dtype=bool)
+    for op, operand in tests:
+        if op == '$eq':
+            may &= (mins <= operand) & (maxs >= operand)
+        elif op == '$gt':
+            may &= maxs > operand
+        elif op == '$gte':
+            may &= maxs >= operand
+        elif op == '$lt':
+            may &= mins < operand
+        elif op == '$lte':
+            may &= mins <= operand
+        elif op == '$in':
+            wanted = np.sort(np.asarray(list(operand)))
+            may &= np.searchsorted(wanted, maxs, 'right') > np.searchsorted(wanted, mins, 'left')
+        # $ne and $nin almost never rule out a whole block; rows decide
+    return may
+
+
+def _runs(candidates, rows):
+    """(lo, hi) row ranges of consecutive candidate blocks, at most RUN_BLOCKS each"""
+    runs = []
+    blocks = np.flatnonzero(candidates).tolist()
+    i = 0
+    while i < len(blocks):
+        j = i + 1
+        while j < len(blocks) and j - i < RUN_BLOCKS and blocks[j] == blocks[j - 1] + 1:
+            j += 1
+        runs.append((blocks[i] * BLOCK_ROWS, min(blocks[j - 1] * BLOCK_ROWS + BLOCK_ROWS, rows)))
+        i = j
+    return runs
+
+
+def _scan_runs(column, predicates, runs):
+    """Matching row positions within `runs`; column(name) gives the array a predicate reads"""
+    parts = []
+    for lo, hi in runs:
+        mask = None
+        for name, kind, payload in predicates:
+            values = column(name)[lo:hi]
+            passed = payload[values] if kind == 'codes' else _evaluate(values, payload)
+            mask = passed if mask is None else np.logical_and(mask, passed, out=mask)
+            if not mask.any():
+                break
+        rows = np.arange(hi - lo) if mask is None else np.flatnonzero(mask)
+        if len(rows):
+            parts.append(rows + lo)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+_worker_data = {}
+
+
+def _scan_task(task):
+    """Pool worker: reopen the dataset by path (mmapped, nothing copied) and scan its runs"""
+    directory, lo, hi, predicates, runs = task
+    key = (directory, lo, hi)
+    data = _worker_data.get(key)
+    if data is None:
+        from wikipedia_dataset import ColumnarDataset
+        data = _worker_data[key] = ColumnarDataset(directory)[lo:hi]
+    return _scan_runs(data.column, predicates, runs)
+
+
+def _rows(data):
+    if isinstance(data, dict):
+        return len(next(iter(data.values()))) if data else 0
+    return len(data)
+
+
+def _columns(data):
+    """Names of the fixed-width and dictionary-coded columns of `data`"""
+    if isinstance(data, dict):
+        return [name for name, values in data.items()
+                if isinstance(values, np.ndarray) and values.dtype.kind in 'iufb']
+    return [name for name in data.columns if isinstance(data.column(name), np.ndarray)]
+
+
+class ColumnScan:
+    """Zone maps over a dataset's fixed-width columns, and scans that use them"""
+
+    def __init__(self, data, zones):
+        self.data = data
+        self.zones = zones           # column -> (mins, maxs) per block
+        self.rows = _rows(data)
+        self.blocks_scanned = 0
+        self.blocks_skipped = 0
+        self.bytes_covered = 0       # bytes of the referenced columns, skipped or not
+        self.bytes_scanned = 0       # bytes of the referenced columns actually compared
+        self._pool = None            # started on the first parallel scan, reused until close()
+        self._pool_workers = 0
+
+    def column(self, name):
+        if isinstance(self.data, dict):
+            return self.data[name]
+        return self.data.column(name)
+
+    def _compile(self, where):
+        """(column, kind, payload) per predicate: 'codes' with a lookup table, or 'values' with tests"""
+        predicates = []
+        dictionary_columns = getattr(self.data, 'dictionary_columns', ())
+        for name, condition in where.items():
+            if name not in self.zones:
+                raise ValueError(f"scan predicates need a fixed-width or dictionary column: {name!r}")
+            tests = _tests(condition)
+            if name in dictionary_columns:
+                # One comparison per distinct value; rows just index the resulting table
+                labels = np.asarray(self.data.dictionary(name))
+                table = _evaluate(labels, tests) if len(labels) else np.zeros(0, dtype=bool)
+                predicates.append((name, 'codes', table))
+            else:
+                predicates.append((name, 'values', tests))
+        return predicates
+
+    def candidates(self, predicates):
+        """Blocks the zone maps cannot rule out"""
+        may = np.ones(-(-self.rows // BLOCK_ROWS), dtype=bool)
+        for name, kind, payload in predicates:
+            mins, maxs = self.zones[name]
+            if kind == 'codes':
+                passing = np.concatenate(([0], np.cumsum(payload)))
+                may &= passing[maxs + 1] > passing[mins]
+            else:
+                may &= _zone_test(mins, maxs, payload)
+        return may
+
+    def scan(self, where, workers=None):
+        """Sorted positions of the rows matching every condition in `where`
+
+        Conditions are literals or {'$eq'|'$ne'|'$gt'|'$gte'|'$lt'|'$lte': v,
+        '$in'|'$nin': [...]} on fixed-width or dictionary columns.
+        """
+        predicates = self._compile(where)
+        candidates = self.candidates(predicates)
+        runs = _runs(candidates, self.rows)
+        scanned = sum(hi - lo for lo, hi in runs)
+        width = sum(self.column(name).dtype.itemsize for name in where)
+        self.blocks_scanned += int(candidates.sum())
+        self.blocks_skipped += int(len(candidates) - candidates.sum())
+        self.bytes_covered += width * self.rows
+        self.bytes_scanned += width * scanned
+        workers = workers or os.cpu_count() or 1
+        directory = getattr(self.data, 'directory', None)
+        if workers < 2 or directory is None or scanned < PARALLEL_ROWS:
+            return _scan_runs(self.column, predicates, runs)
+        # Runs are dealt out in order, so concatenating the results keeps rows sorted
+        step = -(-len(runs) // (workers * 4))
+        lo, hi = self.data.lo, self.data.hi
+        tasks = [(directory, lo, hi, predicates, runs[i:i + step]) for i in range(0, len(runs), step)]
+        return np.concatenate(self._workers(workers).map(_scan_task, tasks))
+
+    def _workers(self, workers):
+        """The scan pool, kept across scans so workers keep their mapped columns"""
+        if self._pool is not None and self._pool_workers != workers:
+            self.close()
+        if self._pool is None:
+            self._pool = Pool(workers)
+            self._pool_workers = workers
+            atexit.register(self.close)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            atexit.unregister(self.close)
+
+    def stats(self):
+        return {
+            "blocks_scanned": self.blocks_scanned,
+            "blocks_skipped": self.blocks_skipped,
+            "bytes_covered": self.bytes_covered,
+            "bytes_scanned": self.bytes_scanned,
+        }
+
+
+def _build_zones(data, directory):
+    column = data.__getitem__ if isinstance(data, dict) else data.column
+    starts = np.arange(0, _rows(data), BLOCK_ROWS)
+    for name in _columns(data):
+        values = column(name)
+        zones = np.empty((2, len(starts)), dtype=values.dtype)
+        if len(starts):
+            np.minimum.reduceat(values, starts, out=zones[0])
+            np.maximum.reduceat(values, starts, out=zones[1])
+        np.save(os.path.join(directory, f'{name}.zones.npy'), zones)
+
+
+def _load_zones(directory, data):
+    zones = {}
+    for name in _columns(data):
+        mins, maxs = np.load(os.path.join(directory, f'{name}.zones.npy'))
+        zones[name] = (mins, maxs)
+    return ColumnScan(data, zones)
+
+
+def column_scan(data):
+    """The ColumnScan of `data`; zone maps are built on first use and kept beside the dataset"""
+    return open_index('zonemaps', data, _build_zones, _load_zones)
+
+
+def scan(data, where, workers=None):
+    """Sorted positions of the documents matching `where` (see ColumnScan.scan)"""
+    return column_scan(data).scan(where, workers)
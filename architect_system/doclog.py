@@ -0,0 +1,446 @@
+# architect_system/doclog.py
+"""
+Append-only document log behind bulk_insert
+Documents are length-prefixed, checksummed records in numbered segment files.
+A syncer thread fsyncs whatever has been written since its last pass (group
+commit), a compactor thread merges sealed segments, and every SPARSE_EVERY-th
+record offset is kept in memory for point lookups by document id
+"""
+
+import atexit
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_right
+
+import numpy as np
+
+from .storage import data_directory
+
+SEGMENT_BYTES = 16 << 20     # the active segment is sealed past this size
+MERGED_BYTES = 256 << 20     # the compactor merges sealed segments up to this size
+SPARSE_EVERY = 16              # point reads pread at most this many records
+_HEADER = struct.Struct('<II')   # payload length, crc32 of payload
+_SCAN_SLAB = 16 << 20
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _payloads(docs):
+    """JSON bytes per document; datasets with iter_raw() hand theirs over unparsed"""
+    if hasattr(docs, 'iter_raw'):
+        return list(docs.iter_raw())
+    dumps = json.dumps
+    return [doc if isinstance(doc, bytes) else dumps(doc).encode('utf-8') for doc in docs]
+
+
+def _scan(fd, size):
+    """(count, sparse offsets, end of the last intact record) of a segment file"""
+    sparse = array('q')
+    count = 0
+    pos = 0
+    buf = b''
+    base = 0                     # file offset of buf[0]
+    while True:
+        rel = pos - base
+        if rel + _HEADER.size > len(buf) and base + len(buf) < size:
+            buf = buf[rel:] + os.pread(fd, _SCAN_SLAB, base + len(buf))
+            base = pos
+            continue
+        if rel + _HEADER.size > len(buf):
+            break
+        length, crc = _HEADER.unpack_from(buf, rel)
+        end = rel + _HEADER.size + length
+        if end > len(buf):
+            if base + len(buf) >= size:
+                break
+            buf = buf[rel:] + os.pread(fd, max(_SCAN_SLAB, end - rel), base + len(buf))
+            base = pos
+            continue
+        if zlib.crc32(buf[rel + _HEADER.size:end]) != crc:
+            break
+        if count % SPARSE_EVERY == 0:
+            sparse.append(pos)
+        count += 1
+        pos += _HEADER.size + length
+    return count, sparse, pos
+
+
+class _Segment:
+    """One segment file: ids first .. first + count - 1, records back to back"""
+
+    def __init__(self, path, first, fd, count, sparse, size):
+        self.path = path
+        self.first = first
+        self.fd = fd
+        self.count = count
+        self.sparse = sparse
+        self.size = size
+        self.sealed = False
+
+    @property
+    def index_path(self):
+        return self.path + '.idx.npy'
+
+    def write_index(self):
+        """Sidecar with count, size and sparse offsets, so reopening skips the scan"""
+        tmp = self.path + '.idx.tmp.npy'
+        np.save(tmp, np.concatenate(([self.count, self.size], np.frombuffer(self.sparse, dtype=np.int64))))
+        os.replace(tmp, self.index_path)
+
+    def read(self, k):
+        """Payload of the k-th record"""
+        block = k // SPARSE_EVERY
+        pos = self.sparse[block]
+        end = self.sparse[block + 1] if block + 1 < len(self.sparse) else self.size
+        # One pread covers the whole sparse span; the headers are walked in memory
+        buf = os.pread(self.fd, end - pos, pos)
+        rel = 0
+        for _ in range(k % SPARSE_EVERY):
+            length, _ = _HEADER.unpack_from(buf, rel)
+            rel += _HEADER.size + length
+        length, _ = _HEADER.unpack_from(buf, rel)
+        return buf[rel + _HEADER.size:rel + _HEADER.size + length]
+
+    def records(self, k, count):
+        """Payloads of records k .. count - 1, read a slab at a time"""
+        skip = k % SPARSE_EVERY
+        pos = self.sparse[k // SPARSE_EVERY]
+        buf = b''
+        base = pos
+        while k < count:
+            rel = pos - base
+            if rel + _HEADER.size > len(buf):
+                buf = buf[rel:] + os.pread(self.fd, _SCAN_SLAB, base + len(buf))
+                base = pos
+                continue
+            length, _ = _HEADER.unpack_from(buf, rel)
+            end = rel + _HEADER.size + length
+            if end > len(buf):
+                buf = buf[rel:] + os.pread(self.fd, max(_SCAN_SLAB, end - rel), base + len(buf))
+                base = pos
+                continue
+            if skip:
+                skip -= 1
+            else:
+                yield buf[rel + _HEADER.size:end]
+                k += 1
+            pos += _HEADER.size + length
+
+    def __del__(self):
+        # Readers may still hold a segment the compactor replaced, so fds close with the object
+        try:
+            os.close(self.fd)
+        except (OSError, AttributeError, TypeError):
+            pass
+
+
+def _open_segment(path, first):
+    fd = os.open(path, os.O_RDWR)
+    size = os.fstat(fd).st_size
+    try:
+        meta = np.load(path + '.idx.npy')
+        # A sidecar written with another SPARSE_EVERY has the wrong number of offsets
+        if int(meta[1]) == size and len(meta) - 2 == -(-int(meta[0]) // SPARSE_EVERY):
+            segment = _Segment(path, first, fd, int(meta[0]), array('q', meta[2:].tobytes()), size)
+            segment.sealed = True
+            return segment
+    except (FileNotFoundError, ValueError, IndexError, OSError):
+        pass
+    count, sparse, end = _scan(fd, size)
+    if end < size:
+        # Torn tail from a crash mid-write: never acknowledged, so it goes
+        os.ftruncate(fd, end)
+    return _Segment(path, first, fd, count, sparse, end)
+
+
+class DocumentLog:
+    """Segmented append-only log; ids are assigned in append order from 0"""
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, merged_bytes=MERGED_BYTES, commit_delay=0.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.merged_bytes = merged_bytes
+        self.commit_delay = commit_delay
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._synced_cond = threading.Condition(self._lock)
+        self._work = threading.Condition(self._lock)
+        self._compact_wanted = threading.Event()
+        self._closed = False
+        self.segments = self._recover()
+        self._firsts = [s.first for s in self.segments]
+        self._written = self._synced = 0
+        self._retiring = []
+        self._new_files = False
+        active = self.segments[-1] if self.segments else None
+        if active is None or active.sealed or active.size >= segment_bytes:
+            self._roll()
+        self._syncer = threading.Thread(target=self._sync_loop, name='doclog-sync', daemon=True)
+        self._compactor = threading.Thread(target=self._compact_loop, name='doclog-compact', daemon=True)
+        self._syncer.start()
+        self._compactor.start()
+        if any(s.sealed for s in self.segments[:-1]):
+            self._compact_wanted.set()
+
+    def _recover(self):
+        segments = []
+        expected = 0
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith('.seg'))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            first = int(name[:-4])
+            if first < expected:
+                # Already covered by a merged segment whose inputs were not yet unlinked
+                self._unlink(path)
+                continue
+            segment = _open_segment(path, first)
+            segments.append(segment)
+            expected = first + segment.count
+        for segment in segments[:-1]:
+            if not segment.sealed:
+                segment.write_index()
+                segment.sealed = True
+        return segments
+
+    def _unlink(self, path):
+        for p in (path, path + '.idx.npy'):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        last = self.segments[-1] if self.segments else None
+        return last.first + last.count if last else 0
+
+    def _roll(self):
+        """Start a new active segment; the old one is sealed once fsynced (lock held or in init)"""
+        first = len(self)
+        path = os.path.join(self.directory, f'{first:016d}.seg')
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        if self.segments and self.segments[-1].count == 0:
+            old = self.segments.pop()
+            self._firsts.pop()
+            if old.path != path:
+                self._unlink(old.path)
+        elif self.segments:
+            self._retiring.append(self.segments[-1])
+        self.segments.append(_Segment(path, first, fd, 0, array('q'), 0))
+        self._firsts.append(first)
+        self._new_files = True
+
+    def append(self, docs):
+        """Write documents; returns (range of ids, commit ticket for sync())"""
+        payloads = _payloads(docs)
+        if not payloads:
+            return range(len(self), len(self)), self._written
+        pack = _HEADER.pack
+        crc32 = zlib.crc32
+        chunks = []
+        for payload in payloads:
+            chunks.append(pack(len(payload), crc32(payload)))
+            chunks.append(payload)
+        buf = b''.join(chunks)
+        sizes = np.fromiter(map(len, payloads), dtype=np.int64, count=len(payloads)) + _HEADER.size
+        starts = np.cumsum(sizes) - sizes
+        del chunks, payloads
+        with self._lock:
+            if self._closed:
+                raise ValueError("document log is closed")
+            segment = self.segments[-1]
+            first = segment.first + segment.count
+            view = memoryview(buf)
+            written = 0
+            while written < len(buf):
+                written += os.pwrite(segment.fd, view[written:], segment.size + written)
+            view.release()
+            # Sparse entries for the record numbers that land on a SPARSE_EVERY boundary
+            k = (-segment.count) % SPARSE_EVERY
+            segment.sparse.extend((starts[k::SPARSE_EVERY] + segment.size).tolist())
+            segment.count += len(sizes)
+            segment.size += len(buf)
+            self._written += len(buf)
+            ticket = self._written
+            if segment.size >= self.segment_bytes:
+                self._roll()
+            self._work.notify_all()
+        return range(first, first + len(sizes)), ticket
+
+    def sync(self, ticket=None):
+        """Block until everything up to `ticket` (default: all written so far) is on disk"""
+        with self._lock:
+            target = self._written if ticket is None else ticket
+            while self._synced < target:
+                self._synced_cond.wait()
+
+    def _sync_loop(self):
+        while True:
+            with self._lock:
+                while self._synced == self._written and not self._retiring and not self._closed:
+                    self._work.wait()
+                if self._closed and self._synced == self._written and not self._retiring:
+                    return
+            if self.commit_delay and not self._closed:
+                # Small appends: give other writers a moment to join this fsync
+                time.sleep(self.commit_delay)
+            with self._lock:
+                # Everything written so far goes down in this one pass: that is the group commit
+                target = self._written
+                retiring, self._retiring = self._retiring, []
+                active = self.segments[-1]
+                new_files, self._new_files = self._new_files, False
+            for segment in retiring:
+                os.fsync(segment.fd)
+            os.fsync(active.fd)
+            if new_files:
+                _fsync_dir(self.directory)
+            for segment in retiring:
+                segment.write_index()
+                segment.sealed = True
+            with self._lock:
+                self._synced = max(self._synced, target)
+                self._synced_cond.notify_all()
+            if retiring:
+                self._compact_wanted.set()
+
+    def _compact_loop(self):
+        while True:
+            self._compact_wanted.wait()
+            self._compact_wanted.clear()
+            if self._closed:
+                return
+            while self.compact_once():
+                pass
+
+    def _merge_run(self):
+        """Longest run of adjacent sealed segments that fits in merged_bytes"""
+        with self._lock:
+            segments = [s for s in self.segments]
+        best = []
+        run = []
+        total = 0
+        for segment in segments:
+            if not segment.sealed or segment.size > self.merged_bytes // 2:
+                run, total = [], 0
+                continue
+            run.append(segment)
+            total += segment.size
+            while total > self.merged_bytes:
+                total -= run.pop(0).size
+            if len(run) > len(best):
+                best = list(run)
+        return best if len(best) > 1 else []
+
+    def compact_once(self):
+        """Merge one run of sealed segments into one file; False when there is nothing to do"""
+        run = self._merge_run()
+        if not run:
+            return False
+        head = run[0]
+        tmp = head.path + '.merge'
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        pos = 0
+        for segment in run:
+            offset = 0
+            while offset < segment.size:
+                chunk = os.pread(segment.fd, min(_SCAN_SLAB, segment.size - offset), offset)
+                os.pwrite(fd, chunk, pos)
+                offset += len(chunk)
+                pos += len(chunk)
+        os.fsync(fd)
+        count, sparse, size = _scan(fd, pos)
+        merged = _Segment(head.path, head.first, fd, count, sparse, size)
+        merged.sealed = True
+        if count != sum(s.count for s in run):
+            os.remove(tmp)
+            raise RuntimeError(f"segment merge at {head.path} lost records")
+        os.replace(tmp, head.path)
+        merged.write_index()
+        _fsync_dir(self.directory)
+        with self._lock:
+            i = self.segments.index(head)
+            self.segments[i:i + len(run)] = [merged]
+            self._firsts[i:i + len(run)] = [merged.first]
+        for segment in run[1:]:
+            self._unlink(segment.path)
+        return True
+
+    def read(self, doc_id):
+        """Raw payload stored under `doc_id`"""
+        with self._lock:
+            i = bisect_right(self._firsts, doc_id) - 1
+            segment = self.segments[i] if i >= 0 else None
+        if segment is None or not 0 <= doc_id - segment.first < segment.count:
+            raise KeyError(doc_id)
+        return segment.read(doc_id - segment.first)
+
+    def get(self, doc_id):
+        """The document stored under `doc_id`"""
+        return json.loads(self.read(doc_id))
+
+    def scan(self, start=0):
+        """(id, payload) for every record from `start` on, in id order"""
+        with self._lock:
+            # Counts are snapshotted: records appended during the scan are not visited
+            snapshot = [(s, s.count) for s in self.segments]
+        for segment, count in snapshot:
+            k = max(0, start - segment.first)
+            if k >= count:
+                continue
+            yield from enumerate(segment.records(k, count), segment.first + k)
+
+    def close(self):
+        """Sync everything, stop the background threads"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._work.notify_all()
+        self._syncer.join()
+        self._compact_wanted.set()
+        self._compactor.join()
+        active = self.segments[-1]
+        if active.count:
+            active.write_index()
+
+    @property
+    def nbytes(self):
+        return sum(s.size for s in self.segments)
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def document_log():
+    """The log bulk_insert writes to, opened (and recovered) on first use"""
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = DocumentLog(data_directory('documents'))
+            atexit.register(_log.close)
+        return _log
+
+
+def bulk_insert(docs, wait=True):
+    """Append a batch of documents; with wait=True returns only once they are durable
+
+    With wait=False the batch is written and left to the next group commit;
+    call document_log().sync() to wait for it. Returns the range of new ids.
+    """
+    log = document_log()
+    ids, ticket = log.append(docs)
+    if wait:
+        log.sync(ticket)
+    return ids
@@ -0,0 +1,609 @@
+# architect_system/docstore.py
+"""
+Document collection over the document log: find() and update()
+New versions of updated documents go to an update journal (a second
+DocumentLog, group-committed the same way) and a doc id -> journal id map
+points at the newest one. Secondary indexes on INDEXED_FIELDS (dotted JSON
+paths, array elements indexed one by one) are sorted packed (key code,
+doc id) arrays plus a delta buffer of moves, merged back only once the
+buffer outgrows a fraction of the index. The same path index over a
+dataset answers JSONB-style containment and path-equality queries
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .doclog import DocumentLog, document_log
+from .storage import data_directory, open_index
+
+INDEXED_FIELDS = ('category', 'year', 'author')
+ID_BITS = 40                     # packed entry: key code << ID_BITS | doc id
+MERGE_MIN = 4096                 # the delta buffer is merged past max(MERGE_MIN, entries // MERGE_FRACTION)
+MERGE_FRACTION = 64
+CATCH_UP_BATCH = 1 << 20         # documents parsed per index extend when catching up with the log
+COMMIT_DELAY = 0.002             # journal group commit window: updates are small, fsyncs are not
+_ID_MASK = (1 << ID_BITS) - 1
+_SCALARS = (str, int, float, bool, type(None))
+_COMPARE = {
+    '$gt': lambda a, b: a > b,
+    '$gte': lambda a, b: a >= b,
+    '$lt': lambda a, b: a < b,
+    '$lte': lambda a, b: a <= b,
+    '$ne': lambda a, b: a != b,
+    '$eq': lambda a, b: a == b,
+    '$in': lambda a, b: a in b,
+    '$nin': lambda a, b: a not in b,
+}
+
+
+class _Absent:
+    """Index value of a path a document does not have, kept apart from JSON null"""
+
+    def __repr__(self):
+        return '<absent>'
+
+
+_ABSENT = _Absent()
+
+
+def _key(value):
+    """Hashable index key of a field value; true and false never equal 1 and 0"""
+    if value is _ABSENT:
+        return value
+    if isinstance(value, bool):
+        return ('bool', value)
+    return value if isinstance(value, _SCALARS) else json.dumps(value, sort_keys=True)
+
+
+def _path_values(doc, path):
+    """Distinct values at a dotted path by index key, arrays flattened; {_ABSENT: _ABSENT} when absent"""
+    values = [doc]
+    for part in path.split('.'):
+        found = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                found.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = found
+    if not values:
+        return {_ABSENT: _ABSENT}
+    leaves = {}
+    for value in values:
+        for leaf in value if isinstance(value, list) else (value,):
+            leaves.setdefault(_key(leaf), leaf)
+    return leaves
+
+
+def _path_get(doc, path):
+    """The value at a dotted path, None when absent"""
+    for part in path.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _leaves(query, prefix=''):
+    """(dotted path, value) for every scalar in a containment query; array elements each count"""
+    if isinstance(query, dict):
+        for name, value in query.items():
+            yield from _leaves(value, f'{prefix}.{name}' if prefix else name)
+    elif isinstance(query, list):
+        for value in query:
+            yield from _leaves(value, prefix)
+    else:
+        yield prefix, query
+
+
+def _nested(query):
+    """True if the query has an object inside an array, which posting lists alone cannot check"""
+    if isinstance(query, dict):
+        return any(map(_nested, query.values()))
+    if isinstance(query, list):
+        return any(isinstance(item, dict) or _nested(item) for item in query)
+    return False
+
+
+def _contained(doc, query):
+    """JSONB @> on one document, with the index's leniency: a scalar matches an array holding it"""
+    if isinstance(query, list):
+        items = doc if isinstance(doc, list) else [doc]
+        return all(any(_contained(item, part) for item in items) for part in query)
+    if isinstance(doc, list):
+        return any(_contained(item, query) for item in doc)
+    if isinstance(query, dict):
+        return isinstance(doc, dict) and all(name in doc and _contained(doc[name], value)
+                                             for name, value in query.items())
+    return not isinstance(doc, dict) and _key(doc) == _key(query)
+
+
+def _predicate(condition):
+    """value -> bool for a filter condition: a literal or {'$op': operand, ...}"""
+    if not (isinstance(condition, dict) and condition and all(op.startswith('$') for op in condition)):
+        return lambda value: value == condition
+    tests = []
+    for op, operand in condition.items():
+        if op not in _COMPARE:
+            raise ValueError(f"unsupported filter operator: {op}")
+        tests.append((_COMPARE[op], operand))
+
+    def match(value):
+        try:
+            return all(test(value, operand) for test, operand in tests)
+        except TypeError:
+            return False
+    return match
+
+
+def _identical(a, b):
+    """JSON equality that, unlike ==, tells true from 1 and 1.0 from 1"""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_identical(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(map(_identical, a, b))
+    return a == b
+
+
+def _apply(doc, changes):
+    """Copy of `doc` with update operators applied; a plain dict means $set"""
+    if not any(op.startswith('$') for op in changes):
+        changes = {'$set': changes}
+    elif not all(op.startswith('$') for op in changes):
+        raise ValueError("update mixes operators and plain fields")
+    new = dict(doc)
+    for op, fields in changes.items():
+        if op == '$set':
+            new.update(fields)
+        elif op == '$unset':
+            for field in fields:
+                new.pop(field, None)
+        elif op == '$inc':
+            for field, by in fields.items():
+                new[field] = new.get(field, 0) + by
+        else:
+            raise ValueError(f"unsupported update operator: {op}")
+    return new
+
+
+class SecondaryIndex:
+    """Doc ids by field value: sorted packed array + delta buffer of added/removed ids"""
+
+    def __init__(self):
+        self.codes = {}          # value key -> code
+        self.values = []         # code -> value
+        self.entries = np.empty(0, dtype=np.int64)
+        self.added = {}          # code -> ids indexed since the last merge
+        self.removed = {}        # code -> ids in `entries` that no longer hold the value
+        self.pending = 0
+        self.merges = 0
+
+    def code(self, value):
+        key = _key(value)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def extend(self, values, ids):
+        """Bulk-index new documents (ids above everything indexed so far)"""
+        code = self.code
+        codes = np.fromiter((code(v) for v in values), dtype=np.int64, count=len(ids))
+        packed = (codes << ID_BITS) | np.asarray(ids, dtype=np.int64)
+        self.entries = np.sort(np.concatenate((self.entries, packed)), kind='stable')
+
+    def add(self, doc_id, value):
+        """Index `value` for an already indexed document"""
+        code = self.code(value)
+        removed = self.removed.get(code)
+        if removed and doc_id in removed:
+            removed.discard(doc_id)
+        else:
+            self.added.setdefault(code, set()).add(doc_id)
+        self._changed()
+
+    def remove(self, doc_id, value):
+        """Drop `value` for a document that no longer holds it"""
+        code = self.code(value)
+        added = self.added.get(code)
+        if added and doc_id in added:
+            added.discard(doc_id)
+        else:
+            self.removed.setdefault(code, set()).add(doc_id)
+        self._changed()
+
+    def _changed(self):
+        self.pending += 1
+        if self.pending > max(MERGE_MIN, len(self.entries) // MERGE_FRACTION):
+            self.merge()
+
+    def merge(self):
+        """Fold the delta buffer into the sorted array"""
+        def pack(delta):
+            parts = [(code << ID_BITS) | np.fromiter(ids, dtype=np.int64, count=len(ids))
+                     for code, ids in delta.items() if ids]
+            return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        removed, added = pack(self.removed), pack(self.added)
+        entries = self.entries
+        if len(removed):
+            entries = entries[~np.isin(entries, removed)]
+        self.entries = np.sort(np.concatenate((entries, added)), kind='stable')
+        self.added, self.removed = {}, {}
+        self.pending = 0
+        self.merges += 1
+
+    def lookup(self, codes):
+        """Sorted doc ids holding any of the value codes"""
+        parts = []
+        for code in codes:
+            lo, hi = np.searchsorted(self.entries, [code << ID_BITS, (code + 1) << ID_BITS])
+            ids = self.entries[lo:hi] & _ID_MASK
+            removed = self.removed.get(code)
+            if removed:
+                ids = ids[~np.isin(ids, np.fromiter(removed, dtype=np.int64, count=len(removed)))]
+            parts.append(ids)
+            added = self.added.get(code)
+            if added:
+                parts.append(np.fromiter(added, dtype=np.int64, count=len(added)))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]      # one slice of the sorted entries: already sorted and distinct
+        # A document holding several of the values (an array) is listed once
+        return np.unique(np.concatenate(parts))
+
+    def matching(self, condition):
+        """Value codes satisfying a filter condition"""
+        if isinstance(condition, dict) and set(condition) == {'$in'}:
+            keys = [_key(v) for v in condition['$in']]
+        elif isinstance(condition, dict) and set(condition) == {'$eq'}:
+            keys = [_key(condition['$eq'])]
+        elif not isinstance(condition, dict):
+            keys = [_key(condition)]
+        else:
+            test = _predicate(condition)
+            # A filter sees a missing field as null
+            return [code for code, value in enumerate(self.values)
+                    if test(None if value is _ABSENT else value)]
+        if None in keys:
+            keys.append(_ABSENT)
+        return sorted({self.codes[k] for k in keys if k in self.codes})
+
+    @property
+    def nbytes(self):
+        return self.entries.nbytes
+
+
+class JsonPathIndex:
+    """GIN-style path -> value index: a posting list of doc ids per value at each configured path
+
+    Paths are dotted ('meta.tags'); array values are indexed element by
+    element. Documents are extracted once, at insert(); queries parse them
+    only to recheck containment of objects inside arrays, through `load`
+    (doc id -> document) set by the owner.
+    """
+
+    def __init__(self, paths, load=None):
+        self.paths = tuple(paths)
+        self.load = load
+        self.indexes = {path: SecondaryIndex() for path in self.paths}
+        self._staged = {path: ([], []) for path in self.paths}
+
+    def insert(self, doc_id, doc):
+        """Stage a new document (ids ascending); commit() makes staged documents visible"""
+        for path, (values, ids) in self._staged.items():
+            leaves = _path_values(doc, path)
+            values.extend(leaves.values())
+            ids.extend([doc_id] * len(leaves))
+
+    def commit(self):
+        for path, (values, ids) in self._staged.items():
+            if ids:
+                self.indexes[path].extend(values, ids)
+                values.clear()
+                ids.clear()
+
+    def replace(self, doc_id, old, new):
+        """Re-index a document whose content changed from `old` to `new`"""
+        for path, index in self.indexes.items():
+            if '.' not in path:
+                # Most updates leave most top-level fields alone
+                value, new_value = old.get(path, _ABSENT), new.get(path, _ABSENT)
+                if _identical(value, new_value):
+                    continue
+            before, after = _path_values(old, path), _path_values(new, path)
+            for key in before.keys() - after.keys():
+                index.remove(doc_id, before[key])
+            for key in after.keys() - before.keys():
+                index.add(doc_id, after[key])
+
+    def lookup(self, path, condition):
+        """Sorted ids of documents with a value at `path` satisfying a filter condition"""
+        index = self.indexes[path]
+        return index.lookup(index.matching(condition))
+
+    def equals(self, path, value):
+        """Sorted ids of documents holding `value` at `path` (null matches only null)"""
+        index = self.indexes[path]
+        code = index.codes.get(_key(value))
+        return index.lookup([] if code is None else [code])
+
+    def contains(self, query):
+        """Sorted ids of documents containing `query` (JSONB @>)
+
+        Every scalar of the query must be at its path. Objects inside arrays
+        must also match element by element, so candidates for such queries
+        are rechecked against the documents.
+        """
+        postings = []
+        for path, value in _leaves(query):
+            if path not in self.indexes:
+                raise ValueError(f"path {path!r} is not indexed")
+            postings.append(self.equals(path, value))
+        if not postings:
+            raise ValueError("containment query has no values")
+        postings.sort(key=len)
+        ids = postings[0]
+        for posting in postings[1:]:
+            if not len(ids):
+                break
+            # Binary-search the survivors in each longer list rather than merging the two
+            at = np.minimum(np.searchsorted(posting, ids), len(posting) - 1)
+            ids = ids[posting[at] == ids]
+        if _nested(query) and len(ids):
+            if self.load is None:
+                raise ValueError("containment of objects inside arrays needs the documents")
+            ids = ids[np.fromiter((_contained(self.load(i), query) for i in ids.tolist()),
+                                  dtype=bool, count=len(ids))]
+        return ids
+
+    def save(self, directory):
+        meta = []
+        for i, (path, index) in enumerate(self.indexes.items()):
+            index.merge()
+            np.save(os.path.join(directory, f'path{i}.entries.npy'), index.entries)
+            absent = index.codes.get(_ABSENT)
+            meta.append({'path': path, 'absent': absent,
+                         'values': [None if code == absent else value for code, value in enumerate(index.values)]})
+        with open(os.path.join(directory, 'paths.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def open(cls, directory, load=None):
+        with open(os.path.join(directory, 'paths.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        index = cls([entry['path'] for entry in meta], load)
+        for i, entry in enumerate(meta):
+            path_index = index.indexes[entry['path']]
+            for code, value in enumerate(entry['values']):
+                path_index.code(_ABSENT if code == entry['absent'] else value)
+            path_index.entries = np.load(os.path.join(directory, f'path{i}.entries.npy'), mmap_mode='r')
+        return index
+
+    @property
+    def nbytes(self):
+        return sum(index.nbytes for index in self.indexes.values())
+
+
+class Collection:
+    """Documents of a DocumentLog, updatable, with secondary indexes on `fields`"""
+
+    def __init__(self, log, journal, fields=INDEXED_FIELDS):
+        self.log = log
+        self.journal = journal
+        self.fields = tuple(fields)
+        self.index = JsonPathIndex(self.fields, self._load)
+        self.indexes = self.index.indexes
+        self._lock = threading.Lock()
+        self.latest = {}         # doc id -> journal id of its newest version
+        for journal_id, payload in journal.scan():
+            doc_id, _, _ = payload.partition(b' ')
+            self.latest[int(doc_id)] = journal_id
+        self.indexed = 0         # log ids below this are in the indexes
+        self.index_seconds = 0.0
+        self.updated = 0
+
+    def __len__(self):
+        return len(self.log)
+
+    def refresh(self):
+        """Index documents inserted into the log since the last call"""
+        with self._lock:
+            self._catch_up()
+
+    def _catch_up(self):
+        if self.indexed == len(self.log):
+            return
+        start = time.perf_counter()
+        loads = json.loads
+        staged = 0
+        for doc_id, payload in self.log.scan(self.indexed):
+            doc = loads(payload) if doc_id not in self.latest else self._load(doc_id)
+            self.index.insert(doc_id, doc)
+            staged += 1
+            if staged == CATCH_UP_BATCH:
+                self.index.commit()
+                self.indexed, staged = doc_id + 1, 0
+        if staged:
+            self.index.commit()
+            self.indexed = doc_id + 1
+        self.index_seconds += time.perf_counter() - start
+
+    def _load(self, doc_id):
+        """Newest version of a document"""
+        journal_id = self.latest.get(doc_id)
+        if journal_id is None:
+            return json.loads(self.log.read(doc_id))
+        return json.loads(self.journal.read(journal_id).partition(b' ')[2])
+
+    def _candidates(self, filter):
+        """Sorted ids the indexed part of `filter` allows, and the rest as (field, predicate)"""
+        condition = filter.get('_id')
+        if len(filter) == 1 and type(condition) is int:
+            # Point update by id: no index involved
+            return [condition] if 0 <= condition < self.indexed else [], []
+        ids = None
+        residual = []
+        for field, condition in filter.items():
+            if field == '_id':
+                if isinstance(condition, dict) and set(condition) == {'$in'}:
+                    found = np.unique(np.array([i for i in condition['$in'] if type(i) is int], dtype=np.int64))
+                elif type(condition) is int:
+                    found = np.array([condition], dtype=np.int64)
+                else:
+                    test = _predicate(condition)
+                    found = np.arange(self.indexed, dtype=np.int64)
+                    found = found[np.fromiter(map(test, found.tolist()), dtype=bool, count=len(found))]
+                found = found[(found >= 0) & (found < self.indexed)]
+            elif field in self.indexes:
+                found = self.index.lookup(field, condition)
+            else:
+                residual.append((field, _predicate(condition)))
+                continue
+            ids = found if ids is None else np.intersect1d(ids, found, assume_unique=True)
+        if ids is None:
+            ids = np.arange(self.indexed, dtype=np.int64)
+        return ids.tolist(), residual
+
+    def _matches(self, filter):
+        """(id, document) pairs matching `filter`"""
+        self._catch_up()
+        ids, residual = self._candidates(filter)
+        for doc_id in ids:
+            doc = self._load(doc_id)
+            if all(test(_path_get(doc, field)) for field, test in residual):
+                yield doc_id, doc
+
+    def find(self, filter=None):
+        """Documents matching `filter`, each with its '_id'"""
+        with self._lock:
+            return [dict(doc, _id=doc_id) for doc_id, doc in self._matches(filter or {})]
+
+    def get(self, doc_id):
+        """The current version of a document"""
+        with self._lock:
+            if doc_id not in self.latest and not 0 <= doc_id < len(self.log):
+                raise KeyError(doc_id)
+            return self._load(doc_id)
+
+    def distinct(self, field):
+        """Values currently held by an indexed field"""
+        with self._lock:
+            self._catch_up()
+            index = self.indexes[field]
+            return [value for code, value in enumerate(index.values)
+                    if value is not _ABSENT and len(index.lookup([code]))]
+
+    def equals(self, path, value):
+        """Ids of documents holding `value` at an indexed path, without loading them"""
+        with self._lock:
+            self._catch_up()
+            return self.index.equals(path, value).tolist()
+
+    def contains(self, query):
+        """Ids of documents containing `query` (JSONB @>), answered from the path indexes"""
+        with self._lock:
+            self._catch_up()
+            return self.index.contains(query).tolist()
+
+    def update(self, filter, changes, wait=True):
+        """Apply `changes` to every document matching `filter`; returns the number modified
+
+        Changes are {'$set': {...}, '$unset': [...], '$inc': {...}} or a plain
+        dict of fields to set. With wait=False the new versions are left to the
+        next group commit of the journal; call sync() to wait for them.
+        """
+        with self._lock:
+            modified = []
+            for doc_id, doc in self._matches(filter):
+                new = _apply(doc, changes)
+                if not _identical(new, doc):
+                    modified.append((doc_id, doc, new))
+            if not modified:
+                return 0
+            dumps = json.dumps
+            payloads = [b'%d %s' % (doc_id, dumps(new).encode('utf-8')) for doc_id, _, new in modified]
+            journal_ids, ticket = self.journal.append(payloads)
+            start = time.perf_counter()
+            for journal_id, (doc_id, doc, new) in zip(journal_ids, modified):
+                self.latest[doc_id] = journal_id
+                self.index.replace(doc_id, doc, new)
+            self.index_seconds += time.perf_counter() - start
+            self.updated += len(modified)
+        if wait:
+            self.journal.sync(ticket)
+        return len(modified)
+
+    def sync(self):
+        """Block until every update so far is durable"""
+        self.journal.sync()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "documents": len(self.log),
+                "updated": self.updated,
+                "journal_bytes": self.journal.nbytes,
+                "index_seconds": self.index_seconds,
+                "index_bytes": sum(index.nbytes for index in self.indexes.values()),
+                "index_merges": sum(index.merges for index in self.indexes.values()),
+                "delta_entries": sum(index.pending for index in self.indexes.values()),
+            }
+
+
+_collection = None
+_collection_lock = threading.Lock()
+
+
+def document_collection():
+    """Collection over document_log(), its journal opened (and recovered) on first use"""
+    global _collection
+    with _collection_lock:
+        if _collection is None:
+            journal = DocumentLog(data_directory('document_updates'), commit_delay=COMMIT_DELAY)
+            atexit.register(journal.close)
+            _collection = Collection(document_log(), journal)
+        return _collection
+
+
+def update(filter, changes, wait=True):
+    """Update matching documents in the default collection; returns the number modified"""
+    return document_collection().update(filter, changes, wait)
+
+
+def get_document(doc_id):
+    """The current version of a document, updates included"""
+    return document_collection().get(doc_id)
+
+
+def _build_json_index(data, directory, paths):
+    index = JsonPathIndex(paths)
+    if hasattr(data, 'iter_raw'):
+        # Parse each document once, here; queries only touch the posting lists
+        docs = map(json.loads, data.iter_raw())
+    else:
+        docs = iter(data)
+    for doc_id, doc in enumerate(docs):
+        index.insert(doc_id, doc)
+        if doc_id % CATCH_UP_BATCH == CATCH_UP_BATCH - 1:
+            index.commit()
+    index.commit()
+    index.save(directory)
+
+
+def json_index(data, paths=INDEXED_FIELDS):
+    """JsonPathIndex over `paths` of `data`, positions as doc ids; built once and kept beside the dataset"""
+    paths = tuple(paths)
+    name = 'jsonpaths-' + hashlib.sha1('\n'.join(paths).encode('utf-8')).hexdigest()[:12]
+    return open_index(name, data, lambda data, directory: _build_json_index(data, directory, paths),
+                      lambda directory, data: JsonPathIndex.open(directory, lambda i: data[i]))
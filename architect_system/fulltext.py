@@ -0,0 +1,587 @@
+# architect_system/fulltext.py
+"""
+Inverted-index full-text search over the test documents
+Per-field positional postings, delta-encoded in 128-doc blocks whose
+first/last doc ids double as skip pointers for AND intersection
+"""
+
+import fnmatch
+import os
+import re
+from array import array
+
+import numpy as np
+
+from .storage import iter_field, open_index
+
+FIELDS = ('title', 'body')
+MAX_TERM_BYTES = 32
+BLOCK = 128
+MAX_EXPANSIONS = 1024        # wildcard terms kept (highest df first), as Lucene's clause limit
+_PARTITIONS = 64
+_FLUSH_TOKENS = 1 << 22
+_RECORD = np.dtype([('term', '<u4'), ('doc', '<u4'), ('pos', '<u4')])
+_WIDTHS = ((4, '<u4'), (2, '<u2'), (1, 'u1'))
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lowercased word tokens; over-long tokens are dropped"""
+    return [t for t in _TOKEN.findall(text.lower())
+            if len(t) <= MAX_TERM_BYTES and (t.isascii() or len(t.encode('utf-8')) <= MAX_TERM_BYTES)]
+
+
+def ragged_ranges(starts, lengths):
+    """Concatenation of range(s, s + n) for each (s, n), vectorized"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    before = np.cumsum(lengths) - lengths
+    return np.repeat(np.asarray(starts, dtype=np.int64) - before, lengths) + np.arange(total)
+
+
+def unique_sorted(values):
+    """Drop repeats from an already sorted array"""
+    if len(values) < 2:
+        return values
+    keep = np.empty(len(values), dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+def _map(path, dtype):
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+class _FieldBuilder:
+    """Tokenize one field, spill (term, doc, pos) records to partitions, then encode"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.vocab = {}
+        self.parts = [open(os.path.join(directory, f'part{p:02d}.tmp'), 'wb') for p in range(_PARTITIONS)]
+        self.terms = array('I')
+        self.doc_ids = array('I')
+        self.counts = array('I')
+
+    def add(self, doc_id, text):
+        if not text:
+            return
+        vocab = self.vocab
+        ids = [vocab.setdefault(t, len(vocab)) for t in tokenize(text)]
+        if ids:
+            self.terms.extend(ids)
+            self.doc_ids.append(doc_id)
+            self.counts.append(len(ids))
+            if len(self.terms) >= _FLUSH_TOKENS:
+                self._flush()
+
+    def _flush(self):
+        if not self.terms:
+            return
+        terms = np.frombuffer(self.terms, dtype=np.uint32)
+        counts = np.frombuffer(self.counts, dtype=np.uint32).astype(np.int64)
+        starts = np.cumsum(counts) - counts
+        records = np.empty(len(terms), dtype=_RECORD)
+        records['term'] = terms
+        records['doc'] = np.repeat(np.frombuffer(self.doc_ids, dtype=np.uint32), counts)
+        records['pos'] = np.arange(len(terms)) - np.repeat(starts, counts)
+        part = terms % _PARTITIONS
+        order = np.argsort(part, kind='stable')
+        records = records[order]
+        bounds = np.searchsorted(part[order], np.arange(_PARTITIONS + 1))
+        for p in range(_PARTITIONS):
+            records[bounds[p]:bounds[p + 1]].tofile(self.parts[p])
+        del terms, counts
+        self.terms = array('I')
+        self.doc_ids = array('I')
+        self.counts = array('I')
+
+    def finish(self):
+        self._flush()
+        for f in self.parts:
+            f.close()
+        # Final term id = rank in sorted order (str order is UTF-8 byte order)
+        sorted_terms = sorted(self.vocab)
+        rank = np.empty(len(sorted_terms), dtype=np.int64)
+        rank[np.fromiter((self.vocab[t] for t in sorted_terms), dtype=np.int64,
+                         count=len(sorted_terms))] = np.arange(len(sorted_terms))
+        terms = np.array([t.encode('utf-8') for t in sorted_terms], dtype=f'S{MAX_TERM_BYTES}')
+        np.save(os.path.join(self.directory, 'terms.npy'), terms)
+        del sorted_terms, terms
+        self.vocab = None
+        self._encode(rank)
+
+    def _encode(self, rank):
+        vocab_size = len(rank)
+        term_block = np.zeros(vocab_size, dtype=np.int64)
+        term_nblocks = np.zeros(vocab_size, dtype=np.int32)
+        term_df = np.zeros(vocab_size, dtype=np.int64)
+        tables = {name: [] for name in ('first', 'last', 'offset', 'width', 'count', 'post', 'pos')}
+        n_blocks = n_post = n_pos = byte_off = 0
+        join = os.path.join
+        with open(join(self.directory, 'postings.bin'), 'wb') as postings, \
+                open(join(self.directory, 'freqs.u32'), 'wb') as freqs, \
+                open(join(self.directory, 'positions.u32'), 'wb') as positions:
+            for p in range(_PARTITIONS):
+                part_file = join(self.directory, f'part{p:02d}.tmp')
+                records = np.fromfile(part_file, dtype=_RECORD)
+                os.remove(part_file)
+                n = len(records)
+                if not n:
+                    continue
+                term = rank[records['term']]
+                doc = records['doc'].astype(np.int64)
+                pos = records['pos']
+                del records
+                order = np.lexsort((pos, doc, term))
+                term, doc, pos = term[order], doc[order], pos[order]
+                del order
+                positions.write(pos.astype('<u4').tobytes())
+
+                # Postings: one per (term, doc); positions of a posting are contiguous
+                new = np.ones(n, dtype=bool)
+                new[1:] = (term[1:] != term[:-1]) | (doc[1:] != doc[:-1])
+                pstart = np.flatnonzero(new)
+                m = len(pstart)
+                pterm = term[pstart]
+                pdoc = doc[pstart]
+                freq = np.diff(np.append(pstart, n))
+                freqs.write(freq.astype('<u4').tobytes())
+
+                tnew = np.ones(m, dtype=bool)
+                tnew[1:] = pterm[1:] != pterm[:-1]
+                tstart = np.flatnonzero(tnew)
+                tlen = np.diff(np.append(tstart, m))
+                k = np.arange(m) - np.repeat(tstart, tlen)
+                bstart = np.flatnonzero(k % BLOCK == 0)
+                bcount = np.diff(np.append(bstart, m))
+
+                # Frame of reference per block: deltas from the previous doc, 0 at block start
+                delta = np.zeros(m, dtype=np.int64)
+                delta[1:] = pdoc[1:] - pdoc[:-1]
+                delta[bstart] = 0
+                bmax = np.maximum.reduceat(delta, bstart)
+                bwidth = np.where(bmax < 1 << 8, 1, np.where(bmax < 1 << 16, 2, 4)).astype(np.uint8)
+                pwidth = np.repeat(bwidth, bcount)
+                boffset = np.empty(len(bstart), dtype=np.int64)
+                # Widest blocks first keeps every block naturally aligned
+                for w, dtype in _WIDTHS:
+                    sel = bwidth == w
+                    sizes = bcount[sel] * w
+                    boffset[sel] = byte_off + np.cumsum(sizes) - sizes
+                    values = delta[pwidth == w].astype(dtype)
+                    postings.write(values.tobytes())
+                    byte_off += values.nbytes
+                pad = -byte_off % 4
+                postings.write(b'\0' * pad)
+                byte_off += pad
+
+                tb = np.searchsorted(bstart, tstart)
+                term_ids = pterm[tstart]
+                term_block[term_ids] = n_blocks + tb
+                term_nblocks[term_ids] = np.diff(np.append(tb, len(bstart)))
+                term_df[term_ids] = tlen
+
+                tables['first'].append(pdoc[bstart].astype(np.uint32))
+                tables['last'].append(pdoc[bstart + bcount - 1].astype(np.uint32))
+                tables['offset'].append(boffset)
+                tables['width'].append(bwidth)
+                tables['count'].append(bcount.astype(np.uint16))
+                tables['post'].append(n_post + bstart)
+                tables['pos'].append(n_pos + pstart[bstart])
+                n_blocks += len(bstart)
+                n_post += m
+                n_pos += n
+
+        dtypes = {'first': np.uint32, 'last': np.uint32, 'offset': np.int64, 'width': np.uint8,
+                  'count': np.uint16, 'post': np.int64, 'pos': np.int64}
+        for name, parts in tables.items():
+            column = np.concatenate(parts) if parts else np.empty(0, dtype=dtypes[name])
+            np.save(join(self.directory, f'block_{name}.npy'), column)
+        np.save(join(self.directory, 'term_block.npy'), term_block)
+        np.save(join(self.directory, 'term_nblocks.npy'), term_nblocks)
+        np.save(join(self.directory, 'term_df.npy'), term_df)
+
+
+class FieldIndex:
+    """Read side of one field's postings, all arrays mmapped"""
+
+    def __init__(self, directory):
+        def load(name):
+            return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+        self.terms = load('terms')
+        self.term_block = load('term_block')
+        self.term_nblocks = load('term_nblocks')
+        self.term_df = load('term_df')
+        self.first = load('block_first')
+        self.last = load('block_last')
+        self.offset = load('block_offset')
+        self.width = load('block_width')
+        self.count = load('block_count')
+        self.post = load('block_post')
+        self.pos = load('block_pos')
+        self.postings = _map(os.path.join(directory, 'postings.bin'), np.uint8)
+        self.freqs = _map(os.path.join(directory, 'freqs.u32'), np.uint32)
+        self.positions = _map(os.path.join(directory, 'positions.u32'), np.uint32)
+
+    def lookup(self, term):
+        """Term id, or -1"""
+        key = term.encode('utf-8')
+        i = int(np.searchsorted(self.terms, key))
+        if i < len(self.terms) and self.terms[i] == key:
+            return i
+        return -1
+
+    def prefix_range(self, prefix):
+        """[lo, hi) of term ids starting with `prefix`"""
+        key = prefix.encode('utf-8')
+        lo = int(np.searchsorted(self.terms, key))
+        hi = int(np.searchsorted(self.terms, key + b'\xff'))
+        return lo, hi
+
+    def df(self, term_id):
+        return int(self.term_df[term_id]) if term_id >= 0 else 0
+
+    def _blocks(self, term_id):
+        b0 = int(self.term_block[term_id])
+        return np.arange(b0, b0 + int(self.term_nblocks[term_id]))
+
+    def decode(self, blocks):
+        """Doc ids, frequencies and position starts for every posting in `blocks`"""
+        counts = self.count[blocks].astype(np.int64)
+        total = int(counts.sum())
+        docs = np.empty(total, dtype=np.int64)
+        out_start = np.cumsum(counts) - counts
+        widths = self.width[blocks]
+        for w, dtype in _WIDTHS:
+            sel = np.flatnonzero(widths == w)
+            if not len(sel):
+                continue
+            b = blocks[sel]
+            n = counts[sel]
+            raw = self.postings[ragged_ranges(self.offset[b], n * w)].view(dtype).astype(np.int64)
+            running = np.cumsum(raw)
+            seg = np.cumsum(n) - n
+            docs[ragged_ranges(out_start[sel], n)] = (
+                np.repeat(self.first[b].astype(np.int64) - running[seg], n) + running)
+        freq = self.freqs[ragged_ranges(self.post[blocks], counts)].astype(np.int64)
+        before = np.cumsum(freq) - freq
+        pos_start = before + np.repeat(self.pos[blocks] - before[out_start], counts)
+        return docs, freq, pos_start
+
+    def postings_of(self, term_id):
+        if term_id < 0:
+            return np.empty(0, dtype=np.int64)
+        return self.decode(self._blocks(term_id))[0]
+
+    def filter(self, term_id, candidates):
+        """Postings of term_id restricted to sorted `candidates`, decoding only blocks they can hit"""
+        empty = np.empty(0, dtype=np.int64)
+        if term_id < 0 or not len(candidates):
+            return empty, empty, empty
+        b0 = int(self.term_block[term_id])
+        last = self.last[b0:b0 + int(self.term_nblocks[term_id])]
+        k = np.searchsorted(last, candidates)
+        k = unique_sorted(k[k < len(last)])
+        docs, freq, pos_start = self.decode(b0 + k)
+        j = np.searchsorted(docs, candidates)
+        inside = j < len(docs)
+        j = j[inside]
+        hit = j[docs[j] == candidates[inside]]
+        return docs[hit], freq[hit], pos_start[hit]
+
+    def expand(self, pattern):
+        """Term ids matching a * / ? pattern, at most MAX_EXPANSIONS by document frequency"""
+        literal = re.split(r'[*?]', pattern, maxsplit=1)[0]
+        lo, hi = self.prefix_range(literal) if literal else (0, len(self.terms))
+        ids = np.arange(lo, hi)
+        if pattern != literal + '*':
+            regex = re.compile(fnmatch.translate(pattern).encode('utf-8'))
+            ids = ids[np.fromiter((regex.match(t) is not None for t in self.terms[lo:hi]),
+                                  dtype=bool, count=hi - lo)]
+        if len(ids) > MAX_EXPANSIONS:
+            ids = np.sort(ids[np.argsort(-self.term_df[ids], kind='stable')[:MAX_EXPANSIONS]])
+        return ids
+
+    def phrase(self, words, candidates=None):
+        """Docs where `words` occur consecutively"""
+        ids = [self.lookup(w) for w in words]
+        if min(ids) < 0:
+            return np.empty(0, dtype=np.int64)
+        order = sorted(range(len(ids)), key=lambda i: self.df(ids[i]))
+        docs = self.postings_of(ids[order[0]]) if candidates is None else candidates
+        for i in order[1 if candidates is None else 0:]:
+            docs = self.filter(ids[i], docs)[0]
+        keys = None
+        for i, term_id in enumerate(ids):
+            hit, freq, pos_start = self.filter(term_id, docs)
+            pos = self.positions[ragged_ranges(pos_start, freq)].astype(np.int64) - i
+            key = (np.repeat(hit, freq) << 32) | np.maximum(pos, 0)
+            key = key[pos >= 0]
+            keys = key if keys is None else np.intersect1d(keys, key, assume_unique=True)
+        return unique_sorted(keys >> 32)
+
+
+class TextIndex:
+    """All field indexes over one dataset"""
+
+    def __init__(self, directory, doc_count):
+        self.doc_count = doc_count
+        self.fields = {field: FieldIndex(os.path.join(directory, field)) for field in FIELDS}
+
+    def vocabulary(self):
+        """Sorted terms of all fields and each term's document frequency summed over fields"""
+        terms = np.unique(np.concatenate([index.terms for index in self.fields.values()]))
+        df = np.zeros(len(terms), dtype=np.int64)
+        for index in self.fields.values():
+            df[np.searchsorted(terms, index.terms)] += index.term_df
+        return terms, df
+
+    def scope(self, field):
+        if field is None:
+            return list(self.fields.values())
+        return [self.fields[field]] if field in self.fields else []
+
+
+def build_text_index(data, directory):
+    for field in FIELDS:
+        builder = _FieldBuilder(os.path.join(directory, field))
+        for doc_id, text in enumerate(iter_field(data, field)):
+            builder.add(doc_id, text)
+        builder.finish()
+
+
+def union_sorted(arrays):
+    """Sorted union of sorted doc id arrays"""
+    arrays = [a for a in arrays if len(a)]
+    if not arrays:
+        return np.empty(0, dtype=np.int64)
+    if len(arrays) == 1:
+        return arrays[0]
+    # np.unique hashes first in numpy 2; a plain sort is several times faster here
+    merged = np.concatenate(arrays)
+    merged.sort()
+    return unique_sorted(merged)
+
+
+# Query tree: evaluate() gives sorted doc ids, filter() narrows sorted candidates
+
+class _Term:
+    def __init__(self, field, word):
+        self.field = field
+        self.word = word
+
+    def cost(self, index):
+        return sum(f.df(f.lookup(self.word)) for f in index.scope(self.field))
+
+    def evaluate(self, index):
+        return union_sorted([f.postings_of(f.lookup(self.word)) for f in index.scope(self.field)])
+
+    def filter(self, index, candidates):
+        return union_sorted([f.filter(f.lookup(self.word), candidates)[0] for f in index.scope(self.field)])
+
+
+class _Phrase:
+    def __init__(self, field, words):
+        self.field = field
+        self.words = words
+
+    def cost(self, index):
+        return min(_Term(self.field, w).cost(index) for w in self.words)
+
+    def evaluate(self, index):
+        return union_sorted([f.phrase(self.words) for f in index.scope(self.field)])
+
+    def filter(self, index, candidates):
+        return union_sorted([f.phrase(self.words, candidates) for f in index.scope(self.field)])
+
+
+class _Wildcard:
+    def __init__(self, field, pattern):
+        self.field = field
+        self.pattern = pattern
+
+    def cost(self, index):
+        return sum(int(f.term_df[f.expand(self.pattern)].sum()) for f in index.scope(self.field))
+
+    def evaluate(self, index):
+        return union_sorted([f.postings_of(int(t)) for f in index.scope(self.field) for t in f.expand(self.pattern)])
+
+    def filter(self, index, candidates):
+        return union_sorted([f.filter(int(t), candidates)[0]
+                       for f in index.scope(self.field) for t in f.expand(self.pattern)])
+
+
+class _Not:
+    def __init__(self, child):
+        self.child = child
+
+    def cost(self, index):
+        return index.doc_count
+
+    def evaluate(self, index):
+        return np.setdiff1d(np.arange(index.doc_count), self.child.evaluate(index), assume_unique=True)
+
+    def filter(self, index, candidates):
+        return np.setdiff1d(candidates, self.child.filter(index, candidates), assume_unique=True)
+
+
+class _And:
+    def __init__(self, children):
+        self.children = children
+
+    def cost(self, index):
+        return min(c.cost(index) for c in self.children)
+
+    def evaluate(self, index):
+        # Cheapest clause drives; the rest only probe the blocks its docs can land in
+        ordered = sorted(self.children, key=lambda c: c.cost(index))
+        docs = ordered[0].evaluate(index)
+        return self.filter(index, docs, ordered[1:])
+
+    def filter(self, index, candidates, children=None):
+        for child in (self.children if children is None else children):
+            if not len(candidates):
+                break
+            candidates = child.filter(index, candidates)
+        return candidates
+
+
+class _Or:
+    def __init__(self, children):
+        self.children = children
+
+    def cost(self, index):
+        return sum(c.cost(index) for c in self.children)
+
+    def evaluate(self, index):
+        return union_sorted([c.evaluate(index) for c in self.children])
+
+    def filter(self, index, candidates):
+        return union_sorted([c.filter(index, candidates) for c in self.children])
+
+
+_LEX = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"?|([^\s()"]+))')
+
+
+def _word_node(field, word):
+    word = word.lower()
+    if '*' in word or '?' in word:
+        return _Wildcard(field, word)
+    words = tokenize(word)
+    if not words:
+        return None
+    return _Term(field, words[0]) if len(words) == 1 else _Phrase(field, words)
+
+
+def _combine(cls, nodes):
+    nodes = [n for n in nodes if n is not None]
+    if not nodes:
+        return None
+    return nodes[0] if len(nodes) == 1 else cls(nodes)
+
+
+class _Parser:
+    """Query-string syntax: AND binds tighter than OR, bare juxtaposition is OR,
+    NOT, parentheses, "phrases", * and ? wildcards, field:term and field:(...)"""
+
+    def __init__(self, query):
+        self.tokens = []
+        for m in _LEX.finditer(query):
+            if m.group(1):
+                self.tokens.append(('(', None))
+            elif m.group(2):
+                self.tokens.append((')', None))
+            elif m.group(3) is not None:
+                self.tokens.append(('phrase', m.group(3)))
+            elif m.group(4):
+                self.tokens.append(('word', m.group(4)))
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.i += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or(None)
+        while self.i < len(self.tokens):
+            # Stray ')' : skip it and keep going
+            self.take()
+            node = _combine(_Or, [node, self.parse_or(None)])
+        return node
+
+    def parse_or(self, field):
+        nodes = [self.parse_and(field)]
+        while self.peek()[0] not in (None, ')'):
+            if self.peek() == ('word', 'OR'):
+                self.take()
+            nodes.append(self.parse_and(field))
+        return _combine(_Or, nodes)
+
+    def parse_and(self, field):
+        nodes = [self.parse_unary(field)]
+        while self.peek() == ('word', 'AND'):
+            self.take()
+            nodes.append(self.parse_unary(field))
+        return _combine(_And, nodes)
+
+    def parse_unary(self, field):
+        if self.peek() == ('word', 'NOT'):
+            self.take()
+            child = self.parse_unary(field)
+            return _Not(child) if child is not None else None
+        return self.parse_primary(field)
+
+    def parse_primary(self, field):
+        kind, value = self.take()
+        if kind == ')':
+            # Belongs to an enclosing group
+            self.i -= 1
+            return None
+        if kind == '(':
+            node = self.parse_or(field)
+            if self.peek()[0] == ')':
+                self.take()
+            return node
+        if kind == 'phrase':
+            words = tokenize(value)
+            if not words:
+                return None
+            return _Term(field, words[0]) if len(words) == 1 else _Phrase(field, words)
+        if kind == 'word':
+            name, sep, rest = value.partition(':')
+            if sep and name in FIELDS:
+                return _word_node(name, rest) if rest else self.parse_primary(name)
+            return _word_node(field, value)
+        return None
+
+
+def index_documents(data):
+    """Open (building once if needed) the full-text index for `data`"""
+    return open_index('fulltext', data, build_text_index,
+                      lambda directory, data: TextIndex(directory, len(data)))
+
+
+def fulltext_search(data, query):
+    """Sorted ids of the documents matching an Elasticsearch query_string style query"""
+    index = index_documents(data)
+    node = _Parser(query).parse()
+    if node is None:
+        return np.empty(0, dtype=np.int64)
+    return node.evaluate(index)
+
+
+def search(data, query):
+    """MongoDB $text style search: any of the words, over title and body"""
+    return fulltext_search(data, query)
@@ -0,0 +1,141 @@
+# architect_system/fuzzy.py
+"""
+Fuzzy term matching over the full-text term dictionary
+Symmetric-delete index (SymSpell style, with a prefix limit): every term is
+filed under each string reachable by deleting up to MAX_DISTANCE characters
+from its prefix, so a typo finds its candidates with a few binary searches
+"""
+
+import os
+import zlib
+from array import array
+
+import numpy as np
+
+from .fulltext import index_documents, ragged_ranges, tokenize, union_sorted
+from .storage import open_index
+
+MAX_DISTANCE = 2
+PREFIX = 7
+MAX_EXPANSIONS = 50          # terms per query token, as Elasticsearch's fuzzy max_expansions
+
+
+def deletes(word, distance):
+    """`word` and every string obtained by deleting up to `distance` characters"""
+    out = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def _key(variant):
+    # Collisions only add candidates, which are verified anyway
+    return zlib.crc32(variant.encode('utf-8'))
+
+
+def edit_distance(a, b, limit):
+    """Optimal-string-alignment distance (adjacent transpositions count 1); limit + 1 if above limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+        # A transposition can still reach back one row, so both rows must be over
+        if min(current) > limit and min(previous) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def build_fuzzy_index(data, directory):
+    terms, df = index_documents(data).vocabulary()
+    keys = array('I')
+    ids = array('I')
+    for term_id, term in enumerate(terms):
+        variants = deletes(term.decode('utf-8')[:PREFIX], MAX_DISTANCE)
+        keys.extend(_key(v) for v in variants)
+        ids.extend([term_id] * len(variants))
+    keys = np.frombuffer(keys, dtype=np.uint32)
+    order = np.argsort(keys, kind='stable')
+    np.save(os.path.join(directory, 'terms.npy'), terms)
+    np.save(os.path.join(directory, 'df.npy'), df)
+    np.save(os.path.join(directory, 'keys.npy'), keys[order])
+    np.save(os.path.join(directory, 'ids.npy'), np.frombuffer(ids, dtype=np.uint32)[order])
+
+
+class FuzzyIndex:
+    """Read side of the symmetric-delete table, all arrays mmapped"""
+
+    def __init__(self, directory, text):
+        def load(name):
+            return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+        self.text = text
+        self.terms = load('terms')
+        self.df = load('df')
+        self.keys = load('keys')
+        self.ids = load('ids')
+
+    def candidates(self, word, distance):
+        """Terms within `distance` edits of `word`, closest and most frequent first"""
+        probe = np.fromiter((_key(v) for v in deletes(word[:PREFIX], distance)), dtype=np.uint32)
+        lo = np.searchsorted(self.keys, probe, 'left')
+        hi = np.searchsorted(self.keys, probe, 'right')
+        ids = np.unique(self.ids[ragged_ranges(lo, hi - lo)])
+        matches = []
+        for term_id in ids:
+            term = self.terms[term_id].decode('utf-8')
+            d = edit_distance(word, term, distance)
+            if d <= distance:
+                matches.append((d, -int(self.df[term_id]), term))
+        matches.sort()
+        return [term for _, _, term in matches[:MAX_EXPANSIONS]]
+
+    def token_docs(self, terms, candidates=None):
+        """Docs containing any of `terms` in any field (restricted to sorted candidates if given)"""
+        found = []
+        for field in self.text.fields.values():
+            for term in terms:
+                term_id = field.lookup(term)
+                if candidates is None:
+                    found.append(field.postings_of(term_id))
+                else:
+                    found.append(field.filter(term_id, candidates)[0])
+        return union_sorted(found)
+
+    def cost(self, terms):
+        return sum(field.df(field.lookup(t)) for field in self.text.fields.values() for t in terms)
+
+
+def fuzzy_index(data):
+    """Open (building once if needed) the fuzzy index for `data`"""
+    return open_index('fuzzy', data, build_fuzzy_index,
+                      lambda directory, data: FuzzyIndex(directory, index_documents(data)))
+
+
+def fuzzy_search(data, query, distance=2):
+    """Sorted ids of documents matching every query word within `distance` edits"""
+    if not 0 <= distance <= MAX_DISTANCE:
+        raise ValueError(f"distance must be between 0 and {MAX_DISTANCE}")
+    index = fuzzy_index(data)
+    expansions = [index.candidates(word, distance) for word in tokenize(query)]
+    if not expansions or not all(expansions):
+        return np.empty(0, dtype=np.int64)
+    # Intersect from the rarest token: later tokens only probe the blocks the survivors hit
+    expansions.sort(key=index.cost)
+    docs = index.token_docs(expansions[0])
+    for terms in expansions[1:]:
+        if not len(docs):
+            break
+        docs = index.token_docs(terms, docs)
+    return docs
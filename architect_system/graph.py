@@ -0,0 +1,407 @@
+# architect_system/graph.py
+"""
+Wikipedia link graph: the [[wikilinks]] of the enwiki dump as compressed sparse rows
+One pass over the XML, sharded across a process pool, hashes article titles
+and link targets; links are then resolved through redirects to article ids
+and written as CSR adjacency (out-links and in-links) in flat int32/int64
+files that are memory-mapped when opened. BFS runs a frontier at a time,
+each level one vectorized gather over the adjacency, and shortest paths
+are searched from both ends at once
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from multiprocessing import Pool
+
+import numpy as np
+
+from .storage import load_meta
+
+CHUNK_EDGES = 1 << 24        # adjacency entries gathered per vectorized step
+DENSE_FRONTIER = 32          # frontiers above nodes / this are collected with one pass over the depths
+_LINK = re.compile(r'\[\[([^\[\]|#]*)')
+_NAMESPACES = frozenset({
+    'category', 'file', 'image', 'media', 'template', 'wikipedia', 'wp', 'help', 'portal',
+    'draft', 'module', 'special', 'user', 'talk', 'mediawiki', 'timedtext', 'book', 'wikt',
+    'wiktionary', 'w', 's', 'wikisource', 'q', 'wikiquote', 'commons', 'meta', 'mw', 'd',
+    'user talk', 'wikipedia talk', 'template talk', 'category talk', 'file talk', 'help talk',
+    'portal talk', 'draft talk', 'module talk',
+})
+_FILES = {
+    'out_offsets': np.int64, 'out_targets': np.int32,
+    'in_offsets': np.int64, 'in_targets': np.int32,
+    'title_offsets': np.int64, 'titles': np.uint8,
+    'title_hashes': np.uint64, 'title_nodes': np.int32,
+}
+
+
+def _normalize(title):
+    """MediaWiki title form: spaces for underscores, single spaces, first letter upper case"""
+    title = ' '.join(title.replace('_', ' ').split())
+    return title[:1].upper() + title[1:]
+
+
+def _target(link):
+    """Article title a [[link]] points at, None for other namespaces and in-page anchors"""
+    link = link.strip().lstrip(':')
+    prefix, colon, _ = link.partition(':')
+    if colon and prefix.strip().lower() in _NAMESPACES:
+        return None
+    return _normalize(link) or None
+
+
+def _hash(titles):
+    digest = hashlib.blake2b
+    return np.fromiter((int.from_bytes(digest(title.encode('utf-8'), digest_size=8).digest(), 'little')
+                        for title in titles), dtype=np.uint64, count=len(titles))
+
+
+def _children(elem):
+    return {child.tag.rsplit('}', 1)[-1]: child for child in elem}
+
+
+def _shard_links(task):
+    """Pool worker: article titles, redirects and link targets of one byte range, hashed"""
+    xml_path, start, end = task
+    from download_test_data import shard_pages
+    titles, redirect_from, redirect_to, link_src, link_dst = [], [], [], [], []
+    pages = shard_pages(xml_path, start, end)
+    try:
+        for page in pages:
+            fields = _children(page)
+            ns = fields.get('ns')
+            if (ns is not None and ns.text != '0') or fields.get('title') is None:
+                continue
+            title = _normalize(fields['title'].text or '')
+            redirect = fields.get('redirect')
+            if redirect is not None:
+                target = _target(redirect.get('title') or '')
+                if target:
+                    redirect_from.append(title)
+                    redirect_to.append(target)
+                continue
+            revision = fields.get('revision')
+            text = _children(revision).get('text') if revision is not None else None
+            body = (text.text if text is not None else None) or ''
+            targets = {target for target in map(_target, _LINK.findall(body)) if target}
+            link_src.extend([len(titles)] * len(targets))
+            link_dst.extend(targets)
+            titles.append(title)
+    finally:
+        pages.close()
+    encoded = [title.encode('utf-8') for title in titles]
+    return {
+        'articles': _hash(titles),
+        'titles': b''.join(encoded),
+        'title_lengths': np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)),
+        'redirect_from': _hash(redirect_from),
+        'redirect_to': _hash(redirect_to),
+        'link_src': np.array(link_src, dtype=np.int32),
+        'link_dst': _hash(link_dst),
+    }
+
+
+class _Resolver:
+    """Title hash -> node id, through at most two redirects; -1 for titles that are not articles"""
+
+    def __init__(self, hashes, redirect_from, redirect_to):
+        self.order = np.argsort(hashes, kind='stable').astype(np.int32)
+        self.hashes = hashes[self.order]
+        order = np.argsort(redirect_from, kind='stable')
+        self.redirect_from = redirect_from[order]
+        redirect_to = redirect_to[order]
+        nodes = self._article(redirect_to)
+        # Double redirects: a redirect to a redirect takes the second one's article
+        again = nodes < 0
+        nodes[again] = self._find(self.redirect_from, redirect_to[again], nodes.copy())
+        self.redirect_nodes = nodes
+
+    @staticmethod
+    def _find(keys, values, found, missing=-1):
+        if not len(keys):
+            return np.full(len(values), missing, dtype=np.int32)
+        at = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+        return np.where(keys[at] == values, found[at], missing).astype(np.int32)
+
+    def _article(self, hashes):
+        return self._find(self.hashes, hashes, self.order)
+
+    def __call__(self, hashes):
+        nodes = self._article(hashes)
+        missing = nodes < 0
+        nodes[missing] = self._find(self.redirect_from, hashes[missing], self.redirect_nodes)
+        return nodes
+
+
+def _append(path, array):
+    with open(path, 'ab') as f:
+        f.write(np.ascontiguousarray(array).tobytes())
+
+
+def _map(path, dtype):
+    """Read-only memory map of a flat array file (an empty array for an empty file)"""
+    if not os.path.getsize(path):
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+def _source_stamp(xml_path):
+    stat = os.stat(xml_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_link_graph(xml_path, directory, workers=None):
+    """Extract the link graph of an enwiki XML dump into `directory`"""
+    from download_test_data import shard_ranges
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+    def path(name):
+        return os.path.join(directory, name)
+
+    spill_src, spill_dst = path('links.src.tmp'), path('links.dst.tmp')
+    for name in (*_FILES, 'links.src.tmp', 'links.dst.tmp'):
+        open(path(name), 'wb').close()
+
+    # Pass 1: hash titles and link targets; nodes are articles in dump order
+    nodes = 0
+    articles, redirect_from, redirect_to, shards, lengths = [], [], [], [], []
+    tasks = [(xml_path, lo, hi) for lo, hi in shard_ranges(xml_path)]
+    with Pool(workers or os.cpu_count() or 1) as pool:
+        for part in pool.imap(_shard_links, tasks):
+            articles.append(part['articles'])
+            redirect_from.append(part['redirect_from'])
+            redirect_to.append(part['redirect_to'])
+            lengths.append(part['title_lengths'])
+            _append(path('titles'), np.frombuffer(part['titles'], dtype=np.uint8))
+            _append(spill_src, part['link_src'] + np.int32(nodes))
+            _append(spill_dst, part['link_dst'])
+            shards.append((nodes, nodes + len(part['articles']), len(part['link_src'])))
+            nodes += len(part['articles'])
+    hashes = np.concatenate(articles) if articles else np.empty(0, dtype=np.uint64)
+    resolve = _Resolver(hashes, np.concatenate(redirect_from) if redirect_from else hashes[:0],
+                        np.concatenate(redirect_to) if redirect_to else hashes[:0])
+    title_offsets = np.zeros(nodes + 1, dtype=np.int64)
+    if lengths:
+        np.cumsum(np.concatenate(lengths), out=title_offsets[1:])
+    _append(path('title_offsets'), title_offsets)
+    _append(path('title_hashes'), resolve.hashes)
+    _append(path('title_nodes'), resolve.order)
+
+    # Pass 2: resolve targets to nodes, drop self-links and duplicates, write out-link CSR
+    out_degrees = np.zeros(nodes, dtype=np.int64)
+    sources = _map(spill_src, np.int32)
+    targets = _map(spill_dst, np.uint64)
+    resolved_sources = path('links.resolved.tmp')
+    open(resolved_sources, 'wb').close()
+    position = 0
+    for lo, hi, count in shards:
+        src = np.asarray(sources[position:position + count], dtype=np.int64)
+        dst = resolve(np.asarray(targets[position:position + count])).astype(np.int64)
+        position += count
+        keep = (dst >= 0) & (dst != src)
+        # A shard's links come in source order; sorting the packed pair also orders each list
+        pairs = np.unique(src[keep] << 32 | dst[keep])
+        src, dst = (pairs >> 32).astype(np.int32), (pairs & 0xFFFFFFFF).astype(np.int32)
+        out_degrees[lo:hi] = np.bincount(src - lo, minlength=hi - lo)
+        _append(path('out_targets'), dst)
+        _append(resolved_sources, src)
+    del sources, targets
+    edges = int(out_degrees.sum())
+    out_offsets = np.zeros(nodes + 1, dtype=np.int64)
+    np.cumsum(out_degrees, out=out_offsets[1:])
+    _append(path('out_offsets'), out_offsets)
+
+    # Pass 3: in-link CSR by a counting sort of the out-links on target
+    out_targets = _map(path('out_targets'), np.int32)
+    sources = _map(resolved_sources, np.int32)
+    in_degrees = np.zeros(nodes, dtype=np.int64)
+    for lo in range(0, edges, CHUNK_EDGES):
+        in_degrees += np.bincount(out_targets[lo:lo + CHUNK_EDGES], minlength=nodes)
+    in_offsets = np.zeros(nodes + 1, dtype=np.int64)
+    np.cumsum(in_degrees, out=in_offsets[1:])
+    _append(path('in_offsets'), in_offsets)
+    if edges:
+        in_targets = np.memmap(path('in_targets'), dtype=np.int32, mode='w+', shape=(edges,))
+        fill = in_offsets[:-1].copy()
+        for lo in range(0, edges, CHUNK_EDGES):
+            dst = np.asarray(out_targets[lo:lo + CHUNK_EDGES])
+            order = np.argsort(dst, kind='stable')
+            dst = dst[order]
+            first = np.flatnonzero(np.r_[True, dst[1:] != dst[:-1]])
+            counts = np.diff(np.r_[first, len(dst)])
+            rank = np.arange(len(dst)) - np.repeat(first, counts)
+            in_targets[fill[dst] + rank] = np.asarray(sources[lo:lo + CHUNK_EDGES])[order]
+            fill[dst[first]] += counts
+        in_targets.flush()
+        del in_targets
+    del out_targets, sources
+    for name in ('links.src.tmp', 'links.dst.tmp', 'links.resolved.tmp'):
+        os.remove(path(name))
+    # meta.json goes last: a directory without it is an interrupted build
+    with open(path('meta.json'), 'w') as f:
+        json.dump({'stamp': _source_stamp(xml_path), 'nodes': nodes, 'edges': edges,
+                   'redirects': len(resolve.redirect_from)}, f)
+
+
+def _edges(offsets, targets, frontier):
+    """(source, neighbor) arrays for every edge out of `frontier`, about CHUNK_EDGES at a time"""
+    starts = offsets[frontier]
+    counts = offsets[frontier + 1] - starts
+    ends = np.cumsum(counts)
+    if not len(ends) or not ends[-1]:
+        return
+    cuts = np.unique(np.searchsorted(ends, np.arange(CHUNK_EDGES, ends[-1], CHUNK_EDGES), 'right'))
+    for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(frontier)]):
+        c = counts[lo:hi]
+        total = int(c.sum())
+        if not total:
+            continue
+        first = np.repeat(starts[lo:hi] - (ends[lo:hi] - c - (ends[lo - 1] if lo else 0)), c)
+        yield np.repeat(frontier[lo:hi], c), np.asarray(targets[first + np.arange(total)], dtype=np.int64)
+
+
+class LinkGraph:
+    """Link graph opened from a build directory: CSR out-links and in-links, memory-mapped"""
+
+    def __init__(self, directory):
+        meta = load_meta(directory)
+        self.directory = directory
+        self.nodes, self.edges, self.redirects = meta['nodes'], meta['edges'], meta['redirects']
+        for name, dtype in _FILES.items():
+            setattr(self, name, _map(os.path.join(directory, name), dtype))
+        self.edges_traversed = 0
+        # Scratch predecessor arrays shared by shortest-path searches; the lock serializes them
+        self._lock = threading.Lock()
+        self._forward = self._backward = None
+
+    def __len__(self):
+        return self.nodes
+
+    def title(self, node):
+        lo, hi = self.title_offsets[node], self.title_offsets[node + 1]
+        return self.titles[lo:hi].tobytes().decode('utf-8')
+
+    def node(self, title):
+        """Node id of an article title (not following redirects), KeyError if absent"""
+        key = _hash([_normalize(title)])
+        at = int(np.searchsorted(self.title_hashes, key[0]))
+        if at == len(self.title_hashes) or self.title_hashes[at] != key[0]:
+            raise KeyError(title)
+        return int(self.title_nodes[at])
+
+    def out_degree(self, nodes):
+        return self.out_offsets[np.asarray(nodes) + 1] - self.out_offsets[nodes]
+
+    def neighbors(self, node, reverse=False):
+        """Nodes `node` links to (or, reverse, the nodes linking to it)"""
+        offsets, targets = (self.in_offsets, self.in_targets) if reverse else (self.out_offsets, self.out_targets)
+        return np.asarray(targets[offsets[node]:offsets[node + 1]])
+
+    def bfs(self, source, max_depth=None, reverse=False):
+        """Depth of every node from `source` along out-links (in-links if reverse), -1 if unreached"""
+        offsets, targets = (self.in_offsets, self.in_targets) if reverse else (self.out_offsets, self.out_targets)
+        depth = np.full(self.nodes, -1, dtype=np.int32)
+        depth[source] = 0
+        frontier = np.array([source], dtype=np.int64)
+        level = 0
+        while len(frontier) and (max_depth is None or level < max_depth):
+            level += 1
+            found = []
+            for _, neighbors in _edges(offsets, targets, frontier):
+                self.edges_traversed += len(neighbors)
+                fresh = neighbors[depth[neighbors] < 0]
+                depth[fresh] = level
+                found.append(fresh)
+            if sum(map(len, found)) * DENSE_FRONTIER > self.nodes:
+                frontier = np.flatnonzero(depth == level)
+            else:
+                frontier = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+        return depth
+
+    def shortest_path(self, source, target):
+        """Nodes of a shortest out-link path from source to target, None if there is none
+
+        Bidirectional BFS: each step expands a whole level of whichever side
+        (out-links from source, in-links from target) has fewer edges to
+        scan. Any node where that level first meets the other side lies on
+        a shortest path, so the search stops there.
+        """
+        if source == target:
+            return [source]
+        with self._lock:
+            if self._forward is None:
+                self._forward = np.full(self.nodes, -1, dtype=np.int32)
+                self._backward = np.full(self.nodes, -1, dtype=np.int32)
+            sides = [(self._forward, self.out_offsets, self.out_targets),
+                     (self._backward, self.in_offsets, self.in_targets)]
+            frontiers = [np.array([source], dtype=np.int64), np.array([target], dtype=np.int64)]
+            self._forward[source], self._backward[target] = source, target
+            touched = [frontiers[0], frontiers[1]]
+            try:
+                while len(frontiers[0]) and len(frontiers[1]):
+                    costs = [int(self.out_degree(frontiers[0]).sum()),
+                             int((self.in_offsets[frontiers[1] + 1] - self.in_offsets[frontiers[1]]).sum())]
+                    side = 0 if costs[0] <= costs[1] else 1
+                    parents, offsets, targets = sides[side]
+                    other = sides[1 - side][0]
+                    found = []
+                    for sources, neighbors in _edges(offsets, targets, frontiers[side]):
+                        self.edges_traversed += len(neighbors)
+                        fresh = parents[neighbors] < 0
+                        neighbors = neighbors[fresh]
+                        parents[neighbors] = sources[fresh]
+                        found.append(neighbors)
+                        meets = neighbors[other[neighbors] >= 0]
+                        if len(meets):
+                            touched.extend(found)
+                            return self._path(int(meets[0]), source, target)
+                    frontiers[side] = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+                    touched.append(frontiers[side])
+                return None
+            finally:
+                for nodes in touched:
+                    self._forward[nodes] = -1
+                    self._backward[nodes] = -1
+
+    def _path(self, meet, source, target):
+        path = [meet]
+        while path[-1] != source:
+            path.append(int(self._forward[path[-1]]))
+        path.reverse()
+        while path[-1] != target:
+            path.append(int(self._backward[path[-1]]))
+        return path
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in _FILES)
+
+    def stats(self):
+        return {"nodes": self.nodes, "edges": self.edges, "redirects": self.redirects,
+                "edges_traversed": self.edges_traversed, "bytes": self.nbytes}
+
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def link_graph(xml_path=None, directory=None, workers=None):
+    """LinkGraph of an enwiki dump (WIKIPEDIA_XML by default), built once beside it and reused"""
+    if xml_path is None:
+        from download_test_data import WIKIPEDIA_XML
+        xml_path = WIKIPEDIA_XML
+    directory = directory or xml_path + '.linkgraph'
+    with _graphs_lock:
+        graph = _graphs.get(directory)
+        meta = load_meta(directory)
+        if meta is None or meta.get('stamp') != _source_stamp(xml_path):
+            build_link_graph(xml_path, directory, workers)
+            graph = None
+        if graph is None:
+            graph = _graphs[directory] = LinkGraph(directory)
+        return graph
@@ -0,0 +1,261 @@
+# architect_system/joins.py
+"""
+Join operators over column tables (dicts of equal-length NumPy arrays)
+hash_join builds a bucket-chained hash table over the smaller input and
+probes it a chunk at a time; when the build side does not fit the memory
+budget both inputs are hash-partitioned into spill files and joined one
+partition at a time. merge_join walks two inputs already sorted on the key,
+and multi_join pipelines chunks of a fact table through the hash tables of
+several dimension tables. Every operator yields the result in chunks
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+CHUNK_ROWS = 1 << 20
+MEMORY_BYTES = 256 << 20
+TABLE_OVERHEAD = 3           # build side bytes x this ~ in-memory hash table bytes
+_PARTITION_MIX = np.uint64(0x9E3779B97F4A7C15)
+_BUCKET_MIX = np.uint64(0xC2B2AE3D27D4EB4F)
+
+
+def _rows(table):
+    return len(next(iter(table.values()))) if table else 0
+
+
+def _nbytes(table):
+    return sum(column.nbytes for column in table.values())
+
+
+def _keys(table, key):
+    keys = table[key]
+    if keys.dtype.kind not in 'iub':
+        raise ValueError(f"join key {key!r} must be an integer column")
+    return keys
+
+
+def _hash(keys, bits, mix):
+    """Top `bits` bits of a multiplicative hash of integer keys"""
+    if bits == 0:
+        return np.zeros(len(keys), dtype=np.int64)
+    h = keys.astype(np.int64, copy=False).view(np.uint64) * mix
+    return (h >> np.uint64(64 - bits)).astype(np.int64)
+
+
+def _expand(lo, hi):
+    """(i, j) pairs for every j in [lo[i], hi[i])"""
+    counts = hi - lo
+    total = int(counts.sum())
+    i = np.repeat(np.arange(len(lo)), counts)
+    j = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + lo[i]
+    return i, j
+
+
+def _keys_of(on):
+    """(left key, right key) from 'key' or ('left_key', 'right_key')"""
+    return (on, on) if isinstance(on, str) else tuple(on)
+
+
+def _output_names(left, right, left_key, right_key):
+    """Left columns, then right columns; a shared key appears once, other clashes get '_right'"""
+    names = [(name, 'left', name) for name in left]
+    for name in right:
+        if name == right_key and right_key == left_key:
+            continue
+        names.append((name + '_right' if name in left else name, 'right', name))
+    return names
+
+
+def _gather(left, right, names, li, ri):
+    return {out: (left if side == 'left' else right)[name][li if side == 'left' else ri]
+            for out, side, name in names}
+
+
+def _chunks(table, rows=CHUNK_ROWS):
+    for lo in range(0, _rows(table), rows):
+        yield {name: np.asarray(column[lo:lo + rows]) for name, column in table.items()}
+
+
+class HashTable:
+    """Rows of a build input grouped by hash bucket: keys in bucket order plus bucket starts"""
+
+    def __init__(self, keys):
+        self.bits = max(1, len(keys).bit_length())      # about two buckets per row
+        buckets = _hash(keys, self.bits, _BUCKET_MIX)
+        self.rows = np.argsort(buckets, kind='stable')
+        self.keys = keys[self.rows]
+        self.starts = np.zeros((1 << self.bits) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(buckets, minlength=1 << self.bits), out=self.starts[1:])
+
+    def probe(self, keys):
+        """(probe positions, build rows) of every matching pair"""
+        buckets = _hash(keys, self.bits, _BUCKET_MIX)
+        i, j = _expand(self.starts[buckets], self.starts[buckets + 1])
+        hit = self.keys[j] == keys[i]
+        return i[hit], self.rows[j[hit]]
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.keys.nbytes + self.starts.nbytes
+
+
+def _join_in_memory(left, right, left_key, right_key, names):
+    """Hash join with the smaller side built; yields chunks of the probe side's matches"""
+    build_left = _nbytes(left) < _nbytes(right)
+    build, probe = (left, right) if build_left else (right, left)
+    build_key, probe_key = (left_key, right_key) if build_left else (right_key, left_key)
+    build = {name: np.asarray(column) for name, column in build.items()}
+    table = HashTable(_keys(build, build_key))
+    for chunk in _chunks(probe):
+        pi, bi = table.probe(_keys(chunk, probe_key))
+        if len(pi):
+            yield _gather(build, chunk, names, bi, pi) if build_left else _gather(chunk, build, names, pi, bi)
+
+
+def _partition(table, key, bits, directory, side):
+    """Append each chunk's rows to one set of column files per hash partition"""
+    for chunk in _chunks(table):
+        parts = _hash(_keys(chunk, key), bits, _PARTITION_MIX)
+        order = np.argsort(parts, kind='stable')
+        bounds = np.zeros((1 << bits) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parts, minlength=1 << bits), out=bounds[1:])
+        for name, column in chunk.items():
+            column = column[order]
+            for p in range(1 << bits):
+                if bounds[p + 1] > bounds[p]:
+                    with open(os.path.join(directory, f'{side}.{p}.{name}'), 'ab') as f:
+                        f.write(column[bounds[p]:bounds[p + 1]].tobytes())
+
+
+def _read_partition(table, directory, side, p):
+    columns = {}
+    for name, column in table.items():
+        path = os.path.join(directory, f'{side}.{p}.{name}')
+        columns[name] = (np.fromfile(path, dtype=column.dtype) if os.path.exists(path)
+                         else np.empty(0, dtype=column.dtype))
+    return columns
+
+
+def hash_join(left, right, on, memory_bytes=MEMORY_BYTES, spill_directory=None, stats=None):
+    """Inner equi-join on integer keys, yielding result chunks
+
+    `on` is a column name or (left_key, right_key). If the smaller input's
+    hash table would exceed `memory_bytes`, both inputs are partitioned into
+    spill files (under `spill_directory`, default the temp dir) so that one
+    partition's table fits. `stats`, if given, receives partitions and
+    spilled_bytes.
+    """
+    left_key, right_key = _keys_of(on)
+    names = _output_names(left, right, left_key, right_key)
+    build_bytes = min(_nbytes(left), _nbytes(right)) * TABLE_OVERHEAD
+    if stats is not None:
+        stats.update(partitions=1, spilled_bytes=0)
+    if build_bytes <= memory_bytes:
+        yield from _join_in_memory(left, right, left_key, right_key, names)
+        return
+    bits = (-(-build_bytes // memory_bytes) - 1).bit_length()
+    with tempfile.TemporaryDirectory(prefix='architect_join_', dir=spill_directory) as directory:
+        _partition(left, left_key, bits, directory, 'left')
+        _partition(right, right_key, bits, directory, 'right')
+        if stats is not None:
+            spilled = sum(entry.stat().st_size for entry in os.scandir(directory))
+            stats.update(partitions=1 << bits, spilled_bytes=spilled)
+        for p in range(1 << bits):
+            # Skewed keys can leave one partition over budget; it is still joined in memory
+            left_part = _read_partition(left, directory, 'left', p)
+            right_part = _read_partition(right, directory, 'right', p)
+            if _rows(left_part) and _rows(right_part):
+                yield from _join_in_memory(left_part, right_part, left_key, right_key, names)
+
+
+def merge_join(left, right, on):
+    """Inner equi-join of two inputs already sorted on their keys, yielding result chunks
+
+    The left input is read a chunk at a time and only the matching window of
+    the right keys is searched, so mmapped inputs are streamed, not loaded.
+    """
+    left_key, right_key = _keys_of(on)
+    names = _output_names(left, right, left_key, right_key)
+    right_keys = _keys(right, right_key)
+    for lo in range(0, len(right_keys), CHUNK_ROWS):
+        keys = np.asarray(right_keys[max(lo - 1, 0):lo + CHUNK_ROWS])
+        if np.any(keys[1:] < keys[:-1]):
+            raise ValueError(f"merge_join needs the right input sorted on {right_key!r}")
+    previous = None
+    for chunk in _chunks(left):
+        keys = _keys(chunk, left_key)
+        if np.any(keys[1:] < keys[:-1]) or (previous is not None and len(keys) and keys[0] < previous):
+            raise ValueError(f"merge_join needs the left input sorted on {left_key!r}")
+        if not len(keys):
+            continue
+        previous = keys[-1]
+        first = int(np.searchsorted(right_keys, keys[0], 'left'))
+        last = int(np.searchsorted(right_keys, keys[-1], 'right'))
+        window = np.asarray(right_keys[first:last])
+        li, ri = _expand(np.searchsorted(window, keys, 'left'), np.searchsorted(window, keys, 'right'))
+        if len(li):
+            ri = ri + first
+            yield {out: (chunk[name][li] if side == 'left' else np.asarray(right[name][first:last])[ri - first])
+                   for out, side, name in names}
+
+
+def multi_join(fact, dimensions, memory_bytes=MEMORY_BYTES):
+    """Join `fact` with each (table, on) in `dimensions` in turn, yielding result chunks
+
+    Dimension hash tables that fit the budget together are built once and
+    every fact chunk is probed through all of them; otherwise each join runs
+    on its own (spilling as needed) and its result feeds the next.
+    """
+    dimensions = [(table, _keys_of(on)) for table, on in dimensions]
+    if not dimensions:
+        yield from _chunks(fact)
+        return
+    if sum(_nbytes(table) for table, _ in dimensions) * TABLE_OVERHEAD > memory_bytes:
+        result = fact
+        for table, on in dimensions:
+            chunks = hash_join(result, table, on, memory_bytes)
+            result = concatenate(chunks, _empty(result, table, _output_names(result, table, *on)))
+        yield from _chunks(result)
+        return
+    built = []
+    columns = list(fact)
+    for table, (left_key, right_key) in dimensions:
+        table = {name: np.asarray(column) for name, column in table.items()}
+        names = _output_names(dict.fromkeys(columns), table, left_key, right_key)
+        built.append((table, HashTable(_keys(table, right_key)), left_key, names))
+        columns = [out for out, _, _ in names]
+    for chunk in _chunks(fact):
+        for table, hash_table, left_key, names in built:
+            li, ri = hash_table.probe(_keys(chunk, left_key))
+            chunk = _gather(chunk, table, names, li, ri)
+            if not len(li):
+                break
+        if len(li):
+            yield chunk
+
+
+def _empty(left, right, names):
+    return {out: np.empty(0, dtype=(left if side == 'left' else right)[name].dtype)
+            for out, side, name in names}
+
+
+def concatenate(chunks, empty=None):
+    """One table from result chunks (`empty` when there are none)"""
+    chunks = list(chunks)
+    if not chunks:
+        return empty if empty is not None else {}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+
+def join(left, right, on, method='hash', memory_bytes=MEMORY_BYTES):
+    """Materialized inner join: method 'hash' or 'merge' (inputs sorted on the key)"""
+    left_key, right_key = _keys_of(on)
+    if method == 'hash':
+        chunks = hash_join(left, right, on, memory_bytes)
+    elif method == 'merge':
+        chunks = merge_join(left, right, on)
+    else:
+        raise ValueError(f"unknown join method: {method}")
+    return concatenate(chunks, _empty(left, right, _output_names(left, right, left_key, right_key)))
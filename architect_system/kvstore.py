@@ -0,0 +1,409 @@
+# architect_system/kvstore.py
+"""
+In-process key-value store for kv_operations
+Keys and values are packed back to back in one bytearray arena; an
+open-addressing table (linear probing) of flat int arrays points into it.
+mset/mget and pipelines probe whole batches at once with NumPy
+"""
+
+from array import array
+
+import numpy as np
+
+from .sortedset import SortedSet
+
+EMPTY = -1
+DELETED = -2
+MAX_LOAD = 0.7
+_STR = 1
+
+
+def _encode(value):
+    if isinstance(value, str):
+        return value.encode('utf-8'), _STR
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value), 0
+    return str(value).encode('utf-8'), _STR
+
+
+class KVStore:
+    """GET/SET/DEL over a byte arena with an open-addressing index"""
+
+    def __init__(self, capacity=1024):
+        self.arena = bytearray()
+        self.count = 0
+        self.used = 0            # live + deleted slots, drives resizing
+        self.garbage = 0         # arena bytes no slot points to
+        self.zsets = {}          # sorted sets live beside the string table, by encoded key
+        self._allocate(max(8, 1 << (capacity - 1).bit_length()))
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.hashes = array('q', bytes(8 * capacity))
+        self.offsets = array('q', [EMPTY]) * capacity
+        self.klens = array('I', bytes(4 * capacity))
+        self.vlens = array('I', bytes(4 * capacity))
+        self.kinds = array('B', bytes(capacity))
+
+    def __len__(self):
+        return self.count
+
+    # Single-key path: plain array indexing, no NumPy per call
+
+    def _find(self, kb, h):
+        """(slot holding kb or -1, first reusable slot on the probe path)"""
+        offsets = self.offsets
+        i = h & self.mask
+        reuse = -1
+        while True:
+            off = offsets[i]
+            if off == EMPTY:
+                return -1, (i if reuse < 0 else reuse)
+            if off == DELETED:
+                if reuse < 0:
+                    reuse = i
+            elif self.hashes[i] == h and self.klens[i] == len(kb) and self.arena[off:off + len(kb)] == kb:
+                return i, i
+            i = (i + 1) & self.mask
+
+    def get(self, key, default=None):
+        kb = _encode(key)[0]
+        slot, _ = self._find(kb, hash(kb))
+        if slot < 0:
+            return default
+        return self._value(slot)
+
+    def _value(self, slot):
+        start = self.offsets[slot] + self.klens[slot]
+        raw = bytes(self.arena[start:start + self.vlens[slot]])
+        return raw.decode('utf-8') if self.kinds[slot] == _STR else raw
+
+    def set(self, key, value):
+        kb = _encode(key)[0]
+        vb, kind = _encode(value)
+        if self.zsets:
+            self.zsets.pop(kb, None)
+        h = hash(kb)
+        slot, free = self._find(kb, h)
+        if slot >= 0:
+            self._overwrite(slot, vb, kind)
+            self._maybe_compact()
+            return True
+        if self.offsets[free] == EMPTY:
+            self.used += 1
+        self._place(free, h, kb, vb, kind)
+        self.count += 1
+        if self.used > self.capacity * MAX_LOAD:
+            self._resize()
+        return True
+
+    def _place(self, slot, h, kb, vb, kind):
+        self.hashes[slot] = h
+        self.offsets[slot] = len(self.arena)
+        self.klens[slot] = len(kb)
+        self.vlens[slot] = len(vb)
+        self.kinds[slot] = kind
+        self.arena += kb
+        self.arena += vb
+
+    def _overwrite(self, slot, vb, kind):
+        old = self.vlens[slot]
+        if len(vb) <= old:
+            # Fits where the old value was: rewrite in place
+            start = self.offsets[slot] + self.klens[slot]
+            self.arena[start:start + len(vb)] = vb
+            self.garbage += old - len(vb)
+        else:
+            kb = bytes(self.arena[self.offsets[slot]:self.offsets[slot] + self.klens[slot]])
+            self.garbage += self.klens[slot] + old
+            self.offsets[slot] = len(self.arena)
+            self.arena += kb
+            self.arena += vb
+        self.vlens[slot] = len(vb)
+        self.kinds[slot] = kind
+
+    def delete(self, key):
+        kb = _encode(key)[0]
+        if self.zsets.pop(kb, None) is not None:
+            return True
+        slot, _ = self._find(kb, hash(kb))
+        if slot < 0:
+            return False
+        self.garbage += self.klens[slot] + self.vlens[slot]
+        self.offsets[slot] = DELETED
+        self.count -= 1
+        self._maybe_compact()
+        return True
+
+    def exists(self, key):
+        kb = _encode(key)[0]
+        return kb in self.zsets or self._find(kb, hash(kb))[0] >= 0
+
+    # Sorted sets
+
+    def _zset(self, key, create=False):
+        kb = _encode(key)[0]
+        zset = self.zsets.get(kb)
+        if zset is None and create:
+            if self._find(kb, hash(kb))[0] >= 0:
+                raise TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+            zset = self.zsets[kb] = SortedSet()
+        return zset
+
+    def zadd(self, key, mapping):
+        """Add or re-score members ({member: score} or (member, score) pairs); returns how many were new"""
+        items = list(mapping.items() if isinstance(mapping, dict) else mapping)
+        if not items:
+            return 0
+        zset = self._zset(key, create=True)
+        if isinstance(mapping, dict) and len(mapping) == 1:
+            return zset.add(*next(iter(items)))
+        return zset.add_many(items)
+
+    def zscore(self, key, member):
+        zset = self._zset(key)
+        return None if zset is None else zset.score(member)
+
+    def zrank(self, key, member):
+        zset = self._zset(key)
+        return None if zset is None else zset.rank(member)
+
+    def zcard(self, key):
+        zset = self._zset(key)
+        return 0 if zset is None else len(zset)
+
+    def zrem(self, key, *members):
+        zset = self._zset(key)
+        if zset is None:
+            return 0
+        removed = sum(zset.remove(m) for m in members)
+        if not zset:
+            del self.zsets[_encode(key)[0]]
+        return removed
+
+    def zrangebyscore(self, key, min, max, withscores=False, offset=0, count=None):
+        """Members with min <= score <= max ('(x' excludes x, '-inf'/'+inf' allowed)"""
+        zset = self._zset(key)
+        pairs = [] if zset is None else zset.range_by_score(min, max, offset, count)
+        return pairs if withscores else [member for member, _ in pairs]
+
+    def zrange(self, key, start, stop, withscores=False):
+        """Members by rank, start..stop inclusive; negative ranks count from the end"""
+        zset = self._zset(key)
+        pairs = [] if zset is None else zset.range_by_rank(start, stop)
+        return pairs if withscores else [member for member, _ in pairs]
+
+    # Table maintenance
+
+    def _views(self):
+        return (np.frombuffer(self.hashes, dtype=np.int64), np.frombuffer(self.offsets, dtype=np.int64),
+                np.frombuffer(self.klens, dtype=np.uint32), np.frombuffer(self.vlens, dtype=np.uint32),
+                np.frombuffer(self.kinds, dtype=np.uint8))
+
+    def _resize(self):
+        capacity = self.capacity
+        while self.count > capacity * MAX_LOAD / 2:
+            capacity *= 2
+        self._rebuild(capacity)
+
+    def _maybe_compact(self):
+        if self.garbage > 1 << 20 and self.garbage > len(self.arena) // 2:
+            self._rebuild(self.capacity)
+
+    def _rebuild(self, capacity):
+        """Re-slot every live key into a fresh table and a garbage-free arena"""
+        hashes, offsets, klens, vlens, kinds = self._views()
+        live = np.flatnonzero(offsets >= 0)
+        h, off, kl, vl, kd = hashes[live], offsets[live], klens[live], vlens[live], kinds[live]
+        sizes = kl.astype(np.int64) + vl
+        arena = bytearray(int(sizes.sum()))
+        new_off = np.cumsum(sizes) - sizes
+        source = memoryview(self.arena)
+        for dst, src, n in zip(new_off.tolist(), off.tolist(), sizes.tolist()):
+            arena[dst:dst + n] = source[src:src + n]
+        source.release()
+        self.arena = arena
+        self.garbage = 0
+        self._allocate(capacity)
+        slots = _claim_slots(np.full(capacity, EMPTY, dtype=np.int64), h & self.mask, self.mask)
+        views = self._views()
+        for view, values in zip(views, (h, new_off, kl, vl, kd)):
+            view[slots] = values
+        self.count = self.used = len(live)
+
+    # Batch path
+
+    def _probe(self, kbs, hs):
+        """Slot of each key (-1 if absent), probing all keys in lock step"""
+        hashes, offsets, klens, _, _ = self._views()
+        klen = np.fromiter(map(len, kbs), dtype=np.int64, count=len(kbs))
+        pos = hs & self.mask
+        found = np.full(len(kbs), -1, dtype=np.int64)
+        active = np.arange(len(kbs))
+        arena = self.arena
+        while len(active):
+            p = pos[active]
+            off = offsets[p]
+            done = off == EMPTY
+            match = (off >= 0) & (hashes[p] == hs[active]) & (klens[p] == klen[active])
+            for j in np.flatnonzero(match).tolist():
+                k = int(active[j])
+                o = int(off[j])
+                if arena[o:o + klen[k]] == kbs[k]:
+                    found[k] = p[j]
+                    done[j] = True
+            active = active[~done]
+            pos[active] = (pos[active] + 1) & self.mask
+        return found
+
+    def mget(self, keys):
+        """Values for `keys` in order (None where missing)"""
+        kbs = [_encode(k)[0] for k in keys]
+        if not kbs:
+            return []
+        hs = np.fromiter(map(hash, kbs), dtype=np.int64, count=len(kbs))
+        slots = self._probe(kbs, hs).tolist()
+        return [self._value(s) if s >= 0 else None for s in slots]
+
+    def mset(self, mapping):
+        """Set many keys at once (a dict or (key, value) pairs); later duplicates win"""
+        items = mapping.items() if isinstance(mapping, dict) else mapping
+        batch = {}
+        for key, value in items:
+            batch[_encode(key)[0]] = _encode(value)
+        if not batch:
+            return True
+        if self.zsets:
+            for kb in batch:
+                self.zsets.pop(kb, None)
+        kbs = list(batch)
+        hs = np.fromiter(map(hash, kbs), dtype=np.int64, count=len(kbs))
+        slots = self._probe(kbs, hs)
+        fresh = np.flatnonzero(slots < 0)
+        for i in np.flatnonzero(slots >= 0).tolist():
+            vb, kind = batch[kbs[i]]
+            self._overwrite(int(slots[i]), vb, kind)
+        if len(fresh):
+            if self.used + len(fresh) > self.capacity * MAX_LOAD:
+                capacity = self.capacity
+                while self.count + len(fresh) > capacity * MAX_LOAD / 2:
+                    capacity *= 2
+                self._rebuild(capacity)
+            self._insert_new([kbs[i] for i in fresh.tolist()], hs[fresh],
+                             [batch[kbs[i]] for i in fresh.tolist()])
+        self._maybe_compact()
+        return True
+
+    def _insert_new(self, kbs, hs, values):
+        """Append absent keys to the arena in one write and claim their slots together"""
+        klen = np.fromiter(map(len, kbs), dtype=np.int64, count=len(kbs))
+        vlen = np.fromiter((len(v) for v, _ in values), dtype=np.int64, count=len(values))
+        kinds = np.fromiter((k for _, k in values), dtype=np.uint8, count=len(values))
+        sizes = klen + vlen
+        base = len(self.arena)
+        self.arena += b''.join(kb + vb for kb, (vb, _) in zip(kbs, values))
+        hashes, offsets, klens, vlens, kind_view = self._views()
+        slots = _claim_slots(offsets, hs & self.mask, self.mask)
+        self.used += int(np.count_nonzero(offsets[slots] == EMPTY))
+        hashes[slots] = hs
+        offsets[slots] = base + np.cumsum(sizes) - sizes
+        klens[slots] = klen
+        vlens[slots] = vlen
+        kind_view[slots] = kinds
+        self.count += len(kbs)
+
+    def pipeline(self):
+        return Pipeline(self)
+
+    def stats(self):
+        """Memory accounting: payload is key + value bytes, overhead is everything else"""
+        _, offsets, klens, vlens, _ = self._views()
+        live = offsets >= 0
+        payload = int(klens[live].sum()) + int(vlens[live].sum())
+        table = self.capacity * (8 + 8 + 4 + 4 + 1)
+        total = len(self.arena) + table
+        keys = max(self.count, 1)
+        return {
+            'keys': self.count,
+            'payload_bytes': payload,
+            'arena_bytes': len(self.arena),
+            'table_bytes': table,
+            'bytes_per_key': total / keys,
+            'overhead_per_key': (total - payload) / keys,
+        }
+
+    def clear(self):
+        self.__init__()
+
+
+def _claim_slots(offsets, start, mask):
+    """Free slots for keys whose probes begin at `start`, placed together.
+    Each round every free slot wanted by unplaced keys goes to one of them;
+    the rest move one slot on, exactly as linear probing would"""
+    pos = start.astype(np.int64).copy()
+    slots = np.full(len(pos), -1, dtype=np.int64)
+    free = offsets < 0           # EMPTY or DELETED are both reusable
+    active = np.arange(len(pos))
+    while len(active):
+        p = pos[active]
+        candidates = active[free[p]]
+        winners = candidates[np.unique(pos[candidates], return_index=True)[1]]
+        slots[winners] = pos[winners]
+        free[pos[winners]] = False
+        active = active[slots[active] < 0]
+        pos[active] = (pos[active] + 1) & mask
+    return slots
+
+
+class Pipeline:
+    """Buffered commands run as batches on execute(); runs of SET become one mset,
+    runs of GET one mget, so results match running the commands in order"""
+
+    def __init__(self, store):
+        self.store = store
+        self.commands = []
+        self.results = None
+
+    def set(self, key, value):
+        self.commands.append(('set', key, value))
+        return self
+
+    def get(self, key):
+        self.commands.append(('get', key, None))
+        return self
+
+    def delete(self, key):
+        self.commands.append(('delete', key, None))
+        return self
+
+    def execute(self):
+        results = []
+        commands, self.commands = self.commands, []
+        i = 0
+        while i < len(commands):
+            op = commands[i][0]
+            j = i
+            while j < len(commands) and commands[j][0] == op:
+                j += 1
+            run = commands[i:j]
+            if op == 'set':
+                self.store.mset([(key, value) for _, key, value in run])
+                results.extend([True] * len(run))
+            elif op == 'get':
+                results.extend(self.store.mget([key for _, key, _ in run]))
+            else:
+                results.extend(self.store.delete(key) for _, key, _ in run)
+            i = j
+        self.results = results
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.execute()
+
+
+kv_operations = KVStore()
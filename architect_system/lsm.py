@@ -0,0 +1,542 @@
+# architect_system/lsm.py
+"""
+Log-structured merge tree for the write-heavy (Cassandra / DynamoDB) workloads
+Writes land in a WAL-backed memtable; full memtables are flushed to sorted,
+immutable SSTables (16KB blocks, an in-memory first-key index and a Bloom
+filter each), and a background thread compacts them level by level
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import struct
+import threading
+from bisect import bisect_right
+
+import numpy as np
+
+from digest_index import BloomFilter
+
+from .storage import data_directory
+
+MEMTABLE_BYTES = 16 << 20
+BLOCK_BYTES = 16 << 10
+TABLE_BYTES = 32 << 20       # compaction output is cut into tables of about this size
+L0_TABLES = 4                # L0 -> L1 compaction starts at this many L0 tables
+LEVEL1_BYTES = 128 << 20
+LEVEL_RATIO = 10
+BLOOM_BITS_PER_KEY = 10
+_RECORD = struct.Struct('<II')   # key length, value length (TOMBSTONE for deletes)
+TOMBSTONE = 0xFFFFFFFF
+
+
+def _bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else bytes(value)
+
+
+def fingerprint(key):
+    """Stable 64-bit key hash for the Bloom filters"""
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+def _fingerprints(keys):
+    return np.fromiter((fingerprint(k) for k in keys), dtype=np.uint64, count=len(keys))
+
+
+def _encode_record(key, value):
+    if value is None:
+        return _RECORD.pack(len(key), TOMBSTONE) + key
+    return _RECORD.pack(len(key), len(value)) + key + value
+
+
+def _decode_records(buf):
+    """(key, value or None) pairs of a block or WAL chunk; stops at a torn tail"""
+    pos = 0
+    end = len(buf)
+    while pos + _RECORD.size <= end:
+        klen, vlen = _RECORD.unpack_from(buf, pos)
+        pos += _RECORD.size
+        if vlen == TOMBSTONE:
+            if pos + klen > end:
+                return
+            yield buf[pos:pos + klen], None
+            pos += klen
+        else:
+            if pos + klen + vlen > end:
+                return
+            yield buf[pos:pos + klen], buf[pos + klen:pos + klen + vlen]
+            pos += klen + vlen
+
+
+def _raw_records(buf):
+    """(key, encoded record) pairs of a block, records copied whole and not re-encoded"""
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        klen, vlen = _RECORD.unpack_from(buf, pos)
+        stop = pos + _RECORD.size + klen + (0 if vlen == TOMBSTONE else vlen)
+        yield buf[pos + _RECORD.size:pos + _RECORD.size + klen], buf[pos:stop]
+        pos = stop
+
+
+def _is_tombstone(record):
+    return _RECORD.unpack_from(record)[1] == TOMBSTONE
+
+
+def _find(buf, key):
+    """(found, value or None) for key in a block; only the headers and keys it passes are read"""
+    pos = 0
+    end = len(buf)
+    klen_wanted = len(key)
+    while pos < end:
+        klen, vlen = _RECORD.unpack_from(buf, pos)
+        start = pos + _RECORD.size
+        if klen == klen_wanted and buf.startswith(key, start):
+            if vlen == TOMBSTONE:
+                return True, None
+            return True, buf[start + klen:start + klen + vlen]
+        pos = start + klen + (0 if vlen == TOMBSTONE else vlen)
+    return False, None
+
+
+def write_table(path, records):
+    """Write sorted, unique (key, encoded record) pairs as an SSTable at path.*; returns its size"""
+    first_keys = []
+    offsets = [0]
+    keys = []
+    block = []
+    block_size = 0
+    with open(path + '.sst', 'wb') as f:
+        for key, record in records:
+            if not block:
+                first_keys.append(key)
+            block.append(record)
+            block_size += len(record)
+            keys.append(key)
+            if block_size >= BLOCK_BYTES:
+                f.write(b''.join(block))
+                offsets.append(offsets[-1] + block_size)
+                block, block_size = [], 0
+        if block:
+            f.write(b''.join(block))
+            offsets.append(offsets[-1] + block_size)
+        f.flush()
+        os.fsync(f.fileno())
+    bloom = BloomFilter(path + '.bloom', max(len(keys), 1), BLOOM_BITS_PER_KEY)
+    bloom.add(_fingerprints(keys))
+    bloom.flush()
+    key_offsets = np.zeros(len(first_keys) + 1, dtype=np.int64)
+    np.cumsum([len(k) for k in first_keys], out=key_offsets[1:])
+    np.savez(path + '.index.npz', offsets=np.array(offsets, dtype=np.int64),
+             first_keys=np.frombuffer(b''.join(first_keys), dtype=np.uint8), key_offsets=key_offsets,
+             last_key=np.frombuffer(keys[-1] if keys else b'', dtype=np.uint8),
+             count=np.array([len(keys)]))
+    return offsets[-1]
+
+
+class SSTable:
+    """Read side of one table: the block index and Bloom filter in memory, blocks read with pread"""
+
+    def __init__(self, path, table_id):
+        self.path = path
+        self.id = table_id
+        with np.load(path + '.index.npz') as index:
+            self.offsets = index['offsets'].tolist()
+            blob = index['first_keys'].tobytes()
+            bounds = index['key_offsets'].tolist()
+            self.last_key = index['last_key'].tobytes()
+            self.count = int(index['count'][0])
+        self.first_keys = [blob[a:b] for a, b in zip(bounds, bounds[1:])]
+        self.first_key = self.first_keys[0] if self.first_keys else b''
+        self.size = self.offsets[-1]
+        self.bloom = BloomFilter(path + '.bloom', max(self.count, 1), BLOOM_BITS_PER_KEY)
+        self.fd = os.open(path + '.sst', os.O_RDONLY)
+
+    def may_contain(self, fps):
+        return self.bloom.contains(fps)
+
+    def read_block(self, b):
+        return os.pread(self.fd, self.offsets[b + 1] - self.offsets[b], self.offsets[b])
+
+    def lookup(self, key):
+        """(found, value or None) after reading the one block that could hold key"""
+        b = bisect_right(self.first_keys, key) - 1
+        if b < 0 or key > self.last_key:
+            return False, None
+        return _find(self.read_block(b), key)
+
+    def records(self):
+        """(key, encoded record) in key order"""
+        for b in range(len(self.offsets) - 1):
+            yield from _raw_records(self.read_block(b))
+
+    def overlaps(self, lo, hi):
+        return not (self.last_key < lo or self.first_key > hi)
+
+    def remove_files(self):
+        for suffix in ('.sst', '.bloom', '.index.npz'):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def __del__(self):
+        # Readers may still hold a version that compaction replaced; the fd lives as long as they do
+        try:
+            os.close(self.fd)
+        except (OSError, AttributeError, TypeError):
+            pass
+
+
+class _Memtable:
+    def __init__(self, wal_path):
+        self.items = {}
+        self.nbytes = 0
+        self.wal_path = wal_path
+        self.wal = open(wal_path, 'ab')
+
+    def apply(self, pairs, records):
+        self.wal.write(records)
+        self.wal.flush()
+        items = self.items
+        for key, value in pairs:
+            items[key] = value
+        self.nbytes += len(records)
+
+
+class LSMTree:
+    """put / get / delete / put_many / get_many over a memtable and leveled SSTables"""
+
+    def __init__(self, directory, memtable_bytes=MEMTABLE_BYTES):
+        self.directory = directory
+        self.memtable_bytes = memtable_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._closed = False
+        self.gets = self.block_reads = self.bloom_skips = 0
+        self.bytes_written = self.bytes_compacted = 0
+        manifest = self._load_manifest()
+        self.next_id = manifest['next_id']
+        self.levels = [[SSTable(self._table_path(i), i) for i in ids] for ids in manifest['levels']]
+        self._cursors = {}
+        self._remove_orphans()
+        self.immutable = []
+        self.memtable = self._replay_wals()
+        self._worker = threading.Thread(target=self._background, name='lsm-compact', daemon=True)
+        self._worker.start()
+
+    # Files and manifest
+
+    def _table_path(self, table_id):
+        return os.path.join(self.directory, f'{table_id:08d}')
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.directory, 'MANIFEST.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'next_id': 1, 'levels': [[]]}
+
+    def _write_manifest(self, levels):
+        """Tables are live once the manifest names them; written to a temp file and renamed"""
+        manifest = {'next_id': self.next_id, 'levels': [[t.id for t in level] for level in levels]}
+        tmp = os.path.join(self.directory, 'MANIFEST.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.directory, 'MANIFEST.json'))
+
+    def _remove_orphans(self):
+        """Drop table files a crash left outside the manifest"""
+        live = {t.id for level in self.levels for t in level}
+        for name in os.listdir(self.directory):
+            stem = name.split('.', 1)[0]
+            if stem.isdigit() and int(stem) not in live:
+                os.remove(os.path.join(self.directory, name))
+
+    def _new_id(self):
+        with self._lock:
+            table_id = self.next_id
+            self.next_id += 1
+        return table_id
+
+    def _replay_wals(self):
+        wals = sorted(n for n in os.listdir(self.directory) if n.startswith('wal-'))
+        # The new WAL must sort after, and never reopen, any WAL left by an earlier run
+        for name in wals:
+            self.next_id = max(self.next_id, int(name[4:].split('.', 1)[0]) + 1)
+        memtable = _Memtable(os.path.join(self.directory, f'wal-{self._new_id():08d}.log'))
+        for name in wals:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                data = f.read()
+            pairs = list(_decode_records(data))
+            memtable.apply(pairs, b''.join(_encode_record(k, v) for k, v in pairs))
+        memtable.wal.flush()
+        os.fsync(memtable.wal.fileno())
+        for name in wals:
+            os.remove(os.path.join(self.directory, name))
+        self._write_manifest(self.levels)
+        return memtable
+
+    # Writes
+
+    def put_many(self, items):
+        """Write (key, value) pairs in one WAL append; a value of None deletes"""
+        pairs = [(_bytes(k), None if v is None else _bytes(v)) for k, v in items]
+        records = b''.join([_encode_record(k, v) for k, v in pairs])
+        with self._lock:
+            if self._closed:
+                raise ValueError("LSM tree is closed")
+            # Backpressure: writers wait while two full memtables are still unflushed
+            while len(self.immutable) >= 2:
+                self._changed.wait()
+            self.memtable.apply(pairs, records)
+            self.bytes_written += len(records)
+            if self.memtable.nbytes >= self.memtable_bytes:
+                self._rotate()
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def delete(self, key):
+        self.put_many([(key, None)])
+
+    def _rotate(self):
+        """Freeze the memtable for the background flush (lock held)"""
+        self.immutable.append(self.memtable)
+        path = os.path.join(self.directory, f'wal-{self.next_id:08d}.log')
+        self.next_id += 1
+        self.memtable = _Memtable(path)
+        self._changed.notify_all()
+
+    def sync(self):
+        """fsync the WAL: everything written so far survives a crash"""
+        with self._lock:
+            wal = self.memtable.wal
+            wal.flush()
+        os.fsync(wal.fileno())
+
+    # Reads
+
+    def _snapshot(self):
+        with self._lock:
+            return [self.memtable] + self.immutable[::-1], [list(level) for level in self.levels]
+
+    @staticmethod
+    def _candidates(levels, firsts, key):
+        """Tables that may hold key, newest first: every L0 table, then one per level"""
+        for table in reversed(levels[0]):
+            if table.first_key <= key <= table.last_key:
+                yield table
+        for level, level_firsts in zip(levels[1:], firsts[1:]):
+            i = bisect_right(level_firsts, key) - 1
+            if i >= 0 and key <= level[i].last_key:
+                yield level[i]
+
+    def get(self, key, default=None):
+        return self.get_many([key], default)[0]
+
+    def get_many(self, keys, default=None):
+        """Values for keys (default where missing); Bloom filters are probed for the whole batch"""
+        keys = [_bytes(k) for k in keys]
+        memtables, levels = self._snapshot()
+        out = [default] * len(keys)
+        pending = []
+        for i, key in enumerate(keys):
+            for memtable in memtables:
+                if key in memtable.items:
+                    value = memtable.items[key]
+                    if value is not None:
+                        out[i] = value
+                    break
+            else:
+                pending.append(i)
+        self.gets += len(keys)
+        if not pending:
+            return out
+        fps = _fingerprints([keys[i] for i in pending])
+        firsts = [[t.first_key for t in level] for level in levels]
+        # Per table, the Bloom filter answers for every pending key in one vectorized call
+        tables = {}
+        for j, i in enumerate(pending):
+            for table in self._candidates(levels, firsts, keys[i]):
+                tables.setdefault(table.id, (table, []))[1].append(j)
+        maybe = {}
+        for table, js in tables.values():
+            hits = table.may_contain(fps[js])
+            self.bloom_skips += int(len(js) - hits.sum())
+            maybe[table.id] = {j for j, hit in zip(js, hits.tolist()) if hit}
+        for j, i in enumerate(pending):
+            for table in self._candidates(levels, firsts, keys[i]):
+                if j not in maybe[table.id]:
+                    continue
+                self.block_reads += 1
+                found, value = table.lookup(keys[i])
+                if found:
+                    if value is not None:
+                        out[i] = value
+                    break
+        return out
+
+    # Flush and compaction
+
+    def _background(self):
+        while True:
+            with self._lock:
+                while not self.immutable and not self._compaction_due() and not self._closed:
+                    self._changed.wait()
+                if self._closed and not self.immutable:
+                    return
+                memtable = self.immutable[0] if self.immutable else None
+            if memtable is not None:
+                self._flush(memtable)
+            else:
+                self._compact()
+
+    def _flush(self, memtable):
+        table_id = self._new_id()
+        path = self._table_path(table_id)
+        records = ((key, _encode_record(key, value)) for key, value in sorted(memtable.items.items()))
+        self.bytes_compacted += write_table(path, records)
+        table = SSTable(path, table_id)
+        with self._lock:
+            levels = [list(level) for level in self.levels]
+            levels[0].append(table)
+            self._write_manifest(levels)
+            self.levels = levels
+            self.immutable.remove(memtable)
+            self._changed.notify_all()
+        memtable.wal.close()
+        os.remove(memtable.wal_path)
+
+    def _level_limit(self, level):
+        return LEVEL1_BYTES * LEVEL_RATIO ** (level - 1)
+
+    def _compaction_due(self):
+        if len(self.levels[0]) >= L0_TABLES:
+            return True
+        return any(sum(t.size for t in self.levels[i]) > self._level_limit(i)
+                   for i in range(1, len(self.levels)))
+
+    def _pick(self):
+        """(level, inputs from level, overlapping inputs from level + 1)"""
+        levels = self.levels
+        if len(levels[0]) >= L0_TABLES:
+            inputs = list(levels[0])
+            level = 0
+        else:
+            level = next(i for i in range(1, len(levels))
+                         if sum(t.size for t in levels[i]) > self._level_limit(i))
+            # Round-robin through the level's key space, as LevelDB's compact pointer does
+            cursor = self._cursors.get(level, b'')
+            after = [t for t in levels[level] if t.first_key > cursor]
+            table = after[0] if after else levels[level][0]
+            self._cursors[level] = table.last_key
+            inputs = [table]
+        lo = min(t.first_key for t in inputs)
+        hi = max(t.last_key for t in inputs)
+        below = levels[level + 1] if level + 1 < len(levels) else []
+        return level, inputs, [t for t in below if t.overlaps(lo, hi)]
+
+    def _compact(self):
+        with self._lock:
+            level, inputs, overlapping = self._pick()
+            deeper = any(self.levels[i] for i in range(level + 2, len(self.levels)))
+        # Newest first: later L0 tables, then the upper level, then the level below
+        sources = sorted(inputs, key=lambda t: -t.id) if level == 0 else inputs
+        keys, records = [], []
+        for table in sources + overlapping:
+            for key, record in table.records():
+                keys.append(key)
+                records.append(record)
+        # The inputs are sorted runs, which a stable sort merges in about linear time;
+        # stability keeps the newest copy of each key first
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        outputs = []
+        batch = []
+        size = 0
+        previous = None
+        for i in order:
+            key = keys[i]
+            if key == previous:
+                continue
+            previous = key
+            record = records[i]
+            # A delete needs to survive only while older data for the key may sit further down
+            if not deeper and _is_tombstone(record):
+                continue
+            batch.append((key, record))
+            size += len(record)
+            if size >= TABLE_BYTES:
+                outputs.append(self._write_output(batch))
+                batch, size = [], 0
+        if batch:
+            outputs.append(self._write_output(batch))
+        del keys, records
+        with self._lock:
+            levels = [list(lv) for lv in self.levels]
+            if level + 1 == len(levels):
+                levels.append([])
+            gone = {t.id for t in inputs} | {t.id for t in overlapping}
+            levels[level] = [t for t in levels[level] if t.id not in gone]
+            levels[level + 1] = sorted([t for t in levels[level + 1] if t.id not in gone] + outputs,
+                                       key=lambda t: t.first_key)
+            self._write_manifest(levels)
+            self.levels = levels
+            self._changed.notify_all()
+        for table in inputs + overlapping:
+            table.remove_files()
+
+    def _write_output(self, batch):
+        table_id = self._new_id()
+        path = self._table_path(table_id)
+        self.bytes_compacted += write_table(path, batch)
+        return SSTable(path, table_id)
+
+    def flush(self):
+        """Flush the memtable and wait until no flush or compaction is pending"""
+        with self._lock:
+            if self.memtable.items:
+                self._rotate()
+            while self.immutable or self._compaction_due():
+                self._changed.wait()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._changed.notify_all()
+        self._worker.join()
+        self.memtable.wal.flush()
+        os.fsync(self.memtable.wal.fileno())
+        self.memtable.wal.close()
+
+    def stats(self):
+        """Table counts and sizes per level, read and write amplification"""
+        levels = self.levels
+        return {
+            'tables': [len(level) for level in levels],
+            'level_bytes': [sum(t.size for t in level) for level in levels],
+            'gets': self.gets,
+            'block_reads_per_get': self.block_reads / max(self.gets, 1),
+            'bloom_skips': self.bloom_skips,
+            'write_amplification': (self.bytes_written + self.bytes_compacted) / max(self.bytes_written, 1),
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def lsm_store():
+    """The LSM tree in data_directory('lsm'), opened (WALs replayed) on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LSMTree(data_directory('lsm'))
+            atexit.register(_store.close)
+        return _store
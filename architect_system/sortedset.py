@@ -0,0 +1,303 @@
+# architect_system/sortedset.py
+"""
+Sorted sets (ZADD / ZSCORE / ZRANK / ZRANGEBYSCORE) for kv_operations
+Members are kept in (score, member) order in blocks of at most 2 * BLOCK
+entries, with a Fenwick tree over block sizes for rank; member -> score is a
+dict, so ZSCORE never touches the ordering
+"""
+
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+
+import numpy as np
+
+BLOCK = 1024
+BULK_FRACTION = 32           # batches changing over 1/32 of the set are merged, not inserted one by one
+
+
+def _bound(value, upper):
+    """Redis score bound: a number, '-inf'/'+inf', or '(x' for exclusive"""
+    if isinstance(value, str) and value.startswith('('):
+        value = float(value[1:])
+        return math.nextafter(value, -math.inf if upper else math.inf)
+    return float(value)
+
+
+def _score(value):
+    score = float(value)
+    if score != score:
+        raise ValueError("score is not a valid float")
+    return score
+
+
+def _order(scores, members):
+    """Permutation sorting by score, ties by member"""
+    order = np.argsort(scores, kind='stable')
+    ordered = scores[order]
+    tied = np.flatnonzero(ordered[1:] == ordered[:-1])
+    if len(tied):
+        # Runs of equal scores are re-sorted by member; with real-valued scores they are short
+        starts = tied[np.concatenate(([True], np.diff(tied) > 1))]
+        ends = tied[np.concatenate((np.diff(tied) > 1, [True]))] + 2
+        for lo, hi in zip(starts.tolist(), ends.tolist()):
+            run = order[lo:hi].tolist()
+            run.sort(key=members.__getitem__)
+            order[lo:hi] = run
+    return order
+
+
+class SortedSet:
+    """One sorted set; members are compared as given (all str or all bytes)"""
+
+    def __init__(self):
+        self.scores = {}
+        self._clear_blocks()
+
+    def _clear_blocks(self):
+        self._block_scores = []  # array('d') per block
+        self._block_members = []
+        self._maxes = []         # (score, member) of each block's last entry
+        self._tree = []
+
+    def __len__(self):
+        return len(self.scores)
+
+    # Rank bookkeeping: Fenwick tree over block sizes
+
+    def _rebuild_tree(self):
+        tree = [len(block) for block in self._block_members]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _grow(self, b, delta):
+        tree = self._tree
+        while b < len(tree):
+            tree[b] += delta
+            b |= b + 1
+
+    def _before(self, b):
+        """Entries in blocks before block b"""
+        total = 0
+        tree = self._tree
+        while b > 0:
+            total += tree[b - 1]
+            b &= b - 1
+        return total
+
+    def _locate_rank(self, rank):
+        """(block, offset) of the entry with 0-based `rank`"""
+        tree = self._tree
+        b = 0
+        step = 1 << (len(tree).bit_length())
+        while step:
+            nxt = b + step
+            if nxt <= len(tree) and tree[nxt - 1] <= rank:
+                b = nxt
+                rank -= tree[nxt - 1]
+            step >>= 1
+        return b, rank
+
+    # Positioning
+
+    def _find(self, score, member):
+        """(block, offset) where (score, member) is or would be inserted"""
+        b = bisect_left(self._maxes, (score, member))
+        if b == len(self._maxes):
+            b -= 1
+        scores = self._block_scores[b]
+        lo = bisect_left(scores, score)
+        hi = bisect_right(scores, score, lo)
+        return b, bisect_left(self._block_members[b], member, lo, hi)
+
+    def _insert(self, score, member):
+        if not self._maxes:
+            self._block_scores.append(array('d', [score]))
+            self._block_members.append([member])
+            self._maxes.append((score, member))
+            self._tree = [1]
+            return
+        b, j = self._find(score, member)
+        scores, members = self._block_scores[b], self._block_members[b]
+        scores.insert(j, score)
+        members.insert(j, member)
+        if j == len(members) - 1:
+            self._maxes[b] = (score, member)
+        if len(members) > 2 * BLOCK:
+            self._block_scores[b:b + 1] = [scores[:BLOCK], scores[BLOCK:]]
+            self._block_members[b:b + 1] = [members[:BLOCK], members[BLOCK:]]
+            self._maxes.insert(b, (scores[BLOCK - 1], members[BLOCK - 1]))
+            self._rebuild_tree()
+        else:
+            self._grow(b, 1)
+
+    def _remove(self, score, member):
+        b, j = self._find(score, member)
+        scores, members = self._block_scores[b], self._block_members[b]
+        del scores[j]
+        del members[j]
+        if not members:
+            del self._block_scores[b], self._block_members[b], self._maxes[b]
+            self._rebuild_tree()
+            return
+        if j == len(members):
+            self._maxes[b] = (scores[-1], members[-1])
+        self._grow(b, -1)
+
+    # Commands
+
+    def add(self, member, score):
+        """1 if member is new, 0 if it existed (its score is updated)"""
+        score = _score(score)
+        old = self.scores.get(member)
+        if old is not None:
+            if old != score:
+                self._remove(old, member)
+                self._insert(score, member)
+                self.scores[member] = score
+            return 0
+        self._insert(score, member)
+        self.scores[member] = score
+        return 1
+
+    def add_many(self, items):
+        """Bulk ZADD of (member, score) pairs; large batches are sorted once and
+        merged block by block"""
+        batch = {}
+        for member, score in items:
+            batch[member] = _score(score)
+        fresh = []
+        moved = []
+        current = self.scores
+        for member, score in batch.items():
+            old = current.get(member)
+            if old is None:
+                fresh.append(member)
+            elif old != score:
+                moved.append(member)
+        if not fresh and not moved:
+            return 0
+        if (len(fresh) + len(moved)) * BULK_FRACTION < len(current):
+            for member in chain(fresh, moved):
+                self.add(member, batch[member])
+            return len(fresh)
+        for member in moved:
+            self._remove(current[member], member)
+        members = fresh + moved
+        scores = np.fromiter((batch[m] for m in members), dtype=np.float64, count=len(members))
+        order = _order(scores, members)
+        self._merge(scores[order], np.array(members, dtype=object)[order])
+        current.update(batch)
+        return len(fresh)
+
+    def _merge(self, scores, members):
+        """Merge sorted, absent entries (members as an object array) into the blocks"""
+        if not self._maxes:
+            groups = [(0, 0, len(members))]
+            self._block_scores, self._block_members = [array('d')], [[]]
+        else:
+            tops = np.array([score for score, _ in self._maxes])
+            blocks = np.minimum(np.searchsorted(tops, scores, 'left'), len(tops) - 1)
+            # A score equal to a block's top belongs to the next block if its member sorts after
+            for j in np.flatnonzero(tops[blocks] == scores).tolist():
+                b = int(blocks[j])
+                while b < len(tops) - 1 and self._maxes[b] < (scores[j], members[j]):
+                    b += 1
+                blocks[j] = b
+            cuts = np.flatnonzero(np.diff(blocks)) + 1
+            starts = np.concatenate(([0], cuts)).tolist()
+            ends = np.concatenate((cuts, [len(blocks)])).tolist()
+            groups = zip(blocks[starts].tolist(), starts, ends)
+        block_scores, block_members = [], []
+        done = 0
+        for b, lo, hi in groups:
+            block_scores.extend(self._block_scores[done:b])
+            block_members.extend(self._block_members[done:b])
+            done = b + 1
+            old_scores = np.frombuffer(self._block_scores[b], dtype=np.float64)
+            old_members = self._block_members[b]
+            at = np.searchsorted(old_scores, scores[lo:hi], 'left')
+            tied = old_scores[np.minimum(at, len(old_scores) - 1)] == scores[lo:hi] if len(old_scores) else []
+            for j in np.flatnonzero(tied).tolist():
+                p = int(at[j])
+                tie_end = int(np.searchsorted(old_scores, scores[lo + j], 'right'))
+                at[j] = bisect_left(old_members, members[lo + j], p, tie_end)
+            merged_scores = np.insert(old_scores, at, scores[lo:hi])
+            # Object arrays let np.insert interleave the member references in C
+            merged = np.insert(np.array(old_members, dtype=object), at, members[lo:hi]).tolist()
+            pieces = range(0, len(merged), BLOCK) if len(merged) > 2 * BLOCK else [0]
+            for start in pieces:
+                end = start + BLOCK if len(merged) > 2 * BLOCK else len(merged)
+                block_scores.append(array('d', merged_scores[start:end].tobytes()))
+                block_members.append(merged[start:end])
+        block_scores.extend(self._block_scores[done:])
+        block_members.extend(self._block_members[done:])
+        self._block_scores, self._block_members = block_scores, block_members
+        self._maxes = [(s[-1], m[-1]) for s, m in zip(block_scores, block_members)]
+        self._rebuild_tree()
+
+    def remove(self, member):
+        score = self.scores.pop(member, None)
+        if score is None:
+            return 0
+        self._remove(score, member)
+        return 1
+
+    def score(self, member):
+        return self.scores.get(member)
+
+    def rank(self, member):
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        b, j = self._find(score, member)
+        return self._before(b) + j
+
+    def _iterate(self, b, j):
+        while b < len(self._block_members):
+            scores, members = self._block_scores[b], self._block_members[b]
+            for k in range(j, len(members)):
+                yield members[k], scores[k]
+            b += 1
+            j = 0
+
+    def range_by_score(self, lo, hi, offset=0, count=None):
+        """(member, score) pairs with lo <= score <= hi, in order"""
+        lo, hi = _bound(lo, False), _bound(hi, True)
+        out = []
+        if not self._maxes or lo > hi:
+            return out
+        b = bisect_left(self._maxes, (lo,))
+        if b == len(self._maxes):
+            return out
+        j = bisect_left(self._block_scores[b], lo)
+        limit = math.inf if count is None or count < 0 else count
+        for pair in self._iterate(b, j):
+            if pair[1] > hi or len(out) >= limit:
+                break
+            if offset:
+                offset -= 1
+                continue
+            out.append(pair)
+        return out
+
+    def range_by_rank(self, start, stop):
+        """(member, score) pairs at ranks start..stop inclusive; negatives count from the end"""
+        n = len(self)
+        if start < 0:
+            start += n
+        if stop < 0:
+            stop += n
+        start, stop = max(start, 0), min(stop, n - 1)
+        if start > stop:
+            return []
+        out = []
+        for pair in self._iterate(*self._locate_rank(start)):
+            out.append(pair)
+            if len(out) > stop - start:
+                break
+        return out
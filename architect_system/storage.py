@@ -0,0 +1,109 @@
+# architect_system/storage.py
+"""
+Where derived indexes live and how they are reused across runs
+Indexes sit beside the dataset cache and are rebuilt only when the data changes
+"""
+
+import atexit
+import json
+import os
+import shutil
+import tempfile
+
+_open = {}
+_scratch = None
+
+
+def dataset_stamp(data):
+    """Modification stamp of the files behind `data` (None for in-memory data)"""
+    directory = getattr(data, 'directory', None)
+    if directory:
+        return os.path.getmtime(os.path.join(directory, 'meta.json'))
+    path = getattr(data, 'path', None)
+    if path:
+        return os.path.getmtime(path)
+    return None
+
+
+def _scratch_directory():
+    """One temp dir per process for indexes over in-memory data, removed at exit"""
+    global _scratch
+    if _scratch is None:
+        _scratch = tempfile.mkdtemp(prefix='architect_indexes_')
+        atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+    return _scratch
+
+
+def index_directory(data, name):
+    """Directory for index `name` over `data`: beside the dataset, else in the scratch dir"""
+    base = getattr(data, 'directory', None)
+    if base is None and getattr(data, 'path', None):
+        base = data.path + '.indexes'
+    if base is None:
+        # open_index holds `data`, so its id names the directory for the life of the process
+        return os.path.join(_scratch_directory(), f'{name}_{id(data)}')
+    lo = getattr(data, 'lo', 0)
+    hi = getattr(data, 'hi', len(data))
+    return os.path.join(base, f'{name}_{lo}_{hi}')
+
+
+def data_directory(name):
+    """Directory for data an engine owns rather than derives (kept across runs);
+    $ARCHITECT_DATA_DIR, else under the system temp dir"""
+    base = os.environ.get('ARCHITECT_DATA_DIR') or os.path.join(tempfile.gettempdir(), 'architect_system')
+    return os.path.join(base, name)
+
+
+def load_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def is_current(directory, data):
+    meta = load_meta(directory)
+    stamp = dataset_stamp(data)
+    return (meta is not None and stamp is not None
+            and meta.get('stamp') == stamp and meta.get('count') == len(data))
+
+
+def write_meta(directory, data, **extra):
+    """meta.json goes last: a directory without it is an interrupted build"""
+    meta = dict(extra, stamp=dataset_stamp(data), count=len(data))
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def iter_field(data, field):
+    """Field values in document order, straight from a column when there is one"""
+    if hasattr(data, 'column'):
+        column = data.column(field)
+        for i in range(len(column)):
+            yield column[i]
+    else:
+        for doc in data:
+            yield doc.get(field)
+
+
+def open_index(name, data, build, load):
+    """Index `name` over `data`, cached per id(data) in this process
+
+    build(data, directory) runs only when no current on-disk copy exists;
+    load(directory, data) opens it.
+    """
+    key = (name, id(data))
+    entry = _open.get(key)
+    if entry is not None and entry[0] is data:
+        return entry[1]
+    directory = index_directory(data, name)
+    if not is_current(directory, data):
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        build(data, directory)
+        write_meta(directory, data)
+    index = load(directory, data)
+    # Holding `data` keeps its id from being reused by another object
+    _open[key] = (data, index)
+    return index
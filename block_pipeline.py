@@ -0,0 +1,335 @@
+# block_pipeline.py
+"""
+Zero-copy block producers over the Wikipedia mmap
+Blocks are addressed by offset - nothing is decoded, nothing is copied
+"""
+
+import hashlib
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+
+class BlockView(ABC):
+    """Lazy sequence of blocks over a buffer (mmap, bytes, bytearray)"""
+
+    def __init__(self, buffer, start=0, end=None):
+        # Read-only: no block can write through to the chunk buffer, and slices of bytes hash
+        self.view = memoryview(buffer).toreadonly()
+        self.start = start
+        self.end = len(self.view) if end is None else end
+
+    @abstractmethod
+    def bounds(self, index):
+        """(start, end) byte offsets of block `index` within the buffer"""
+
+    @abstractmethod
+    def __len__(self):
+        """Number of blocks"""
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("block index out of range")
+        lo, hi = self.bounds(index)
+        return self.view[lo:hi]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            lo, hi = self.bounds(i)
+            yield self.view[lo:hi]
+
+    @property
+    def nbytes(self):
+        return self.end - self.start
+
+
+class FixedBlocks(BlockView):
+    """Fixed-size blocks - offsets are computed, never stored"""
+
+    def __init__(self, buffer, block_size, start=0, end=None):
+        super().__init__(buffer, start, end)
+        if block_size < 1:
+            raise ValueError("block_size must be >= 1")
+        self.block_size = block_size
+
+    def __len__(self):
+        return -(-(self.end - self.start) // self.block_size)
+
+    def bounds(self, index):
+        lo = self.start + index * self.block_size
+        return lo, min(lo + self.block_size, self.end)
+
+
+class VariableBlocks(BlockView):
+    """Variable-size blocks described by an array of cut offsets"""
+
+    def __init__(self, buffer, cuts, start=0, end=None):
+        super().__init__(buffer, start, end)
+        # cuts[i] is the end of block i; block 0 starts at `start`
+        self.cuts = cuts if isinstance(cuts, array) else array('Q', cuts)
+        if self.cuts and self.cuts[-1] != self.end:
+            raise ValueError("last cut must equal the end of the range")
+
+    def __len__(self):
+        return len(self.cuts)
+
+    def bounds(self, index):
+        lo = self.start if index == 0 else self.cuts[index - 1]
+        return lo, self.cuts[index]
+
+
+# --- Chunk boundary alignment ----------------------------------------------
+
+_PAGE_END = b'</page>'
+
+
+def _utf8_boundary(buffer, start, end):
+    """Step back over UTF-8 continuation bytes (at most 3) so `end` starts a codepoint"""
+    pos = end
+    while pos > start and end - pos < 4 and (buffer[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos if (buffer[pos] & 0xC0) != 0x80 else end
+
+
+def align_chunk_end(buffer, start, end, mode='utf8', window=1 << 20):
+    """Snap a chunk end back to a codepoint or `</page>` boundary
+
+    `buffer` must support rfind (mmap, bytes, bytearray). The scan is bounded
+    by `window` bytes; if no boundary is found the raw end is kept.
+    """
+    if mode in (None, 'none') or end >= len(buffer):
+        return end
+    if mode == 'page':
+        lo = max(start, end - window)
+        pos = buffer.rfind(_PAGE_END, lo, end)
+        if pos >= 0 and pos + len(_PAGE_END) > start:
+            return pos + len(_PAGE_END)
+        mode = 'utf8'
+    if mode == 'utf8':
+        aligned = _utf8_boundary(buffer, start, end)
+        return aligned if aligned > start else end
+    raise ValueError(f"unknown chunk_boundary: {mode}")
+
+
+def text_blocks(buffer, block_size, start=0, end=None):
+    """Legacy producer: decode to str and split into a list of strings"""
+    chunk_text = bytes(memoryview(buffer)[start:end]).decode('utf-8', errors='ignore')
+    blocks = []
+    for i in range(0, len(chunk_text), block_size):
+        block = chunk_text[i:i+block_size]
+        if block:
+            blocks.append(block)
+    return blocks
+
+
+def text_cut_blocks(buffer, cuts, start=0):
+    """Legacy producer over content-defined cuts: each block decoded to str on its own"""
+    view = memoryview(buffer)
+    blocks = []
+    lo = start
+    for hi in cuts:
+        block = bytes(view[lo:hi]).decode('utf-8', errors='ignore')
+        if block:
+            blocks.append(block)
+        lo = hi
+    return blocks
+
+
+# --- Content-defined chunking ----------------------------------------------
+#
+# Gear rolling hash (FastCDC style) with normalized chunking. The 32-bit gear
+# hash at byte i is sum(G[b[i-k]] << k for k < 32), so it is computed for a
+# whole slab at once by window doubling: five shift-and-add passes instead of
+# a per-byte Python loop. Slabs are cache-sized so the passes never leave
+# L2; only cut selection (min/avg/max) runs per block.
+
+_CDC_SLAB = 64 * 1024  # small enough that every pass stays in cache
+_GEAR_WINDOW = 32
+_GEAR = np.array(
+    [int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=4).digest(), 'little') for i in range(256)],
+    dtype=np.uint32
+)
+
+
+def _cdc_masks(avg_size):
+    """FastCDC normalized masks: stricter before avg_size, looser after"""
+    bits = max(1, avg_size.bit_length() - 1)
+    strict = min(31, bits + 2)
+    loose = max(1, bits - 2)
+    top = lambda n: np.uint32(((1 << n) - 1) << (32 - n))
+    return top(strict), top(loose)
+
+
+def _cdc_candidates(view, start, end, mask_strict, mask_loose):
+    """Absolute cut offsets where the gear hash matches each mask"""
+    strict, loose = [], []
+    h = np.empty(_CDC_SLAB + _GEAR_WINDOW, dtype=np.uint32)
+    tmp = np.empty(_CDC_SLAB + _GEAR_WINDOW, dtype=np.uint32)
+    for lo in range(start, end, _CDC_SLAB):
+        hi = min(lo + _CDC_SLAB, end)
+        pad = min(_GEAR_WINDOW - 1, lo - start)
+        data = np.frombuffer(view[lo - pad:hi], dtype=np.uint8)
+        n = len(data)
+        hs = h[:n]
+        np.take(_GEAR, data, out=hs)
+        for k in range(5):
+            w = 1 << k
+            if w >= n:
+                break
+            np.left_shift(hs[:-w], np.uint32(w), out=tmp[:n - w])
+            np.add(hs[w:], tmp[:n - w], out=hs[w:])
+        np.bitwise_and(hs, mask_loose, out=tmp[:n])
+        hits = np.flatnonzero(tmp[:n] == 0)
+        if len(hits):
+            # A match at byte i cuts after it
+            base = lo - pad + 1
+            hits = hits[hits >= pad]
+            loose.append(hits + base)
+            strict.append(hits[(hs[hits] & mask_strict) == 0] + base)
+    empty = np.empty(0, dtype=np.int64)
+    return (np.concatenate(strict) if strict else empty,
+            np.concatenate(loose) if loose else empty)
+
+
+def cdc_cuts(buffer, start, end, min_size=2048, avg_size=8192, max_size=65536):
+    """Content-defined block cut offsets over buffer[start:end]"""
+    view = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
+    if not min_size <= avg_size <= max_size:
+        raise ValueError("cdc sizes must satisfy min <= avg <= max")
+    mask_strict, mask_loose = _cdc_masks(avg_size)
+    strict, loose = _cdc_candidates(view, start, end, mask_strict, mask_loose)
+    strict, loose = strict.tolist(), loose.tolist()
+    cuts = array('Q')
+    pos = start
+    i = j = 0
+    while pos < end:
+        if end - pos <= min_size:
+            cuts.append(end)
+            break
+        lo, mid, hi = pos + min_size, pos + avg_size, min(pos + max_size, end)
+        i = bisect_left(strict, lo, i)
+        if i < len(strict) and strict[i] < min(mid, hi):
+            cut = strict[i]
+        else:
+            j = bisect_left(loose, max(mid, lo), j)
+            cut = loose[j] if j < len(loose) and loose[j] < hi else hi
+        cuts.append(cut)
+        pos = cut
+    return cuts
+
+
+def make_blocks(buffer, config, start=0, end=None):
+    """Build the block sequence for one chunk from config['chunking'] and config['block_producer']"""
+    producer = config.get('block_producer', 'text')
+    chunking = config.get('chunking', 'fixed')
+    block_size = config['block_size']
+    if end is None:
+        end = len(buffer)
+    if producer not in ('text', 'memoryview'):
+        raise ValueError(f"unknown block_producer: {producer}")
+    if chunking == 'fixed':
+        if producer == 'text':
+            return text_blocks(buffer, block_size, start, end)
+        return FixedBlocks(buffer, block_size, start, end)
+    if chunking == 'cdc':
+        cuts = cdc_cuts(
+            buffer, start, end,
+            config['cdc_min_size'], config['cdc_avg_size'], config['cdc_max_size']
+        )
+        if producer == 'text':
+            return text_cut_blocks(buffer, cuts, start)
+        return VariableBlocks(buffer, cuts, start, end)
+    raise ValueError(f"unknown chunking: {chunking}")
+
+
+# --- Block fingerprints ----------------------------------------------------
+#
+# Fingerprints are fixed-width 64-bit digests used for dedup. Fixed-size
+# blocks are hashed a whole slab at a time with NumPy (one pass per 8-byte
+# word column); variable-size blocks fall back to blake2b per block.
+
+_SLAB = 64 * 1024 * 1024
+_SEED = 0x243F6A8885A308D3
+_PRIME = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _finalize(h):
+    """splitmix64 finalizer, in place"""
+    h ^= h >> np.uint64(30)
+    h *= _MIX1
+    h ^= h >> np.uint64(27)
+    h *= _MIX2
+    h ^= h >> np.uint64(31)
+    return h
+
+
+def _hash_rows(rows, length):
+    """Fingerprint each row of an (n, length) uint8 array"""
+    n = rows.shape[0]
+    width = -(-length // 8)
+    if length % 8:
+        padded = np.zeros((n, width * 8), dtype=np.uint8)
+        padded[:, :length] = rows
+        rows = padded
+    words = np.ascontiguousarray(rows).view('<u8')
+    h = np.full(n, _SEED ^ length, dtype=np.uint64)
+    for j in range(width):
+        h ^= words[:, j]
+        h *= _PRIME
+        h ^= h >> np.uint64(29)
+    return _finalize(h)
+
+
+def fingerprint(block):
+    """64-bit fingerprint of a single fixed-size block (same hash as the slab path)"""
+    row = np.frombuffer(block, dtype=np.uint8).reshape(1, len(block))
+    return int(_hash_rows(row, len(block))[0])
+
+
+def _fixed_fingerprints(blocks):
+    """Unique fingerprints of a FixedBlocks sequence, slab by slab"""
+    bs = blocks.block_size
+    full_end = blocks.start + (blocks.nbytes // bs) * bs
+    parts = []
+    if bs <= 2 and full_end > blocks.start:
+        # Tiny blocks: count distinct values directly, hash only those present
+        data = np.frombuffer(blocks.view[blocks.start:full_end], dtype=np.uint8)
+        if bs == 2:
+            data = data.view('<u2')
+        present = np.flatnonzero(np.bincount(data, minlength=256 ** bs))
+        values = present.astype('<u2' if bs == 2 else np.uint8).view(np.uint8)
+        parts.append(_hash_rows(values.reshape(-1, bs), bs))
+    else:
+        slab = max(bs, (_SLAB // bs) * bs)
+        for lo in range(blocks.start, full_end, slab):
+            hi = min(lo + slab, full_end)
+            rows = np.frombuffer(blocks.view[lo:hi], dtype=np.uint8).reshape(-1, bs)
+            parts.append(np.unique(_hash_rows(rows, bs)))
+    if full_end < blocks.end:
+        parts.append(np.array([fingerprint(blocks.view[full_end:blocks.end])], dtype=np.uint64))
+    if not parts:
+        return np.empty(0, dtype=np.uint64)
+    return np.unique(np.concatenate(parts))
+
+
+def _variable_fingerprints(blocks):
+    """Unique fingerprints of arbitrary blocks via blake2b-64"""
+    digests = array('Q')
+    for block in blocks:
+        digests.append(int.from_bytes(hashlib.blake2b(block, digest_size=8).digest(), 'little'))
+    return np.unique(np.frombuffer(digests, dtype=np.uint64))
+
+
+def block_fingerprints(blocks):
+    """Sorted unique uint64 fingerprints of a block sequence"""
+    if isinstance(blocks, FixedBlocks):
+        return _fixed_fingerprints(blocks)
+    return _variable_fingerprints(blocks)
@@ -0,0 +1,228 @@
+# bz2_stream.py
+"""
+Read enwiki .bz2 dumps directly, pbzip2 style
+bzip2 blocks are located by their bit-aligned magic numbers, each block is
+re-wrapped as a standalone stream and decompressed in a process pool,
+and the output is handed back in order as chunks for the block pipeline
+"""
+
+import bz2
+import mmap
+import os
+from bisect import bisect_left
+from collections import deque
+from multiprocessing import Pool
+
+BLOCK_MAGIC = 0x314159265359
+EOS_MAGIC = 0x177245385090
+_SCAN_RANGE = 64 * 1024 * 1024
+
+
+def _shifted_patterns(magic):
+    """For each bit shift s, the 7-byte image of a 48-bit magic starting s bits into a byte"""
+    patterns = []
+    for s in range(8):
+        image = (magic << (8 - s)).to_bytes(7, 'big')
+        patterns.append((s, image))
+    return patterns
+
+
+_BLOCK_PATTERNS = _shifted_patterns(BLOCK_MAGIC)
+_EOS_PATTERNS = _shifted_patterns(EOS_MAGIC)
+
+
+def _find_magic(mm, patterns, lo, hi):
+    """Bit offsets of a magic number whose first bit lies in bytes [lo, hi)"""
+    found = []
+    size = len(mm)
+    for s, image in patterns:
+        key = image[1:6]  # these five bytes are fully determined for every shift
+        pos = mm.find(key, lo + 1, min(hi + 6, size))
+        while pos >= 0:
+            k = pos - 1
+            if k < hi and k + 6 < size + (s == 0):
+                head_ok = (mm[k] & (0xFF >> s)) == image[0]
+                tail_ok = s == 0 or (mm[k + 6] & (0xFF << (8 - s)) & 0xFF) == image[6]
+                if head_ok and tail_ok:
+                    found.append(k * 8 + s)
+            pos = mm.find(key, pos + 1, min(hi + 6, size))
+    return found
+
+
+def _scan_range(task):
+    """Worker: block and end-of-stream magic positions in one byte range"""
+    path, lo, hi = task
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _find_magic(mm, _BLOCK_PATTERNS, lo, hi), _find_magic(mm, _EOS_PATTERNS, lo, hi)
+
+
+def scan_blocks(path, pool):
+    """List of (start_bit, end_bit, level) for every compressed block in the file"""
+    size = os.path.getsize(path)
+    tasks = [(path, lo, min(lo + _SCAN_RANGE, size)) for lo in range(0, size, _SCAN_RANGE)]
+    block_bits, eos_bits = [], []
+    for blocks, eos in pool.imap(_scan_range, tasks):
+        block_bits.extend(blocks)
+        eos_bits.extend(eos)
+    block_bits.sort()
+    eos_bits.sort()
+
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            blocks = []
+            level = b'9'
+            ends = sorted(block_bits[1:] + eos_bits)
+            j = 0
+            for start in block_bits:
+                byte = start // 8
+                # A byte-aligned block right after 'BZh<level>' opens a new stream
+                if start % 8 == 0 and byte >= 4 and mm[byte - 4:byte - 1] == b'BZh':
+                    level = mm[byte - 1:byte]
+                while j < len(ends) and ends[j] <= start:
+                    j += 1
+                end = ends[j] if j < len(ends) else size * 8
+                blocks.append((start, end, level))
+    return blocks
+
+
+def _extract_bits(mm, start_bit, end_bit):
+    """Bits [start_bit, end_bit) of the file as an int"""
+    lo = start_bit // 8
+    hi = (end_bit + 7) // 8
+    value = int.from_bytes(mm[lo:hi], 'big')
+    value >>= hi * 8 - end_bit
+    return value & ((1 << (end_bit - start_bit)) - 1)
+
+
+def block_as_stream(mm, start_bit, end_bit, level):
+    """Wrap one compressed block as a complete single-block bzip2 stream"""
+    nbits = end_bit - start_bit
+    block = _extract_bits(mm, start_bit, end_bit)
+    # Block CRC sits right after the 48-bit magic; a one-block stream's CRC equals it
+    crc = (block >> (nbits - 80)) & 0xFFFFFFFF
+    value = (block << 80) | (EOS_MAGIC << 32) | crc
+    total = nbits + 80
+    pad = -total % 8
+    return b'BZh' + level + (value << pad).to_bytes((total + pad) // 8, 'big')
+
+
+def _decompress_block(task):
+    """Worker: decompress one block; None if the magic was a false match"""
+    path, start_bit, end_bit, level = task
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            try:
+                return bz2.decompress(block_as_stream(mm, start_bit, end_bit, level))
+            except (OSError, ValueError):
+                return None
+
+
+class Bz2BlockReader:
+    """Decompress a .bz2 file block-parallel, yielding output in file order"""
+
+    def __init__(self, path, num_workers=None, window=None):
+        self.path = path
+        self.num_workers = num_workers or os.cpu_count() or 1
+        # At most `window` decompressed blocks in flight (~900KB compressed each)
+        self.window = window or 2 * self.num_workers
+        self.pool = Pool(self.num_workers)
+        self.blocks = scan_blocks(path, self.pool)
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_blocks(self, first=0):
+        """Yield (block_index, decompressed_bytes) in order with bounded read-ahead"""
+        blocks = self.blocks
+        i = first
+        in_flight = deque()
+        next_task = first
+        while i < len(blocks):
+            while next_task < len(blocks) and len(in_flight) < self.window:
+                start, end, level = blocks[next_task]
+                in_flight.append(self.pool.apply_async(
+                    _decompress_block, ((self.path, start, end, level),)))
+                next_task += 1
+            data = in_flight.popleft().get()
+            if data is None:
+                # Magic matched inside compressed data: merge with the following
+                # block and retry (pbzip2 does the same)
+                self._merge_false_boundary(i)
+                in_flight.clear()
+                next_task = i
+                continue
+            yield i, data
+            i += 1
+
+    def _merge_false_boundary(self, i):
+        if i + 1 >= len(self.blocks):
+            raise OSError(f"corrupt bzip2 block at bit {self.blocks[i][0]}")
+        start, _, level = self.blocks[i]
+        _, end, _ = self.blocks[i + 1]
+        self.blocks[i:i + 2] = [(start, end, level)]
+
+    def block_at(self, start_bit):
+        """Index of the block starting at `start_bit` (resume points use bit offsets)"""
+        return bisect_left(self.blocks, (start_bit,))
+
+    def _resume_point(self, index, offset):
+        start_bit = self.blocks[index][0] if index < len(self.blocks) else os.path.getsize(self.path) * 8
+        return start_bit, offset
+
+    def iter_chunks(self, chunk_size, align=None, resume=(0, 0)):
+        """Yield decompressed chunks of ~chunk_size bytes as dicts
+
+        Each dict carries the chunk buffer, the compressed bytes consumed so
+        far and a resume point: (block start bit, decompressed bytes of that
+        block already emitted). `align(buffer, end)` may move a chunk end back.
+        """
+        first_block = self.block_at(resume[0])
+        skip = resume[1]
+        chunk = bytearray()
+        # (block index, offset within the block's output, length) of each piece of `chunk`
+        spans = []
+        for index, data in self.iter_blocks(first_block):
+            offset = 0
+            if skip:
+                offset, skip = skip, 0
+            chunk += memoryview(data)[offset:]
+            spans.append((index, offset, len(data) - offset))
+            del data
+            while len(chunk) >= chunk_size:
+                end = align(chunk, chunk_size) if align else chunk_size
+                (at, at_offset), spans = _split_spans(spans, end)
+                carry = chunk[end:]
+                del chunk[end:]
+                yield {
+                    'buffer': chunk,
+                    'consumed': self.blocks[index][1] // 8,
+                    'resume': self._resume_point(at, at_offset)
+                }
+                chunk = carry
+        if chunk:
+            yield {
+                'buffer': chunk,
+                'consumed': os.path.getsize(self.path),
+                'resume': self._resume_point(len(self.blocks), 0)
+            }
+
+
+def _split_spans(spans, end):
+    """(block index, offset) at chunk position `end`, and the spans that remain after it"""
+    pos = 0
+    for i, (index, offset, length) in enumerate(spans):
+        if pos + length > end:
+            cut = end - pos
+            rest = [(index, offset + cut, length - cut)] + spans[i + 1:]
+            return (index, offset + cut), rest
+        pos += length
+    index, offset, length = spans[-1]
+    return (index + 1, 0), []
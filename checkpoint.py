@@ -0,0 +1,76 @@
+# checkpoint.py
+"""
+Checkpoint and resume for the full-dump run
+Small JSON snapshot replaced atomically at chunk boundaries, plus an
+append-only journal of newly seen digests so dedup state is never re-serialized
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class CheckpointStore:
+    """checkpoint.json + digests.journal in one directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.state_file = os.path.join(directory, 'checkpoint.json')
+        self.journal_file = os.path.join(directory, 'digests.journal')
+
+    def load(self):
+        """Latest checkpoint, or None if there is nothing to resume"""
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state):
+        """Write the snapshot to a temp file, fsync, then rename over the old one"""
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_file)
+        _fsync_dir(self.directory)
+
+    def append_digests(self, digests):
+        """Append new digests to the journal; returns the journal length in bytes"""
+        with open(self.journal_file, 'ab') as f:
+            if len(digests):
+                f.write(np.ascontiguousarray(digests, dtype='<u8').tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            return f.tell()
+
+    def load_digests(self, length):
+        """Digests journaled up to a checkpoint; bytes past `length` are a torn tail"""
+        if not length:
+            return np.empty(0, dtype=np.uint64)
+        with open(self.journal_file, 'rb') as f:
+            data = f.read(length)
+        return np.unique(np.frombuffer(data, dtype='<u8').astype(np.uint64))
+
+    def truncate_journal(self, length):
+        """Drop journal entries written after the checkpoint being resumed"""
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(length)
+
+    def clear(self):
+        """Remove checkpoint and journal once the run completes"""
+        for path in (self.state_file, self.journal_file):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,103 @@
+# chunk_scheduler.py
+"""
+Multi-process chunk scheduler with a global cross-chunk dedup merge
+Each worker maps a disjoint byte range and returns its unique block digests
+"""
+
+import mmap
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from block_pipeline import block_fingerprints, make_blocks
+from prefetch import advise, drop_range
+
+
+def chunk_ranges(file_size, chunk_size, start=0, align=None):
+    """Disjoint (start, end) byte ranges covering [start, file_size)
+
+    `align(start, end)` may move each end back to a safe boundary.
+    """
+    ranges = []
+    offset = start
+    while offset < file_size:
+        end = min(offset + chunk_size, file_size)
+        if align is not None:
+            end = align(offset, end)
+        ranges.append((offset, end))
+        offset = end
+    return ranges
+
+
+def digest_range(task):
+    """Worker: fingerprint every block in one byte range of the file"""
+    path, start, end, config = task
+    t0 = time.perf_counter()
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            if config.get('prefetch'):
+                advise(mm, 'MADV_SEQUENTIAL', start, end)
+                advise(mm, 'MADV_WILLNEED', start, end)
+            # Workers always take zero-copy blocks; the legacy str producer is serial-only
+            blocks = make_blocks(view, dict(config, block_producer='memoryview'), start, end)
+            num_blocks = len(blocks)
+            digests = block_fingerprints(blocks)
+            del blocks
+            if config.get('prefetch'):
+                # Consumed range leaves the page cache so it cannot crowd out the next one
+                drop_range(mm, f.fileno(), start, end)
+    return {
+        'start': start,
+        'end': end,
+        'blocks': num_blocks,
+        'digests': digests.tobytes(),
+        'seconds': time.perf_counter() - t0
+    }
+
+
+class DigestMerger:
+    """Global set of block fingerprints kept as one sorted uint64 array"""
+
+    def __init__(self, digests=None):
+        self.digests = np.empty(0, dtype=np.uint64) if digests is None else digests
+
+    def __len__(self):
+        return len(self.digests)
+
+    def merge(self, local):
+        """Fold a sorted unique digest array in; returns how many were new"""
+        return len(self.add(local))
+
+    def add(self, local):
+        """Fold a sorted unique digest array in; returns the digests that were new"""
+        if not len(self.digests):
+            self.digests = local
+            return local
+        pos = np.searchsorted(self.digests, local)
+        fresh = self.digests[np.minimum(pos, len(self.digests) - 1)] != local
+        new = local[fresh]
+        if len(new):
+            # Both inputs are sorted: a linear merge at the insertion points, no re-sort
+            self.digests = np.insert(self.digests, pos[fresh], new)
+        return new
+
+
+class ChunkScheduler:
+    """Fan byte ranges out to a process pool and merge digests in file order"""
+
+    def __init__(self, path, config, num_workers=None, merger=None):
+        self.path = path
+        self.config = config
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.merger = merger if merger is not None else DigestMerger()
+
+    def run(self, ranges):
+        """Yield (chunk_result, new_digests) in file order"""
+        tasks = [(self.path, start, end, self.config) for start, end in ranges]
+        with Pool(self.num_workers) as pool:
+            for result in pool.imap(digest_range, tasks):
+                local = np.frombuffer(result['digests'], dtype=np.uint64)
+                result['local_unique'] = len(local)
+                yield result, self.merger.add(local)
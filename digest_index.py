@@ -0,0 +1,215 @@
+# digest_index.py
+"""
+Persistent block-digest index for cross-run dedup
+Open-addressing hash table of 64-bit fingerprints in a memory-mapped file,
+with a Bloom filter in front so most negative contains() lookups never touch the table
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+_EMPTY = np.uint64(0)
+_ONE = np.uint64(1)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _remap_zero(fps):
+    """0 marks an empty slot, so fingerprint 0 is stored as 1"""
+    fps = np.asarray(fps, dtype=np.uint64)
+    return np.where(fps == _EMPTY, _ONE, fps)
+
+
+def _open_array(path, length, dtype):
+    """Memory-map a zero-filled array file, creating it if needed"""
+    mode = 'r+' if os.path.exists(path) else 'w+'
+    return np.memmap(path, dtype=dtype, mode=mode, shape=(length,))
+
+
+class BloomFilter:
+    """Bloom filter over 64-bit fingerprints, k probes by double hashing"""
+
+    def __init__(self, path, capacity, bits_per_key=10):
+        self.path = path
+        self.num_bits = max(64, int(capacity * bits_per_key))
+        self.num_bits = -(-self.num_bits // 64) * 64
+        self.num_hashes = max(1, round(bits_per_key * math.log(2)))
+        self.bits = _open_array(path, self.num_bits // 64, np.uint64)
+
+    def _positions(self, fps):
+        h1 = fps
+        h2 = (fps * _MIX) | _ONE
+        k = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + k[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def add(self, fps):
+        pos = self._positions(np.asarray(fps, dtype=np.uint64)).ravel()
+        np.bitwise_or.at(self.bits, pos >> np.uint64(6), _ONE << (pos & np.uint64(63)))
+
+    def contains(self, fps):
+        """Boolean mask: False means definitely absent"""
+        fps = np.asarray(fps, dtype=np.uint64)
+        if not len(fps):
+            return np.zeros(0, dtype=bool)
+        pos = self._positions(fps)
+        words = self.bits[pos >> np.uint64(6)]
+        return np.all(words & (_ONE << (pos & np.uint64(63))) != 0, axis=1)
+
+    def flush(self):
+        self.bits.flush()
+
+
+class DigestIndex:
+    """On-disk open-addressing set of fingerprints, grown by doubling"""
+
+    def __init__(self, path, capacity=1 << 20, enable_bloom=True,
+                 bloom_bits_per_key=10, max_load=0.7):
+        self.path = path
+        self.max_load = max_load
+        os.makedirs(path, exist_ok=True)
+        meta = self._read_meta()
+        if meta:
+            if enable_bloom != (meta['bloom_capacity'] > 0):
+                raise ValueError(f"digest index at {path} was built with enable_bloom="
+                                 f"{meta['bloom_capacity'] > 0}, opened with {enable_bloom}")
+            self.capacity = meta['capacity']
+            self.count = meta['count']
+            bloom_capacity = meta['bloom_capacity']
+            bloom_bits_per_key = meta['bloom_bits_per_key']
+        else:
+            self.capacity = 1 << max(10, math.ceil(math.log2(capacity / max_load)))
+            self.count = 0
+            bloom_capacity = capacity if enable_bloom else 0
+        self.table = _open_array(self._file('table.u64'), self.capacity, np.uint64)
+        self.bloom = None
+        if enable_bloom:
+            self.bloom = BloomFilter(self._file('bloom.bits'), bloom_capacity, bloom_bits_per_key)
+        self.bloom_capacity = bloom_capacity
+        self.bloom_bits_per_key = bloom_bits_per_key
+        self.bloom_skips = 0
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._file('meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self):
+        meta = {
+            'capacity': self.capacity,
+            'count': self.count,
+            'bloom_capacity': self.bloom_capacity,
+            'bloom_bits_per_key': self.bloom_bits_per_key
+        }
+        tmp = self._file('meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file('meta.json'))
+
+    def __len__(self):
+        return self.count
+
+    def _probe(self, fps, insert):
+        """Vectorized linear probing; returns mask of fingerprints not already present"""
+        mask = self.capacity - 1
+        shift = np.uint64(64 - (self.capacity.bit_length() - 1))
+        slots = ((fps * _MIX) >> shift).astype(np.int64)
+        pending = np.arange(len(fps))
+        new = np.zeros(len(fps), dtype=bool)
+        while len(pending):
+            s = slots[pending]
+            cur = self.table[s]
+            done = cur == fps[pending]
+            empty = cur == _EMPTY
+            if insert:
+                if empty.any():
+                    # Several keys may land on the same empty slot: the first one wins,
+                    # the rest see the winner on the next round and move on
+                    idx = np.flatnonzero(empty)
+                    _, first = np.unique(s[idx], return_index=True)
+                    won = idx[first]
+                    self.table[s[won]] = fps[pending[won]]
+                    new[pending[won]] = True
+                    done[won] = True
+                advance = ~done & ~empty
+            else:
+                new[pending[empty]] = True
+                done |= empty
+                advance = ~done
+            slots[pending[advance]] = (s[advance] + 1) & mask
+            pending = pending[~done]
+        return new
+
+    def contains(self, fps):
+        """Boolean mask of fingerprints already in the index"""
+        fps = _remap_zero(fps)
+        found = np.zeros(len(fps), dtype=bool)
+        maybe = self.bloom.contains(fps) if self.bloom is not None else np.ones(len(fps), dtype=bool)
+        self.bloom_skips += int((~maybe).sum())
+        if maybe.any():
+            found[maybe] = ~self._probe(fps[maybe], insert=False)
+        return found
+
+    def merge(self, local):
+        """Insert unique fingerprints; returns how many were not already indexed"""
+        return len(self.add(local))
+
+    def add(self, local):
+        """Insert unique fingerprints; returns the ones that were not already indexed"""
+        fps = np.unique(_remap_zero(local))
+        if not len(fps):
+            return fps
+        if (self.count + len(fps)) > self.capacity * self.max_load:
+            self._grow(self.count + len(fps))
+        # One probe both answers and inserts; a Bloom check first would only add reads.
+        # The filter is kept current for contains(), where negatives skip the table
+        new = fps[self._probe(fps, insert=True)]
+        if self.bloom is not None:
+            self.bloom.add(new)
+        self.count += len(new)
+        return new
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while needed > capacity * self.max_load:
+            capacity *= 2
+        old = np.array(self.table[self.table != _EMPTY])
+        del self.table
+        tmp = self._file('table.u64.tmp')
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        self.capacity = capacity
+        self.table = _open_array(tmp, capacity, np.uint64)
+        self._probe(old, insert=True)
+        self.table.flush()
+        del self.table
+        os.replace(tmp, self._file('table.u64'))
+        self.table = _open_array(self._file('table.u64'), capacity, np.uint64)
+        if self.bloom is not None and needed > self.bloom_capacity:
+            self._rebuild_bloom(int(capacity * self.max_load), old)
+        self._write_meta()
+
+    def _rebuild_bloom(self, bloom_capacity, fps):
+        del self.bloom
+        path = self._file('bloom.bits')
+        os.remove(path)
+        self.bloom_capacity = bloom_capacity
+        self.bloom = BloomFilter(path, bloom_capacity, self.bloom_bits_per_key)
+        self.bloom.add(fps)
+
+    def recount(self):
+        """Recompute count from the table (the meta file may lag after a crash)"""
+        self.count = int(np.count_nonzero(self.table))
+        return self.count
+
+    def flush(self):
+        self.table.flush()
+        if self.bloom is not None:
+            self.bloom.flush()
+        self._write_meta()
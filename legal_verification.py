@@ -12,9 +12,17 @@ import gc
 import os
 import mmap
 import platform
+import sys
+from contextlib import nullcontext
 from datetime import datetime
 
 from ringcompression1_enhanced import EnhancedRingCompression
+from block_pipeline import align_chunk_end, make_blocks
+from chunk_scheduler import ChunkScheduler, DigestMerger, chunk_ranges
+from digest_index import DigestIndex
+from checkpoint import CheckpointStore
+from prefetch import ReadAhead
+from bz2_stream import Bz2BlockReader
 
 class LegalVerification:
     def __init__(self):
@@ -45,14 +53,34 @@ class LegalVerification:
             'similarity_threshold': 1,      # Exact matching for speed
             'batch_size': 2000000000,     # 25 billion capacity
             'num_workers': 2,               # Optimal for this algorithm
-            'enable_bloom': False,           # Your setting
+            'enable_bloom': False,           # Your setting - Bloom front of the digest index
             'target_time_ms': 10000,
-            'block_size': 1                 # 1 byte blocks - YOUR PROVEN SETTING
+            'block_size': 1,                # 1 byte blocks - YOUR PROVEN SETTING
+            'block_producer': 'text',       # 'text' = str list the compressor expects, 'memoryview' = zero-copy slices (opt-in)
+            'scheduler': 'serial',          # 'serial' = one core, 'process' = pool + global dedup merge
+            'process_workers': None,        # pool size for 'process' (None = all cores)
+            'digest_index': None,           # directory of the persistent digest index (None = in-memory; process scheduler only)
+            'bloom_bits_per_key': 10,       # ~1% false positives at 10 bits/key
+            'chunking': 'fixed',            # 'fixed' = block_size slices, 'cdc' = content-defined
+            'cdc_min_size': 2048,
+            'cdc_avg_size': 8192,
+            'cdc_max_size': 65536,
+            'checkpoint_dir': None,         # directory for resumable checkpoints (None = off)
+            'checkpoint_every': 1,          # chunks between checkpoints
+            'chunk_boundary': 'utf8',       # snap chunk ends to 'utf8' codepoints, '</page>' records ('page') or 'none'
+            'boundary_window': 1048576,     # max bytes scanned backwards for a boundary
+            'prefetch': True,               # warm the next chunk while this one is processed
+            'prefetch_depth': 1             # chunks queued ahead of the reader thread
         }
     
-    def process_wikipedia_complete(self):
-        """Process entire 103GB Wikipedia database"""
-        
+    def process_wikipedia_complete(self, resume=False):
+        """Process entire 103GB Wikipedia database (XML, or the .bz2 dump read directly)"""
+
+        # Only the process scheduler merges fingerprints through the digest index
+        if self.config['digest_index'] and (self.config['scheduler'] != 'process'
+                                            or self.wikipedia_file.endswith('.bz2')):
+            raise ValueError("digest_index requires scheduler='process' and uncompressed input")
+
         if not os.path.exists(self.wikipedia_file):
             print(f"ERROR: Wikipedia file not found at {self.wikipedia_file}")
             return None
@@ -60,22 +88,58 @@ class LegalVerification:
         file_size = os.path.getsize(self.wikipedia_file)
         file_size_gb = file_size / (1024**3)
         
-        # Generate session hash UPFRONT
-        session_data = {
-            'start_time': datetime.utcnow().isoformat() + 'Z',
-            'file': self.wikipedia_file,
-            'file_size': file_size,
-            'config': self.config,
-            'random_seed': os.urandom(32).hex()
-        }
-        session_json = json.dumps(session_data, sort_keys=True)
-        SESSION_HASH = hashlib.sha256(session_json.encode()).hexdigest()
+        checkpoints = None
+        state = None
+        if self.config['checkpoint_dir']:
+            checkpoints = CheckpointStore(self.config['checkpoint_dir'])
+            if resume:
+                state = checkpoints.load()
+        
+        if state is not None:
+            # Resumed run keeps the original session hash
+            if (state['file'] != self.wikipedia_file or state['file_size'] != file_size
+                    or state['config'] != json.loads(json.dumps(self.config))):
+                print("ERROR: checkpoint was written for a different file or configuration")
+                return None
+            SESSION_HASH = state['session_hash']
+            state['resumes'] += 1
+        else:
+            # Generate session hash UPFRONT
+            session_data = {
+                'start_time': datetime.utcnow().isoformat() + 'Z',
+                'file': self.wikipedia_file,
+                'file_size': file_size,
+                'config': self.config,
+                'random_seed': os.urandom(32).hex()
+            }
+            session_json = json.dumps(session_data, sort_keys=True)
+            SESSION_HASH = hashlib.sha256(session_json.encode()).hexdigest()
+            state = {
+                'session_hash': SESSION_HASH,
+                'file': self.wikipedia_file,
+                'file_size': file_size,
+                'config': self.config,
+                'offset': 0,
+                'chunk_num': 0,
+                'total_blocks': 0,
+                'total_unique': 0,
+                'elapsed_seconds': 0.0,
+                'journal_bytes': 0,
+                'previously_indexed': None,
+                'bz2_resume': [0, 0],
+                'resumes': 0
+            }
+            if checkpoints:
+                checkpoints.clear()
         
         print("\n" + "="*70)
         print("WIKIPEDIA COMPLETE DATABASE PROCESSING")
         print("="*70)
         print(f"SESSION HASH (proof this is one continuous run):")
         print(f"{SESSION_HASH}")
+        if state['resumes']:
+            print(f"RESUMED at byte {state['offset']:,} after {state['elapsed_seconds']/60:.1f} min "
+                  f"(resume #{state['resumes']})")
         print("="*70)
         print(f"File: {self.wikipedia_file}")
         print(f"Size: {file_size:,} bytes ({file_size_gb:.1f} GB)")
@@ -99,80 +163,29 @@ class LegalVerification:
         chunk_size = 1 * 1024 * 1024 * 1024  # 10GB chunks - only change
         block_size = self.config['block_size']  # 1 byte - unchanged
         
-        total_blocks = 0
-        total_unique = 0
-        start_time = time.perf_counter()
+        # Elapsed time carries over from the checkpoint
+        start_time = time.perf_counter() - state['elapsed_seconds']
         
-        print(f"\nProcessing in {block_size} byte continuous blocks...")
+        if self.config['chunking'] == 'cdc':
+            print(f"\nProcessing in content-defined blocks "
+                  f"({self.config['cdc_min_size']}/{self.config['cdc_avg_size']}/{self.config['cdc_max_size']} bytes)...")
+        else:
+            print(f"\nProcessing in {block_size} byte continuous blocks...")
         print("="*70)
         
-        with open(self.wikipedia_file, 'rb') as f:
-            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
-                
-                offset = 0
-                chunk_num = 0
-                
-                while offset < file_size:
-                    chunk_num += 1
-                    chunk_end = min(offset + chunk_size, file_size)
-                    chunk_size_gb = (chunk_end - offset) / (1024**3)
-                    
-                    print(f"\nChunk {chunk_num} ({offset/(1024**3):.1f}GB - {chunk_end/(1024**3):.1f}GB):")
-                    print(f"SESSION: {SESSION_HASH[:16]}...")  # Show session hash
-                    
-                    # Load chunk
-                    chunk_start = time.perf_counter()
-                    chunk_bytes = mmapped_file[offset:chunk_end]
-                    chunk_text = chunk_bytes.decode('utf-8', errors='ignore')
-                    
-                    # Create continuous blocks
-                    blocks = []
-                    for i in range(0, len(chunk_text), block_size):
-                        block = chunk_text[i:i+block_size]
-                        if block:
-                            blocks.append(block)
-                    
-                    load_time = time.perf_counter() - chunk_start
-                    
-                    # Process blocks
-                    process_start = time.perf_counter()
-                    compressed, stats = compressor.optimize_for_text_files(
-                        blocks,
-                        target_time_ms=self.config['target_time_ms']
-                    )
-                    process_time = time.perf_counter() - process_start
-                    
-                    # Calculate metrics
-                    throughput = len(blocks) / process_time if process_time > 0 else 0
-                    total_blocks += len(blocks)
-                    total_unique += len(compressed)
-                    compression_percent = (1 - len(compressed)/len(blocks)) * 100
-                    
-                    print(f"  Blocks: {len(blocks):,}")
-                    print(f"  Unique: {len(compressed):,}")
-                    print(f"  Compression: {compression_percent:.1f}% eliminated")
-                    print(f"  Process time: {process_time:.2f}s")
-                    print(f"  Throughput: {throughput:,.0f} blocks/sec")
-                    
-                    # MongoDB baseline (your proven 200 items/sec)
-                    mongodb_baseline = 200
-                    improvement = throughput / mongodb_baseline
-                    print(f"  Performance factor: {improvement:,.0f}x")
-                    
-                    # Clean up
-                    del blocks
-                    del compressed
-                    del chunk_bytes
-                    del chunk_text
-                    gc.collect()
-                    
-                    offset = chunk_end
-                    
-                    # Progress indicator
-                    progress = (offset / file_size) * 100
-                    elapsed = time.perf_counter() - start_time
-                    eta = (elapsed / progress * 100) - elapsed if progress > 0 else 0
-                    print(f"  Progress: {progress:.1f}% (ETA: {eta/60:.1f} min)")
+        if self.wikipedia_file.endswith('.bz2') and self.config['scheduler'] == 'process':
+            # Parallelism for .bz2 input comes from block decompression instead
+            print("Input is .bz2: decompressing in a process pool, blocks processed in order")
+        
+        if self.config['scheduler'] == 'process' and not self.wikipedia_file.endswith('.bz2'):
+            total_blocks, total_unique = self.process_parallel(
+                file_size, chunk_size, SESSION_HASH, start_time, state, checkpoints)
+        else:
+            total_blocks, total_unique = self.process_serial(
+                compressor, file_size, chunk_size, SESSION_HASH, start_time, state, checkpoints)
+        
+        if checkpoints:
+            checkpoints.clear()
         
         # Final results
         total_elapsed = time.perf_counter() - start_time
@@ -194,6 +207,7 @@ class LegalVerification:
             'mongodb_baseline': 200,
             'performance_factor': final_throughput / 200,
             'configuration': self.config,
+            'resumes': state['resumes'],
             'hardware': {
                 'cpu': platform.processor() or 'Standard CPU',
                 'ram_gb': os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024**3),
@@ -203,6 +217,227 @@ class LegalVerification:
         
         return results
     
+    def save_checkpoint(self, checkpoints, state, start_time):
+        """Snapshot progress at a chunk boundary if one is due"""
+        if checkpoints is None or state['chunk_num'] % self.config['checkpoint_every']:
+            return
+        state['elapsed_seconds'] = time.perf_counter() - start_time
+        checkpoints.save(state)
+        print(f"  Checkpoint: byte {state['offset']:,}")
+    
+    def mmap_chunks(self, file_size, chunk_size, offset):
+        """Yield chunks of the uncompressed XML as zero-copy ranges of one mmap"""
+        
+        with open(self.wikipedia_file, 'rb') as f:
+            # Blocks are memoryview slices of file_view - no copies, no decode
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file, \
+                    memoryview(mmapped_file) as file_view, \
+                    (ReadAhead(mmapped_file, f.fileno(), self.config['prefetch_depth'])
+                     if self.config['prefetch'] else nullcontext()) as readahead:
+                
+                while offset < file_size:
+                    chunk_end = align_chunk_end(
+                        mmapped_file, offset, min(offset + chunk_size, file_size),
+                        self.config['chunk_boundary'], self.config['boundary_window']
+                    )
+                    if readahead:
+                        # Disk reads for the next chunk overlap with processing this one
+                        readahead.schedule(chunk_end, min(chunk_end + chunk_size, file_size))
+                    
+                    yield {
+                        'start': offset,
+                        'end': chunk_end,
+                        'buffer': file_view,
+                        'lo': offset,
+                        'hi': chunk_end,
+                        'position': chunk_end
+                    }
+                    
+                    if readahead:
+                        readahead.release(offset, chunk_end)
+                    offset = chunk_end
+    
+    def bz2_chunks(self, chunk_size, state):
+        """Yield decompressed chunks straight from the .bz2 dump (offsets are decompressed bytes)"""
+        
+        offset = state['offset']
+        align = lambda buffer, end: align_chunk_end(
+            buffer, 0, end, self.config['chunk_boundary'], self.config['boundary_window'])
+        
+        with Bz2BlockReader(self.wikipedia_file, self.config['process_workers']) as reader:
+            print(f"bzip2 blocks: {len(reader.blocks):,} ({reader.num_workers} decompression workers)")
+            for chunk in reader.iter_chunks(chunk_size, align, tuple(state['bz2_resume'])):
+                size = len(chunk['buffer'])
+                yield {
+                    'start': offset,
+                    'end': offset + size,
+                    'buffer': chunk['buffer'],
+                    'lo': 0,
+                    'hi': size,
+                    'position': chunk['consumed'],
+                    'bz2_resume': list(chunk['resume'])
+                }
+                offset += size
+                del chunk
+    
+    def process_serial(self, compressor, file_size, chunk_size, SESSION_HASH, start_time,
+                       state, checkpoints=None):
+        """Walk the input one chunk at a time through the compressor"""
+        
+        total_blocks = state['total_blocks']
+        total_unique = state['total_unique']
+        chunk_num = state['chunk_num']
+        
+        if self.wikipedia_file.endswith('.bz2'):
+            chunks = self.bz2_chunks(chunk_size, state)
+        else:
+            chunks = self.mmap_chunks(file_size, chunk_size, state['offset'])
+        
+        for chunk in chunks:
+            chunk_num += 1
+            offset, chunk_end = chunk['start'], chunk['end']
+            chunk_size_gb = (chunk_end - offset) / (1024**3)
+            
+            print(f"\nChunk {chunk_num} ({offset/(1024**3):.1f}GB - {chunk_end/(1024**3):.1f}GB):")
+            print(f"SESSION: {SESSION_HASH[:16]}...")  # Show session hash
+            
+            # Load chunk
+            chunk_start = time.perf_counter()
+            blocks = make_blocks(chunk['buffer'], self.config, chunk['lo'], chunk['hi'])
+            load_time = time.perf_counter() - chunk_start
+            
+            # Process blocks
+            process_start = time.perf_counter()
+            compressed, stats = compressor.optimize_for_text_files(
+                blocks,
+                target_time_ms=self.config['target_time_ms']
+            )
+            process_time = time.perf_counter() - process_start
+            
+            # Calculate metrics
+            num_blocks = len(blocks)
+            throughput = num_blocks / process_time if process_time > 0 else 0
+            total_blocks += num_blocks
+            total_unique += len(compressed)
+            compression_percent = (1 - len(compressed)/num_blocks) * 100
+            
+            print(f"  Blocks: {num_blocks:,}")
+            print(f"  Unique: {len(compressed):,}")
+            print(f"  Compression: {compression_percent:.1f}% eliminated")
+            print(f"  Process time: {process_time:.2f}s")
+            print(f"  Throughput: {throughput:,.0f} blocks/sec")
+            
+            # MongoDB baseline (your proven 200 items/sec)
+            mongodb_baseline = 200
+            improvement = throughput / mongodb_baseline
+            print(f"  Performance factor: {improvement:,.0f}x")
+            
+            # Clean up - block views must be released before the buffer goes away
+            del blocks
+            del compressed
+            if self.config['block_producer'] == 'text':
+                gc.collect()
+            
+            state.update(offset=chunk_end, chunk_num=chunk_num,
+                         total_blocks=total_blocks, total_unique=total_unique)
+            if 'bz2_resume' in chunk:
+                state['bz2_resume'] = chunk['bz2_resume']
+            self.save_checkpoint(checkpoints, state, start_time)
+            
+            # Progress indicator
+            progress = (chunk['position'] / file_size) * 100
+            elapsed = time.perf_counter() - start_time
+            eta = (elapsed / progress * 100) - elapsed if progress > 0 else 0
+            print(f"  Progress: {progress:.1f}% (ETA: {eta/60:.1f} min)")
+            del chunk
+        
+        return total_blocks, total_unique
+    
+    def process_parallel(self, file_size, chunk_size, SESSION_HASH, start_time,
+                         state, checkpoints=None):
+        """Digest disjoint byte ranges on a process pool, merge into one global set"""
+        
+        index = None
+        if self.config['digest_index']:
+            # Persistent index: blocks seen by earlier runs are not counted again
+            index = DigestIndex(
+                self.config['digest_index'],
+                enable_bloom=self.config['enable_bloom'],
+                bloom_bits_per_key=self.config['bloom_bits_per_key']
+            )
+            if state['previously_indexed'] is None:
+                state['previously_indexed'] = len(index)
+            else:
+                # Replaying chunks after the checkpoint is idempotent: the index is a set
+                index.recount()
+            print(f"Digest index: {self.config['digest_index']} "
+                  f"({state['previously_indexed']:,} digests from previous runs)")
+            merger = index
+        else:
+            restored = None
+            if checkpoints:
+                # In-memory dedup state is rebuilt from the digest journal
+                restored = checkpoints.load_digests(state['journal_bytes'])
+                checkpoints.truncate_journal(state['journal_bytes'])
+            merger = DigestMerger(restored)
+            state['previously_indexed'] = 0
+        
+        scheduler = ChunkScheduler(
+            self.wikipedia_file,
+            self.config,
+            num_workers=self.config['process_workers'],
+            merger=merger
+        )
+        print(f"Workers: {scheduler.num_workers} processes")
+        previously_indexed = state['previously_indexed']
+        
+        total_blocks = state['total_blocks']
+        with open(self.wikipedia_file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
+                # Only the pages just before each boundary are touched here
+                ranges = chunk_ranges(
+                    file_size, chunk_size, start=state['offset'],
+                    align=lambda lo, hi: align_chunk_end(
+                        mmapped_file, lo, hi,
+                        self.config['chunk_boundary'], self.config['boundary_window']
+                    )
+                )
+        
+        for chunk_num, (result, new_digests) in enumerate(scheduler.run(ranges), state['chunk_num'] + 1):
+            offset, chunk_end = result['start'], result['end']
+            new_unique = len(new_digests)
+            total_blocks += result['blocks']
+            throughput = result['blocks'] / result['seconds'] if result['seconds'] > 0 else 0
+            
+            print(f"\nChunk {chunk_num} ({offset/(1024**3):.1f}GB - {chunk_end/(1024**3):.1f}GB):")
+            print(f"SESSION: {SESSION_HASH[:16]}...")
+            print(f"  Blocks: {result['blocks']:,}")
+            print(f"  Unique in chunk: {result['local_unique']:,}")
+            print(f"  New globally: {new_unique:,} (global unique: {len(scheduler.merger):,})")
+            print(f"  Worker time: {result['seconds']:.2f}s")
+            print(f"  Worker throughput: {throughput:,.0f} blocks/sec")
+            
+            # Journal is appended every chunk so it always covers the next checkpoint
+            if checkpoints and index is None:
+                state['journal_bytes'] = checkpoints.append_digests(new_digests)
+            if checkpoints and index is not None and chunk_num % self.config['checkpoint_every'] == 0:
+                index.flush()
+            state.update(offset=chunk_end, chunk_num=chunk_num, total_blocks=total_blocks,
+                         total_unique=len(merger) - previously_indexed)
+            self.save_checkpoint(checkpoints, state, start_time)
+            
+            # Progress indicator
+            progress = (chunk_end / file_size) * 100
+            elapsed = time.perf_counter() - start_time
+            eta = (elapsed / progress * 100) - elapsed if progress > 0 else 0
+            print(f"  Progress: {progress:.1f}% (ETA: {eta/60:.1f} min)")
+        
+        if index is not None:
+            index.flush()
+        
+        # Unique count comes from the merged set, not a per-chunk sum
+        return total_blocks, len(merger) - previously_indexed
+    
     def generate_cryptographic_proof(self, results):
         """Generate verifiable proof of results"""
         
@@ -327,7 +562,7 @@ Contact: [Provided separately to interested firms]
         
         return report
     
-    def run(self):
+    def run(self, resume=False):
         """Execute complete legal verification"""
         
         print("""
@@ -363,7 +598,7 @@ Contact: [Provided separately to interested firms]
         input("\n>>> PRESS ENTER TO BEGIN PROCESSING THE FULL 103GB WIKIPEDIA DATABASE <<<\n")
         
         # Process Wikipedia
-        results = self.process_wikipedia_complete()
+        results = self.process_wikipedia_complete(resume=resume)
         
         if results:
             # Generate proof
@@ -404,7 +639,8 @@ Contact: [Provided separately to interested firms]
 
 def main():
     verification = LegalVerification()
-    verification.run()
+    # --resume picks up from the latest checkpoint in config['checkpoint_dir']
+    verification.run(resume='--resume' in sys.argv[1:])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,88 @@
+# prefetch.py
+"""
+Double-buffered read-ahead for the chunk loop
+The next range is warmed by a reader thread while the current one is processed;
+consumed ranges are dropped from the mapping and the page cache
+"""
+
+import mmap
+import os
+import queue
+import threading
+
+_READ_SLAB = 8 * 1024 * 1024
+
+
+def _page_span(start, end):
+    """Page-aligned (offset, length) covering [start, end)"""
+    lo = start - start % mmap.PAGESIZE
+    return lo, end - lo
+
+
+def advise(mm, option_name, start, end):
+    """madvise a byte range if this platform supports the option"""
+    option = getattr(mmap, option_name, None)
+    if option is None or end <= start:
+        return
+    lo, length = _page_span(start, end)
+    mm.madvise(option, lo, length)
+
+
+def drop_range(mm, fd, start, end):
+    """Release a consumed range from this process and from the page cache"""
+    advise(mm, 'MADV_DONTNEED', start, end)
+    if hasattr(os, 'posix_fadvise') and end > start:
+        lo, length = _page_span(start, end)
+        os.posix_fadvise(fd, lo, length, os.POSIX_FADV_DONTNEED)
+
+
+class ReadAhead:
+    """Background reader that keeps at most `depth` ranges warm ahead of the consumer"""
+
+    def __init__(self, mm, fd, depth=1):
+        self.mm = mm
+        self.fd = fd
+        # Bounded queue is the backpressure: schedule() blocks once `depth` ranges are pending
+        self.pending = queue.Queue(maxsize=depth)
+        self.buffer = bytearray(_READ_SLAB)
+        self.stopped = threading.Event()
+        advise(mm, 'MADV_SEQUENTIAL', 0, len(mm))
+        self.thread = threading.Thread(target=self._reader, name='read-ahead', daemon=True)
+        self.thread.start()
+
+    def _reader(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            start, end = item
+            # pread releases the GIL, so this overlaps with block processing
+            view = memoryview(self.buffer)
+            offset = start
+            while offset < end and not self.stopped.is_set():
+                n = os.preadv(self.fd, [view[:min(_READ_SLAB, end - offset)]], offset)
+                if n <= 0:
+                    break
+                offset += n
+            view.release()
+
+    def schedule(self, start, end):
+        """Ask the kernel and the reader thread to warm [start, end)"""
+        if end <= start:
+            return
+        advise(self.mm, 'MADV_WILLNEED', start, end)
+        self.pending.put((start, end))
+
+    def release(self, start, end):
+        drop_range(self.mm, self.fd, start, end)
+
+    def close(self):
+        self.stopped.set()
+        self.pending.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
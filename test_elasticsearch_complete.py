@@ -10,6 +10,8 @@ import json
 import os
 from datetime import datetime
 
+from test_mongodb_complete import load_test_data
+
 ELASTICSEARCH_CLAIMS = {
     "search": {"value": 50, "unit": "ms", "note": "full-text search"},
     "index": {"value": 20000, "unit": "docs/sec/node", "note": "indexing rate"},
@@ -26,10 +28,15 @@ def test_fulltext_search(data):
     print("="*60)
     
     try:
-        from architect_system import fulltext_search
+        from architect_system import fulltext_search, index_documents
     except ImportError:
         return None
     
+    # Build (first run only) or mmap the index outside the timed queries
+    start = time.perf_counter()
+    index_documents(data)
+    print(f"  Index ready: {time.perf_counter() - start:.2f}s")
+    
     # Test with complex queries
     queries = [
         "machine learning AND neural networks",
@@ -61,10 +68,14 @@ def test_fuzzy_matching(data):
     print("="*60)
     
     try:
-        from architect_system import fuzzy_search
+        from architect_system import fuzzy_search, fuzzy_index
     except ImportError:
         return None
     
+    start = time.perf_counter()
+    fuzzy_index(data)
+    print(f"  Fuzzy index ready: {time.perf_counter() - start:.2f}s")
+    
     # Test with typos
     typo_queries = [
         ("databse", "database"),  # Missing 'a'
@@ -86,6 +97,45 @@ def test_fuzzy_matching(data):
     print(f"\nDESTRUCTION: {improvement:.0f}x faster")
     return {"fuzzy_ms": avg_time, "improvement": improvement}
 
+def test_autocomplete(data):
+    """Destroy their search-as-you-type"""
+    print("\n" + "="*60)
+    print("AUTOCOMPLETE DESTRUCTION")
+    print(f"Elasticsearch claims: {ELASTICSEARCH_CLAIMS['autocomplete']['value']}ms")
+    print("="*60)
+    
+    try:
+        from architect_system import autocomplete, autocomplete_index
+    except ImportError:
+        return None
+    
+    start = time.perf_counter()
+    index = autocomplete_index(data)
+    print(f"  Autocomplete index ready: {time.perf_counter() - start:.2f}s")
+    
+    # Every keystroke of each word is one request, as a search box would send them
+    words = ["database", "quantum computing", "machine learning", "elasticsearch", "united states"]
+    
+    times = []
+    for word in words:
+        for i in range(1, len(word) + 1):
+            start = time.perf_counter()
+            results = autocomplete(data, word[:i], k=10)
+            times.append((time.perf_counter() - start) * 1000)
+        print(f"  '{word}': {len(word)} keystrokes, top: {results[:3]}")
+    
+    avg_time = sum(times) / len(times)
+    improvement = ELASTICSEARCH_CLAIMS['autocomplete']['value'] / avg_time
+    
+    print(f"  Average: {avg_time:.3f}ms over {len(times)} keystrokes (max {max(times):.3f}ms)")
+    print(f"  Index: {index.nbytes:,} bytes on disk, {index.resident_bytes:,} resident")
+    if hasattr(data, 'column'):
+        titles = data.column('title')
+        print(f"  Raw title column: {int(titles.offsets[-1] - titles.offsets[0]):,} bytes")
+    
+    print(f"\nDESTRUCTION: {improvement:.0f}x faster")
+    return {"autocomplete_ms": avg_time, "improvement": improvement}
+
 # ... [Continue with more tests]
 
 def main():
@@ -98,6 +148,7 @@ def main():
     results = {}
     results['search'] = test_fulltext_search(data)
     results['fuzzy'] = test_fuzzy_matching(data)
+    results['autocomplete'] = test_autocomplete(data)
     
     print("\n" + "="*60)
     print("ELASTICSEARCH: YOUR SEARCH IS SLOW")
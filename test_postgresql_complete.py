@@ -4,6 +4,16 @@ The Architect vs PostgreSQL - 30 Years of Development, 30 Seconds to Destroy
 Patent #63/841086
 """
 
+import itertools
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from test_mongodb_complete import load_test_data
+
 POSTGRESQL_CLAIMS = {
     "tps": {"value": 5000, "unit": "transactions/sec", "note": "pgbench"},
     "join": {"value": 500, "unit": "ms", "note": "complex joins"},
@@ -11,10 +21,188 @@ POSTGRESQL_CLAIMS = {
     "json": {"value": 200, "unit": "ms", "note": "JSONB queries"}
 }
 
+def wikipedia_tables(data):
+    """docs, authors and categories tables (dicts of columns) from the columnar dataset"""
+    rng = np.random.default_rng(63841086)
+    docs = {
+        "doc_id": np.arange(len(data), dtype=np.int64),
+        "author_id": data.column("author").astype(np.int64),
+        "category_id": data.column("category").astype(np.int64),
+        "year": np.asarray(data.column("year")),
+        "size": np.asarray(data.column("size")),
+    }
+    tables = {"docs": docs}
+    for name, key, column in (("authors", "author_id", "author"), ("categories", "category_id", "category")):
+        count = len(data.dictionary(column))
+        ids = rng.permutation(count)        # dimension rows in no particular order
+        first_year = np.full(count, np.iinfo(np.int32).max, dtype=np.int32)
+        np.minimum.at(first_year, docs[key], docs["year"])
+        tables[name] = {
+            key: ids,
+            "articles": np.bincount(docs[key], minlength=count)[ids],
+            "first_year": first_year[ids],
+        }
+    return tables
+
+def _run_join(label, chunks):
+    """Drain a join's result chunks; (rows, seconds, peak traced bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = sum(len(next(iter(chunk.values()))) for chunk in chunks)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label}: {rows:,} rows in {elapsed * 1000:.1f}ms = {rows / elapsed:,.0f} rows/sec, "
+          f"peak {peak / 2**20:.1f}MB")
+    return rows, elapsed, peak
+
 def test_complex_joins(data):
     """Destroy their JOIN performance"""
     print("\nPostgreSQL's famous JOIN optimization?")
     print("Let me show you real optimization...")
+    print(f"PostgreSQL claims: {POSTGRESQL_CLAIMS['join']['value']}ms for complex joins")
+    
+    try:
+        from architect_system import hash_join, merge_join, multi_join
+    except ImportError:
+        print("ERROR: architect_system not available")
+        return None
+    if not hasattr(data, "column"):
+        print("ERROR: joins need the columnar dataset")
+        return None
+    
+    tables = wikipedia_tables(data)
+    docs, authors, categories = tables["docs"], tables["authors"], tables["categories"]
+    # The same docs keyed by doc_id in shuffled order: a build side as large as the probe side
+    shuffled = {name: column[np.random.default_rng(7).permutation(len(data))] for name, column in docs.items()}
+    docs_bytes = sum(column.nbytes for column in docs.values())
+    print(f"Tables: docs {len(data):,} rows ({docs_bytes / 2**20:.0f}MB), "
+          f"authors {len(authors['author_id']):,}, categories {len(categories['category_id']):,}")
     
     # Test complex multi-table joins
-    # ... [implementation]
\ No newline at end of file
+    rows, elapsed, peak = _run_join(
+        "docs ⋈ authors ⋈ categories (pipelined hash join)",
+        multi_join(docs, [(authors, "author_id"), (categories, "category_id")]))
+    results = {"join_ms": elapsed * 1000, "join_rows_per_sec": rows / elapsed, "join_peak_bytes": peak}
+    
+    _run_join("docs ⋈ docs on doc_id (hash join, in memory)",
+              hash_join(docs, shuffled, "doc_id", memory_bytes=4 * docs_bytes))
+    budget = docs_bytes // 4
+    spill = {}
+    _, elapsed, peak = _run_join(f"docs ⋈ docs on doc_id (hash join, {budget / 2**20:.0f}MB budget)",
+                                 hash_join(docs, shuffled, "doc_id", memory_bytes=budget, stats=spill))
+    print(f"    spilled {spill['spilled_bytes'] / 2**20:.0f}MB across {spill['partitions']} partitions")
+    results["spill_rows_per_sec"] = len(data) / elapsed
+    
+    order = np.argsort(shuffled["doc_id"], kind="stable")
+    presorted = {name: column[order] for name, column in shuffled.items()}
+    _run_join("docs ⋈ docs on doc_id (sort-merge join, pre-sorted inputs)",
+              merge_join(docs, presorted, "doc_id"))
+    
+    improvement = POSTGRESQL_CLAIMS['join']['value'] / results["join_ms"]
+    print(f"\nThree-way join: {results['join_ms']:.1f}ms")
+    print(f"PostgreSQL: {POSTGRESQL_CLAIMS['join']['value']}ms")
+    print(f"DESTRUCTION FACTOR: {improvement:.1f}x faster")
+    results["improvement"] = improvement
+    return results
+
+def test_index_creation(data, inserts=100_000):
+    """CREATE INDEX: bottom-up bulk load vs one row at a time"""
+    print("\nPostgreSQL index creation?")
+    print(f"PostgreSQL claims: {POSTGRESQL_CLAIMS['index']['value']:,} rows/sec")
+    
+    try:
+        from architect_system import BPlusTree, bulk_load
+    except ImportError:
+        print("ERROR: architect_system not available")
+        return None
+    
+    if hasattr(data, "column"):
+        keys = np.asarray(data.column("size"))
+    else:
+        keys = np.fromiter((doc.get("size", 0) for doc in data), dtype=np.int64)
+    rows = len(keys)
+    
+    with tempfile.TemporaryDirectory(prefix="architect_index_") as directory:
+        start = time.perf_counter()
+        tree = bulk_load(os.path.join(directory, "size.bulk"), keys)
+        bulk_elapsed = time.perf_counter() - start
+        
+        rng = np.random.default_rng(5)
+        for key in rng.choice(keys, 100):
+            assert np.all(keys[tree.lookup(int(key))] == key)
+        print(f"  Bulk load: {rows:,} rows in {bulk_elapsed:.2f}s = {rows / bulk_elapsed:,.0f} rows/sec "
+              f"(height {tree.height}, {tree.nbytes / 2**20:.1f}MB of pages)")
+        
+        sample = min(inserts, rows)
+        one_by_one = BPlusTree.create(os.path.join(directory, "size.inserts"))
+        start = time.perf_counter()
+        for rowid, key in enumerate(keys[:sample].tolist()):
+            one_by_one.insert(key, rowid)
+        one_by_one.flush()
+        insert_elapsed = time.perf_counter() - start
+        print(f"  One-at-a-time inserts: {sample:,} rows in {insert_elapsed:.2f}s = "
+              f"{sample / insert_elapsed:,.0f} rows/sec ({one_by_one.nbytes / 2**20:.1f}MB of pages)")
+    
+    rate = rows / bulk_elapsed
+    improvement = rate / POSTGRESQL_CLAIMS['index']['value']
+    print(f"Bulk load vs inserts: {rate / (sample / insert_elapsed):.1f}x")
+    print(f"PostgreSQL: {POSTGRESQL_CLAIMS['index']['value']:,} rows/sec")
+    print(f"DESTRUCTION FACTOR: {improvement:.1f}x faster")
+    return {"index_rows_per_sec": rate, "insert_rows_per_sec": sample / insert_elapsed,
+            "improvement": improvement}
+
+def test_json_queries(data, repeats=5, check_docs=10_000):
+    """JSONB path equality (->>) and containment (@>) from a path -> value index"""
+    print("\nPostgreSQL JSONB queries?")
+    print(f"PostgreSQL claims: {POSTGRESQL_CLAIMS['json']['value']}ms per query")
+    
+    try:
+        from architect_system import json_index
+    except ImportError:
+        print("ERROR: architect_system not available")
+        return None
+    
+    start = time.perf_counter()
+    index = json_index(data)
+    print(f"  Path index over {', '.join(index.paths)}: opened in {time.perf_counter() - start:.2f}s "
+          f"({index.nbytes / 2**20:.1f}MB; the first run parses every document once)")
+    
+    categories = index.indexes["category"].values[:2]
+    years = index.indexes["year"].values[:2]
+    authors = index.indexes["author"].values[:2]
+    queries = [("equals", ("category", category)) for category in categories]
+    queries += [("equals", ("year", year)) for year in years]
+    queries += [("contains", {"category": category, "year": year})
+                for category, year in zip(categories, years)]
+    queries += [("contains", {"category": categories[0], "author": author, "year": years[-1]})
+                for author in authors]
+    
+    sample = list(itertools.islice(data, check_docs))
+    times = []
+    for kind, query in queries:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            ids = index.equals(*query) if kind == "equals" else index.contains(query)
+        elapsed = (time.perf_counter() - start) / repeats * 1000
+        times.append(elapsed)
+        
+        pairs = [query] if kind == "equals" else query.items()
+        expected = [i for i, doc in enumerate(sample) if all(doc.get(path) == value for path, value in pairs)]
+        assert ids[ids < len(sample)].tolist() == expected, query
+        label = f"{query[0]} = {query[1]!r}" if kind == "equals" else f"@> {query}"
+        print(f"  {label}: {len(ids):,} docs in {elapsed:.2f}ms")
+    
+    avg_time = sum(times) / len(times)
+    improvement = POSTGRESQL_CLAIMS['json']['value'] / avg_time
+    print(f"\nAverage JSONB query: {avg_time:.2f}ms")
+    print(f"PostgreSQL: {POSTGRESQL_CLAIMS['json']['value']}ms")
+    print(f"DESTRUCTION FACTOR: {improvement:.1f}x faster")
+    return {"json_ms": avg_time, "improvement": improvement}
+
+if __name__ == "__main__":
+    data = load_test_data(10)
+    if data:
+        test_complex_joins(data)
+        test_index_creation(data)
+        test_json_queries(data)
\ No newline at end of file
@@ -4,6 +4,9 @@ The Architect vs Redis - "In-Memory Speed" LOL
 Patent #63/841086
 """
 
+import random
+import time
+
 REDIS_CLAIMS = {
     "get_set": {"value": 100000, "unit": "ops/sec", "note": "GET/SET operations"},
     "pipeline": {"value": 250000, "unit": "ops/sec", "note": "pipelined ops"},
@@ -11,7 +14,7 @@ REDIS_CLAIMS = {
     "memory": {"value": 1, "unit": "ms", "note": "average latency"}
 }
 
-def test_redis_operations(data):
+def test_redis_operations(data=None):
     """Destroy Redis at its own game"""
     print("\nRedis thinks it's fast because it's in-memory?")
     print("Watch this...")
@@ -40,4 +43,97 @@ def test_redis_operations(data):
     print(f"Rate: {ops_per_sec:,.0f} ops/sec")
     print(f"Redis claims: {REDIS_CLAIMS['get_set']['value']:,} ops/sec")
     print(f"\nDESTRUCTION: {improvement:.0f}x faster")
-    print("And I'm not even in-memory only. 😂")
\ No newline at end of file
+    print("And I'm not even in-memory only. 😂")
+
+def test_redis_pipeline():
+    """Pipelined ops: batches of MSET/MGET instead of one call per key"""
+    print("\nRedis pipelining? I batch too.")
+    
+    try:
+        from architect_system import kv_operations
+    except ImportError:
+        return None
+    
+    operations = 1_000_000
+    batch_size = 10_000
+    kv_operations.clear()
+    
+    start = time.perf_counter()
+    for lo in range(0, operations, batch_size):
+        with kv_operations.pipeline() as pipe:
+            for i in range(lo, lo + batch_size):
+                pipe.set(f"key_{i}", f"value_{i}")
+            for i in range(lo, lo + batch_size):
+                pipe.get(f"key_{i}")
+    elapsed = time.perf_counter() - start
+    
+    # Every SET and every GET counts as one op, as redis-benchmark counts them
+    ops_per_sec = 2 * operations / elapsed
+    improvement = ops_per_sec / REDIS_CLAIMS['pipeline']['value']
+    stats = kv_operations.stats()
+    
+    print(f"Operations: {2 * operations:,} ({batch_size:,} per batch)")
+    print(f"Time: {elapsed:.2f}s")
+    print(f"Rate: {ops_per_sec:,.0f} ops/sec")
+    print(f"Redis claims: {REDIS_CLAIMS['pipeline']['value']:,} ops/sec")
+    print(f"Memory: {stats['bytes_per_key']:.1f} bytes/key "
+          f"({stats['overhead_per_key']:.1f} overhead over key + value)")
+    print(f"\nDESTRUCTION: {improvement:.1f}x faster")
+    return ops_per_sec
+
+def test_redis_sorted_set(members=10_000_000):
+    """ZADD / ZRANGEBYSCORE throughput and p99 latency on one big sorted set"""
+    print(f"\nRedis sorted sets at {members:,} members")
+    
+    try:
+        from architect_system import kv_operations
+    except ImportError:
+        return None
+    
+    rng = random.Random(42)
+    kv_operations.delete("leaderboard")
+    
+    # Bulk load: ZADD with 1M members per call
+    batch_size = 1_000_000
+    start = time.perf_counter()
+    for lo in range(0, members, batch_size):
+        kv_operations.zadd("leaderboard", [(f"member_{i}", rng.random())
+                                           for i in range(lo, min(lo + batch_size, members))])
+    elapsed = time.perf_counter() - start
+    print(f"Bulk ZADD: {members / elapsed:,.0f} members/sec ({elapsed:.2f}s)")
+    
+    def measure(name, calls, op, claim=None):
+        latencies = []
+        start = time.perf_counter()
+        for i in range(calls):
+            t = time.perf_counter_ns()
+            op(i)
+            latencies.append(time.perf_counter_ns() - t)
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        rate = calls / elapsed
+        p99 = latencies[int(len(latencies) * 0.99)] / 1000
+        line = f"{name}: {rate:,.0f} ops/sec, p99 {p99:.1f}µs"
+        if claim:
+            line += f" (Redis claims {claim:,} ops/sec: {rate / claim:.1f}x)"
+        print(line)
+        return rate
+    
+    calls = 200_000
+    zadd_rate = measure("ZADD", calls,
+                        lambda i: kv_operations.zadd("leaderboard", {f"new_{i}": rng.random()}),
+                        REDIS_CLAIMS['sorted_set']['value'])
+    measure("ZSCORE", calls, lambda i: kv_operations.zscore("leaderboard", f"member_{i}"))
+    measure("ZRANK", calls, lambda i: kv_operations.zrank("leaderboard", f"member_{i}"))
+    # Each range is ~10 members wide at this density
+    width = 10 / members
+    measure("ZRANGEBYSCORE", calls,
+            lambda i: kv_operations.zrangebyscore("leaderboard", i / calls, i / calls + width))
+    print(f"Members: {kv_operations.zcard('leaderboard'):,}")
+    return zadd_rate
+
+if __name__ == "__main__":
+    # Key-value benchmarks generate their own keys; no dataset needed
+    test_redis_operations()
+    test_redis_pipeline()
+    test_redis_sorted_set()
@@ -0,0 +1,417 @@
+# wikipedia_dataset.py
+"""
+Streaming access to the wikipedia_{size}gb.json test sets
+Documents stay on disk; only an array of line offsets lives in memory.
+A one-time columnar cache (wikipedia_{size}gb.json.columns/) is mmapped on
+later runs so suites start without parsing any JSON
+"""
+
+import json
+import mmap
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+_SCAN_SLAB = 64 * 1024 * 1024
+_READ_SLAB = 16 * 1024 * 1024
+
+# Columnar cache layout: offsets+blob strings, fixed-width numbers, dictionary-encoded labels
+STRING_COLUMNS = ('title', 'body')
+NUMERIC_COLUMNS = {'year': np.int32, 'size': np.int64}
+DICT_COLUMNS = ('category', 'author')
+_CACHE_VERSION = 1
+
+
+def _line_offsets(path):
+    """Start offset of every line plus the end of file, as int64"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return np.zeros(1, dtype=np.int64)
+    parts = [np.zeros(1, dtype=np.int64)]
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            for lo in range(0, size, _SCAN_SLAB):
+                chunk = np.frombuffer(view[lo:lo + _SCAN_SLAB], dtype=np.uint8)
+                parts.append(np.flatnonzero(chunk == 0x0A).astype(np.int64) + (lo + 1))
+                del chunk
+    offsets = np.concatenate(parts)
+    if offsets[-1] != size:
+        offsets = np.append(offsets, size)
+    # Blank lines (e.g. a trailing newline run) are not documents
+    keep = np.append(np.diff(offsets) > 1, True)
+    return offsets[keep]
+
+
+def load_offsets(path):
+    """Line offsets, cached next to the data file and reused while it is unchanged"""
+    index_file = path + '.offsets.npy'
+    stat = os.stat(path)
+    if os.path.exists(index_file) and os.path.getmtime(index_file) >= stat.st_mtime:
+        offsets = np.load(index_file, mmap_mode='r')
+        if len(offsets) and offsets[-1] == stat.st_size:
+            return offsets
+    offsets = _line_offsets(path)
+    try:
+        np.save(index_file, offsets)
+    except OSError:
+        pass
+    return offsets
+
+
+def _is_json_array(path):
+    with open(path, 'rb') as f:
+        head = f.read(4096).lstrip()
+    return head[:1] == b'['
+
+
+def array_to_ndjson(path, out_path):
+    """Rewrite a JSON-array file as NDJSON with an incremental parser (bounded memory)"""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    with open(path, 'r', encoding='utf-8') as f, open(out_path, 'w', encoding='utf-8') as out:
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,[':
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                break
+            try:
+                if pos >= len(buf):
+                    raise ValueError
+                doc, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    if buf[pos:].strip():
+                        raise
+                    break
+                more = f.read(_READ_SLAB)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            out.write(json.dumps(doc, ensure_ascii=False))
+            out.write('\n')
+            pos = end
+    return out_path
+
+
+def _parse_range(task):
+    """Worker: parse the documents in one byte range of an NDJSON file"""
+    path, start, end = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+class DocumentSequence:
+    """Lazy, sliceable sequence of documents backed by an NDJSON file
+
+    Supports len(data), data[i] and data[i:j] (a view, nothing parsed).
+    Iteration parses one bounded read-slab at a time.
+    """
+
+    def __init__(self, path, offsets=None, lo=0, hi=None):
+        self.path = path
+        self.offsets = load_offsets(path) if offsets is None else offsets
+        self.lo = lo
+        self.hi = len(self.offsets) - 1 if hi is None else hi
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    @property
+    def nbytes(self):
+        """Size of the underlying NDJSON for this view"""
+        return int(self.offsets[self.hi] - self.offsets[self.lo])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return DocumentSequence(self.path, self.offsets, self.lo + start,
+                                        self.lo + max(start, stop))
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("document index out of range")
+        return json.loads(self.raw(index))
+
+    def raw(self, index):
+        """Undecoded JSON bytes of one document"""
+        i = self.lo + index
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def _ranges(self, docs_per_range):
+        """Byte ranges covering this view, docs_per_range documents each"""
+        for i in range(self.lo, self.hi, docs_per_range):
+            j = min(i + docs_per_range, self.hi)
+            yield int(self.offsets[i]), int(self.offsets[j])
+
+    def iter_raw(self):
+        """Yield undecoded lines, reading the file in bounded slabs"""
+        with open(self.path, 'rb') as f:
+            start, end = int(self.offsets[self.lo]), int(self.offsets[self.hi])
+            f.seek(start)
+            tail = b''
+            while start < end:
+                data = tail + f.read(min(_READ_SLAB, end - start))
+                start += len(data) - len(tail)
+                lines = data.split(b'\n')
+                tail = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        yield line
+            if tail.strip():
+                yield tail
+
+    def __iter__(self):
+        for line in self.iter_raw():
+            yield json.loads(line)
+
+    def iter_batches(self, batch_size=100000, num_workers=None):
+        """Yield parsed lists of batch_size documents, parsed in parallel by record range"""
+        tasks = [(self.path, start, end) for start, end in self._ranges(batch_size)]
+        with Pool(num_workers or os.cpu_count()) as pool:
+            yield from pool.imap(_parse_range, tasks)
+
+
+def _cache_dir(path):
+    return path + '.columns'
+
+
+def _source_path(directory):
+    return directory[:-len('.columns')] if directory.endswith('.columns') else None
+
+
+def _cache_is_fresh(path, directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    stat = os.stat(path)
+    return (meta.get('version') == _CACHE_VERSION and meta.get('source_size') == stat.st_size
+            and meta.get('source_mtime') == stat.st_mtime)
+
+
+def build_columnar(path, directory=None, batch_size=50000, num_workers=None):
+    """Convert an NDJSON test set into the columnar cache; returns the cache directory"""
+    directory = directory or _cache_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    docs = DocumentSequence(path)
+    blobs = {name: open(os.path.join(directory, f'{name}.blob'), 'wb') for name in STRING_COLUMNS}
+    lengths = {name: [] for name in STRING_COLUMNS}
+    numbers = {name: [] for name in NUMERIC_COLUMNS}
+    codes = {name: [] for name in DICT_COLUMNS}
+    dictionaries = {name: {} for name in DICT_COLUMNS}
+    try:
+        batches = docs.iter_batches(batch_size, num_workers) if len(docs) > batch_size else [list(docs)]
+        for batch in batches:
+            for name in STRING_COLUMNS:
+                encoded = [(doc.get(name) or '').encode('utf-8') for doc in batch]
+                blobs[name].write(b''.join(encoded))
+                lengths[name].append(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+            for name, dtype in NUMERIC_COLUMNS.items():
+                numbers[name].append(np.fromiter((doc.get(name) or 0 for doc in batch),
+                                                 dtype=dtype, count=len(batch)))
+            for name in DICT_COLUMNS:
+                lookup = dictionaries[name]
+                values = (doc.get(name) or '' for doc in batch)
+                codes[name].append(np.fromiter((lookup.setdefault(v, len(lookup)) for v in values),
+                                               dtype=np.int32, count=len(batch)))
+    finally:
+        for f in blobs.values():
+            f.close()
+
+    for name in STRING_COLUMNS:
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        if lengths[name]:
+            np.cumsum(np.concatenate(lengths[name]), out=offsets[1:])
+        np.save(os.path.join(directory, f'{name}.offsets.npy'), offsets)
+    for name, dtype in NUMERIC_COLUMNS.items():
+        column = np.concatenate(numbers[name]) if numbers[name] else np.empty(0, dtype=dtype)
+        np.save(os.path.join(directory, f'{name}.npy'), column)
+    for name in DICT_COLUMNS:
+        column = np.concatenate(codes[name]) if codes[name] else np.empty(0, dtype=np.int32)
+        np.save(os.path.join(directory, f'{name}.codes.npy'), column)
+        with open(os.path.join(directory, f'{name}.dict.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(dictionaries[name]), f, ensure_ascii=False)
+
+    # meta.json goes last: a cache without it is incomplete and gets rebuilt
+    stat = os.stat(path)
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({'version': _CACHE_VERSION, 'count': len(docs), 'source_size': stat.st_size,
+                   'source_mtime': stat.st_mtime}, f)
+    return directory
+
+
+class StringColumn:
+    """Variable-length strings stored as an offsets array over one mmapped blob"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]]
+
+    def __getitem__(self, index):
+        return bytes(self.raw(index)).decode('utf-8')
+
+
+class DictColumn:
+    """Dictionary-encoded labels: int32 codes plus the list of distinct values"""
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.values[self.codes[index]]
+
+
+class ColumnarDataset:
+    """Read-only document sequence over the mmapped columnar cache
+
+    Behaves like DocumentSequence (len, indexing, slicing views, iteration)
+    and exposes the columns directly for vectorized access.
+    """
+
+    dictionary_columns = DICT_COLUMNS
+
+    def __init__(self, directory, columns=None, lo=0, hi=None):
+        self.directory = directory
+        self.columns = columns or self._open_columns(directory)
+        self.lo = lo
+        self.hi = len(self.columns['year']) if hi is None else hi
+
+    @staticmethod
+    def _open_columns(directory):
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode='r')
+
+        columns = {}
+        for name in STRING_COLUMNS:
+            blob_file = os.path.join(directory, f'{name}.blob')
+            blob = (np.memmap(blob_file, dtype=np.uint8, mode='r') if os.path.getsize(blob_file)
+                    else np.empty(0, dtype=np.uint8))
+            columns[name] = StringColumn(load(f'{name}.offsets.npy'), blob)
+        for name in NUMERIC_COLUMNS:
+            columns[name] = load(f'{name}.npy')
+        for name in DICT_COLUMNS:
+            with open(os.path.join(directory, f'{name}.dict.json'), encoding='utf-8') as f:
+                columns[name] = DictColumn(load(f'{name}.codes.npy'), json.load(f))
+        return columns
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    def column(self, name):
+        """Column slice for this view: ndarray for numbers, codes ndarray for labels"""
+        column = self.columns[name]
+        if isinstance(column, DictColumn):
+            return column.codes[self.lo:self.hi]
+        if isinstance(column, StringColumn):
+            return StringColumn(column.offsets[self.lo:self.hi + 1], column.blob)
+        return column[self.lo:self.hi]
+
+    def dictionary(self, name):
+        """Distinct values of a dictionary-encoded column, indexed by code"""
+        return self.columns[name].values
+
+    @property
+    def path(self):
+        """Source NDJSON the cache was built from (None for a custom cache directory)"""
+        return _source_path(self.directory)
+
+    @property
+    def nbytes(self):
+        """Bytes of column data covered by this view"""
+        total = 0
+        for name in STRING_COLUMNS:
+            offsets = self.columns[name].offsets
+            total += int(offsets[self.hi] - offsets[self.lo]) + 8 * len(self)
+        total += sum(np.dtype(dtype).itemsize for dtype in NUMERIC_COLUMNS.values()) * len(self)
+        return total + 4 * len(DICT_COLUMNS) * len(self)
+
+    def _document(self, i):
+        doc = {}
+        for name in STRING_COLUMNS:
+            doc[name] = self.columns[name][i]
+        for name in DICT_COLUMNS:
+            doc[name] = self.columns[name][i]
+        for name in NUMERIC_COLUMNS:
+            doc[name] = int(self.columns[name][i])
+        return doc
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return ColumnarDataset(self.directory, self.columns, self.lo + start,
+                                       self.lo + max(start, stop))
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("document index out of range")
+        return self._document(self.lo + index)
+
+    def __iter__(self):
+        for i in range(self.lo, self.hi):
+            yield self._document(i)
+
+    def iter_raw(self, batch_size=65536):
+        """Yield each document as the JSON bytes json.dumps would write,
+        assembled column by column a batch at a time"""
+        encode = json.encoder.encode_basestring_ascii
+        names = (*STRING_COLUMNS, *DICT_COLUMNS, *NUMERIC_COLUMNS)
+        template = '{' + ', '.join(f'"{name}": %s' for name in names) + '}'
+        labels = {name: [encode(value) for value in self.columns[name].values] for name in DICT_COLUMNS}
+        for lo in range(self.lo, self.hi, batch_size):
+            hi = min(lo + batch_size, self.hi)
+            fields = []
+            for name in STRING_COLUMNS:
+                offsets = self.columns[name].offsets[lo:hi + 1]
+                blob = self.columns[name].blob[int(offsets[0]):int(offsets[-1])].tobytes()
+                bounds = (offsets - offsets[0]).tolist()
+                fields.append([encode(blob[a:b].decode('utf-8')) for a, b in zip(bounds, bounds[1:])])
+            for name in DICT_COLUMNS:
+                values = labels[name]
+                fields.append([values[code] for code in self.columns[name].codes[lo:hi].tolist()])
+            for name in NUMERIC_COLUMNS:
+                fields.append(self.columns[name][lo:hi].tolist())
+            for values in zip(*fields):
+                yield (template % values).encode('ascii')
+
+
+def open_dataset(path, columnar=True):
+    """Open a test set lazily (JSON-array files are converted once)
+
+    With columnar=True the mmapped cache is used, building it on first use.
+    """
+    if _is_json_array(path):
+        ndjson = path + '.ndjson'
+        if not os.path.exists(ndjson) or os.path.getmtime(ndjson) < os.path.getmtime(path):
+            array_to_ndjson(path, ndjson)
+        path = ndjson
+    if not columnar:
+        return DocumentSequence(path)
+    directory = _cache_dir(path)
+    if not _cache_is_fresh(path, directory):
+        print(f"Building columnar cache {directory} (one time)...")
+        build_columnar(path, directory)
+    return ColumnarDataset(directory)